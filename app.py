@@ -1,18 +1,35 @@
 # app.py
-from flask import Flask, render_template, request, jsonify, send_file
-import cobra
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 import warnings
-from graficas import Graficas
+from graficas import Graficas, TOP_N, MAX_TOP_N, indices_top_n
 import pandas as pd
+import numpy as np
 from io import BytesIO
 from datetime import datetime
-import re
-from utils.filtrado_alt import generar_matriz_subsistemas
-import uuid  # para generar run_id únicos
-
-# Para el heatmap (colores en el grafo según flujo)
-import matplotlib.cm as cm
-import matplotlib.colors as mcolors
+import json
+import os
+import tempfile
+from utils.filtrado_alt import cache_analisis, seleccionar_metabolitos_alt, tabla_relaciones
+from utils.cache_modelos import CacheModelos, FORMATOS_SOPORTADOS
+from utils.registro_modelos import RegistroModelos
+from utils.escenarios import (
+  calcular_kpis, resumen_escenario, restricciones_de_escenario, UMBRAL_ACTIVA
+)
+from utils.pool_fba import (
+  PoolFBA, ERRORES_POOL, MAX_PUNTOS_BARRIDO, escenarios_barrido, escenarios_knockout
+)
+from utils.knockouts import (
+  CandidatosKnockout, MAX_CANDIDATOS_DOBLE, MAX_PARES, podar_simples, pares_a_evaluar,
+  fila_knockout, ordenar_tabla, TIPOS_KNOCKOUT
+)
+from utils.reduccion import REDUCCION_ACTIVA, reducir_en_proceso
+from utils.fva import bloques_reacciones, fva_bloque, rango_vacio, llenar_rango
+from utils.almacen_resultados import AlmacenResultados
+from utils.topologia import construir_grafo, columnas_grafo, diff_grafo, UMBRAL_FLUJO_ACTIVO
+from utils.formato_binario import empaquetar_grafo
+from utils.exportacion import FORMATOS_EXPORTACION, exportar_run, parquet_disponible
+from utils.trabajos import ColaTrabajos, ColaLlena, TERMINADO, ESTADOS_FINALES, sin_progreso
+from utils.colores import mapa_plasma  # heatmap (colores en el grafo según flujo)
 
 app = Flask(__name__)
 
@@ -22,19 +39,61 @@ warnings.filterwarnings("ignore", category=UserWarning)
 # =====================================================
 # ALMACÉN EN MEMORIA PARA RESULTADOS FBA
 # =====================================================
-# Guardará los flujos de cada simulación para poder generar el grafo 3D
-# Estructura:
-# fba_results_store[run_id] = {
-#     "fluxes": dict( reaction_id -> flujo )
-# }
-fba_results_store = {}
+# Con `python app.py` cada worker del pool (spawn) vuelve a importar
+# este archivo como __mp_main__: el estado compartido de la app solo se
+# crea en el proceso del servidor
+if __name__ != "__mp_main__":
+  # Guarda los flujos de cada simulación para poder generar el grafo 3D.
+  # Cada run es un array float64 indexado por el orden de reacciones del
+  # modelo (índice compartido), con límite de tamaño y TTL.
+  # Ver utils/almacen_resultados.py
+  fba_results_store = AlmacenResultados()
+
+  # Caché en disco de modelos ya parseados (clave = hash del archivo)
+  cache_modelos = CacheModelos()
+
+  # Modelos cargados a la vez (uno por modelo_id), cada uno con su lock
+  # lectores/escritor, su sesión de solver y su topología; LRU por
+  # memoria estimada y recarga perezosa desde el caché de pickles
+  registro_modelos = RegistroModelos(cache_modelos)
+
+  # Pool de procesos para lotes, barridos y knockouts en paralelo
+  pool_fba = PoolFBA()
+
+  # Trabajos largos en segundo plano (/trabajos) con progreso y cancelación
+  cola_trabajos = ColaTrabajos()
 
+  # Preprocesado de modelos (minutos en modelos grandes): cola propia de un
+  # hilo para no ocupar los de /trabajos; sus trabajos se consultan igual
+  cola_preprocesado = ColaTrabajos(n_hilos=1)
 
-def obtener_modelo_actual():
-  modelo = app.config.get("modelo_cargado", None)
-  if modelo is None:
+
+def obtener_modelo_actual(modelo_id=None):
+  """
+  ModeloRegistrado pedido (modelo_id) o, si no se indica, el último
+  subido. `.modelo` es el objeto COBRA (✔ NO copiar el modelo).
+  """
+  modelo_id = modelo_id or registro_modelos.modelo_por_defecto
+  if modelo_id is None:
     raise Exception("No hay modelo cargado. Sube un archivo primero.")
-  return modelo  # ✔ NO copiar el modelo
+
+  registrado = registro_modelos.obtener(modelo_id)
+  if registrado is None:
+    raise Exception(f"El modelo '{modelo_id}' ya no está disponible. Vuelve a subir el archivo.")
+
+  # Un modelo recargado desde el caché retoma su modelo reducido
+  preparar_reduccion(registrado)
+  return registrado
+
+
+def modelo_de_request(data=None):
+  """Modelo indicado en la petición (?modelo_id= o "modelo_id" en el JSON)."""
+  return obtener_modelo_actual(request.args.get("modelo_id") or (data or {}).get("modelo_id"))
+
+
+def modelo_de_run(entrada):
+  """Modelo que produjo un run guardado (no el último subido)."""
+  return obtener_modelo_actual(entrada["modelo_id"])
 
 
 # =====================================================
@@ -46,44 +105,103 @@ def cargar_modelo():
   Permite subir un archivo de modelo (.mat, .xml, .json)
   y cargarlo como un modelo COBRA válido. Devuelve lista de reacciones.
   """
+  datos, ext, nombre = leer_archivo_modelo()
+  if datos is None:
+    return jsonify({"error": ext}), 400
+
+  try:
+    return jsonify(registrar_modelo(datos, ext, nombre))
+  except Exception as e:
+    return jsonify({"error": f"Error al cargar el modelo: {str(e)}"}), 500
+
+
+def leer_archivo_modelo():
+  """(datos, ext, nombre) del archivo subido, o (None, mensaje, None)."""
   if "archivo_modelo" not in request.files:
-    return jsonify({"error": "No se recibió archivo."}), 400
+    return None, "No se recibió archivo.", None
 
   archivo = request.files["archivo_modelo"]
   if archivo.filename.strip() == "":
-    return jsonify({"error": "El archivo está vacío."}), 400
+    return None, "El archivo está vacío.", None
 
-  nombre = archivo.filename.lower()
+  ext = archivo.filename.lower().split(".")[-1]
+  if ext not in FORMATOS_SOPORTADOS:
+    return None, "Formato no soportado. Use .mat, .xml o .json", None
 
-  # Guardarlo temporalmente
-  ext = nombre.split(".")[-1]
-  ruta_temp = f"models/modelo_subido.{ext}"
-  archivo.save(ruta_temp)
+  return archivo.read(), ext, archivo.filename
 
-  # Intentar cargar según la extensión
-  try:
-    if nombre.endswith(".mat"):
-      modelo = cobra.io.load_matlab_model(ruta_temp)
-    elif nombre.endswith(".xml"):
-      modelo = cobra.io.read_sbml_model(ruta_temp)
-    elif nombre.endswith(".json"):
-      modelo = cobra.io.load_json_model(ruta_temp)
-    else:
-      return jsonify({"error": "Formato no soportado. Use .mat, .xml o .json"}), 400
-  except Exception as e:
-    return jsonify({"error": f"Error al cargar el modelo: {str(e)}"}), 500
 
-  app.config["ruta_modelo"] = ruta_temp  # conservar nombre si quieres
-  app.config["modelo_cargado"] = modelo  # << GUARDAR EL OBJETO EN RAM
+def registrar_modelo(datos, ext, nombre_archivo, progreso=sin_progreso):
+  """
+  Parsea (o toma del registro / caché) el modelo y lo deja como modelo
+  por defecto. Otros modelos ya cargados siguen disponibles por su id.
+  """
+  progreso(0.1, "leyendo modelo")
+  registrado, desde_cache = registro_modelos.registrar(datos, ext)
+  clave = registrado.modelo_id
+  modelo = registrado.modelo
+
+  progreso(0.7, "preparando workers")
+  preparar_pool(clave)
+
+  # Topología y tabla de metabolitos (ID → ID base) una vez por modelo
+  progreso(0.85, "indexando topología")
+  registrado.topologia()
+
+  # Preprocesado (bloqueadas, cadenas lineales) en segundo plano
+  preparar_reduccion(registrado)
 
   # Lista de reacciones para la interfaz
   reacciones = [rxn.id for rxn in modelo.reactions]
 
-  return jsonify({
+  return {
     "mensaje": "Modelo cargado correctamente.",
     "reacciones": reacciones,
-    "nombre_modelo": archivo.filename
-  })
+    "nombre_modelo": nombre_archivo,
+    "modelo_id": clave,
+    "desde_cache": desde_cache,
+    "reduccion": estado_reduccion(registrado)
+  }
+
+
+def preparar_reduccion(registrado):
+  if REDUCCION_ACTIVA:
+    try:
+      registrado.preparar_reduccion(
+        lambda: cola_preprocesado.enviar("reducir_modelo", trabajo_reducir_modelo, registrado)
+      )
+    except ColaLlena:
+      pass  # se vuelve a intentar la próxima vez que se pida el modelo
+
+
+def estado_reduccion(registrado):
+  if registrado.reducido is not None:
+    return {"estado": "lista", "resumen": registrado.reducido.resumen}
+  trabajo = registrado.trabajo_reduccion
+  if trabajo is None:
+    return {"estado": "pendiente" if REDUCCION_ACTIVA else "desactivada"}
+  return {
+    "estado": trabajo.estado,
+    "trabajo_id": trabajo.id,
+    "progreso": round(trabajo.progreso, 4),
+    "error": trabajo.error
+  }
+
+
+def preparar_pool(modelo_id):
+  """
+  Deja listos los workers de `modelo_id` (si el LRU del pool lo había
+  retirado, se vuelven a crear). Los workers leen el mismo pickle del
+  caché, fijado mientras el pool tenga este modelo, así el LRU del caché
+  no lo borra. Devuelve si se puede usar el pool.
+  """
+  cache_modelos.fijar(modelo_id)
+  if not cache_modelos.contiene(modelo_id):
+    cache_modelos.soltar(modelo_id)
+    return False
+  for liberado in pool_fba.preparar(modelo_id, cache_modelos.ruta(modelo_id)):
+    cache_modelos.soltar(liberado)
+  return True
 
 
 # =====================================================
@@ -91,14 +209,14 @@ def cargar_modelo():
 # =====================================================
 @app.route("/")
 def index():
-  modelo = app.config.get("modelo_cargado")
-
-  if modelo is None:
+  try:
+    registrado = obtener_modelo_actual()
+  except Exception:
     # No hay modelo cargado → enviar vacío
-    return render_template("index.html", reacciones=[])
+    return render_template("index.html", reacciones=[], modelo_id="")
 
-  reacciones = [rxn.id for rxn in modelo.reactions]
-  return render_template("index.html", reacciones=reacciones)
+  reacciones = [rxn.id for rxn in registrado.modelo.reactions]
+  return render_template("index.html", reacciones=reacciones, modelo_id=registrado.modelo_id)
 
 
 # =====================================================
@@ -106,138 +224,782 @@ def index():
 # =====================================================
 @app.route("/solicitud", methods=["POST"])
 def solicitud():
+  """
+  Ejecuta un FBA. Qué partes trae la respuesta se elige con un perfil
+  ("perfil" en el JSON o ?perfil=):
+    minimal → run_id, objective_value, status, solver, warnings
+    kpis    → minimal + KPIs + restricciones aplicadas
+    full    → kpis + gráfica Plotly + flujos_completos (por defecto)
+  o con una lista explícita "campos" (?campos=grafica,kpis) tomada de
+  grafica, flujos, kpis, restricciones. Lo que no se pide no se calcula.
+  Los flujos de cualquier run se pueden pedir después en /flujos?run_id=.
+  """
   data = request.get_json()
+  campos = campos_solicitud(data, request.args)
+  if campos is None:
+    return jsonify({"error": "Perfil no soportado. Use minimal, kpis o full"}), 400
+
+  try:
+    return jsonify(resultado_solicitud(data, campos))
+  except Exception as e:
+    return jsonify({"error": str(e)})
+
+
+def resultado_solicitud(data, campos, progreso=sin_progreso):
+  """Cuerpo de /solicitud (también lo ejecutan los trabajos en segundo plano)."""
   funcion_objetivo = data.get("funcion_objetivo")
   restricciones = data.get("restricciones", [])
+  top_n = leer_top_n(data.get("top_n"))
+  graficas_extra = data.get("graficas") or []
+
+  registrado = obtener_modelo_actual(data.get("modelo_id"))
+  modelo = registrado.modelo
+
+  # =====================================================
+  # Aislamiento por petición: objetivo y bounds se aplican
+  # dentro de `with modelo:` y se revierten al terminar
+  # (lock de escritura: un FBA a la vez por modelo). Con el
+  # modelo reducido listo se resuelve ese y los flujos vuelven
+  # al tamaño completo
+  # =====================================================
+  progreso(0.1, "resolviendo FBA")
+  with registrado.lock.escritura():
+    resultado = registrado.resolver(funcion_objetivo, restricciones)
+
+  solution = resultado["solution"]
+  restricciones_aplicadas = resultado["restricciones"]
+  warnings_list = resultado["warnings"]
+  estadisticas_solver = resultado["solver"]
+
+  # ------------------ GRÁFICA (PLOTLY) -------------------
+  graph_json = {}
+  if "grafica" in campos:
+    progreso(0.6, "generando gráfica")
+    topo = registrado.topologia()
+    graph_json = Graficas.generar_grafica(solution, modelo, top_n, topo.rxn_nombres)
+    if "subsistemas" in graficas_extra:
+      graph_json["grafica_subsistemas"] = Graficas.histograma_subsistemas(
+        solution.fluxes.values, topo.codigo_subsistema, topo.lista_subsistemas
+      )
+
+  # ------------------ RESPUESTA AL FRONTEND --------------
+  if "restricciones" in campos:
+    graph_json["restricciones"] = restricciones_aplicadas
+  graph_json["warnings"] = warnings_list
+  graph_json["objective_value"] = float(solution.objective_value)
+  graph_json["status"] = solution.status
+  graph_json["solver"] = estadisticas_solver
+
+  # 🔥 ENVÍA TODOS LOS FLUJOS COMPLETOS (PARA EXCEL)
+  if "flujos" in campos:
+    graph_json["flujos_completos"] = solution.fluxes.to_dict()
+
+  # 🔥 ENVÍA KPIs PARA EL DASHBOARD
+  if "kpis" in campos:
+    progreso(0.8, "calculando KPIs")
+    graph_json.update(calcular_kpis(solution.fluxes))
+
+  # =====================================================
+  # 🔥 GUARDAR RESULTADO FBA PARA EL GRAFO 3D
+  # =====================================================
+  progreso(0.9, "guardando run")
+  run_id = fba_results_store.guardar(
+    registrado.modelo_id,
+    solution.fluxes.index.tolist(),
+    solution.fluxes.values,
+    meta={
+      "funcion_objetivo": funcion_objetivo,
+      "objective_value": graph_json["objective_value"],
+      "status": solution.status,
+      "restricciones": restricciones
+    }
+  )
+  graph_json["run_id"] = run_id
+
+  return graph_json
+
+
+# =====================================================
+# RUTA: LOTE DE ESCENARIOS FBA (NDJSON EN STREAMING)
+# =====================================================
+@app.route("/solicitud_lote", methods=["POST"])
+def solicitud_lote():
+  """
+  Ejecuta muchos escenarios seguidos sobre el mismo modelo.
+
+  Cuerpo JSON:
+    {
+      "funcion_objetivo": "...",          # por defecto para todos
+      "escenarios": [
+        {"id": "...", "funcion_objetivo": "...", "restricciones": [...]},
+        ...
+      ],
+      "incluir_flujos": false,            # vector de flujos por escenario
+      "guardar": false,                   # guardar run_id para el grafo 3D
+      "paralelo": true                    # repartir en el pool de procesos
+    }
+
+  Cada escenario puede traer también "knockouts": [ids de reacción].
+
+  Responde en streaming (application/x-ndjson), una línea por escenario
+  en el mismo orden. Si incluir_flujos, la primera línea trae los IDs de
+  reacción que indexan los vectores. Sin gráfica Plotly ni dict de flujos.
+  """
+  data = request.get_json(silent=True) or {}
+  escenarios = data.get("escenarios") or []
+  objetivo_defecto = data.get("funcion_objetivo")
+  incluir_flujos = bool(data.get("incluir_flujos", False))
+  guardar = bool(data.get("guardar", False))
+  paralelo = bool(data.get("paralelo", True))
+
+  if not escenarios:
+    return jsonify({"error": "No se recibieron escenarios."}), 400
 
   try:
-    modelo = obtener_modelo_actual()
+    registrado = modelo_de_request(data)
   except Exception as e:
     return jsonify({"error": str(e)})
 
-  # ------------------ FUNCIÓN OBJETIVO ------------------
+  for esc in escenarios:
+    esc["funcion_objetivo"] = esc.get("funcion_objetivo") or objetivo_defecto
+
+  return respuesta_lote(registrado, escenarios, incluir_flujos, guardar, paralelo)
+
+
+# =====================================================
+# RUTA: BARRIDO DE UN BOUND (p. ej. captación de glucosa)
+# =====================================================
+@app.route("/barrido", methods=["POST"])
+def barrido():
+  """
+  Cuerpo JSON:
+    {
+      "funcion_objetivo": "...",
+      "restricciones": [...],                # base común
+      "reaccion": "EX_glc__D_e",
+      "limite": "lower",
+      "valores": [...]                       # o bien:
+      "inicio": -20, "fin": 0, "puntos": 200,
+      "incluir_flujos": false,
+      "paralelo": true
+    }
+  Misma respuesta NDJSON que /solicitud_lote, un punto por línea.
+  """
+  data = request.get_json(silent=True) or {}
+  reaccion = data.get("reaccion")
+  limite = data.get("limite", "lower")
+  valores = data.get("valores")
+
   try:
-    modelo.objective = funcion_objetivo
-  except Exception:
-    return jsonify({"error": f"La reacción '{funcion_objetivo}' no existe."})
+    if valores is None and "inicio" in data and "fin" in data:
+      puntos = int(data.get("puntos", 50))
+      if not 1 <= puntos <= MAX_PUNTOS_BARRIDO:
+        raise ValueError(f"puntos debe estar entre 1 y {MAX_PUNTOS_BARRIDO}.")
+      valores = np.linspace(float(data["inicio"]), float(data["fin"]), puntos).tolist()
+    elif valores is not None:
+      if not isinstance(valores, list) or len(valores) > MAX_PUNTOS_BARRIDO:
+        raise ValueError(f"valores debe ser una lista de hasta {MAX_PUNTOS_BARRIDO} números.")
+      valores = [float(v) for v in valores]
+  except (TypeError, ValueError) as e:
+    return jsonify({"error": f"Parámetros de barrido inválidos: {e}"}), 400
+
+  if not reaccion or not valores:
+    return jsonify({"error": "Indica reaccion y valores (o inicio/fin/puntos)."}), 400
 
-  restricciones_aplicadas = []
-  warnings_list = []
+  try:
+    registrado = modelo_de_request(data)
+  except Exception as e:
+    return jsonify({"error": str(e)}), 400
 
-  # ------------------ LOWER BOUNDS -----------------------
-  for r in restricciones:
-    if r["limite"] != "lower":
-      continue
+  escenarios = escenarios_barrido(
+    data.get("funcion_objetivo"), data.get("restricciones") or [],
+    reaccion, limite, valores
+  )
+  for esc, v in zip(escenarios, valores):
+    esc["id"] = v
+
+  return respuesta_lote(
+    registrado, escenarios,
+    bool(data.get("incluir_flujos", False)),
+    bool(data.get("guardar", False)),
+    bool(data.get("paralelo", True))
+  )
 
-    rxn_id = r["reaccion"]
-    valor = float(r["valor"])
 
-    if rxn_id not in modelo.reactions:
-      warnings_list.append(f"⚠ La reacción {rxn_id} no existe.")
-      continue
+def respuesta_lote(registrado, escenarios, incluir_flujos, guardar, paralelo):
+  """
+  Genera la respuesta NDJSON de un lote. Con `paralelo` los escenarios
+  se reparten en el pool de procesos (si tiene cargado este modelo); si
+  no, se ejecutan en este hilo con la sesión de solver del modelo,
+  tomando su lock de escritura escenario por escenario. En ambos casos
+  el orden de las líneas es el de los escenarios.
+  """
+  modelo_id = registrado.modelo_id
+  usar_pool = paralelo and preparar_pool(modelo_id)
+  ids_reacciones = [rxn.id for rxn in registrado.modelo.reactions]
+
+  def generar():
+    if incluir_flujos:
+      yield json.dumps({"reacciones": ids_reacciones}) + "\n"
+
+    resultados = resolver_escenarios(registrado, escenarios, incluir_flujos or guardar, usar_pool)
+    for i, (esc, resumen) in enumerate(zip(escenarios, resultados)):
+      linea = {"indice": i, "id": esc.get("id", i), "paralelo": usar_pool}
+      linea.update(resumen)
+
+      # Los flujos se piden también si hay que guardar el run,
+      # pero solo se envían si el cliente los solicitó
+      if incluir_flujos:
+        flujos = linea.get("flujos")
+      else:
+        flujos = linea.pop("flujos", None)
+
+      if guardar and flujos is not None:
+        linea["run_id"] = fba_results_store.guardar(modelo_id, ids_reacciones, flujos, meta={
+          "funcion_objetivo": esc.get("funcion_objetivo"),
+          "objective_value": linea.get("objective_value"),
+          "status": linea.get("status"),
+          "restricciones": esc.get("restricciones") or []
+        })
 
-    rxn = modelo.reactions.get_by_id(rxn_id)
-    rxn.lower_bound = valor
+      yield json.dumps(linea) + "\n"
 
-    restricciones_aplicadas.append({
-      "reaccion": rxn_id,
-      "limite": "lower",
-      "valor": valor,
-      "nuevo_lower": rxn.lower_bound,
-      "nuevo_upper": rxn.upper_bound
-    })
+  return Response(stream_with_context(generar()), mimetype="application/x-ndjson")
 
-  # ------------------ UPPER BOUNDS -----------------------
-  for r in restricciones:
-    if r["limite"] != "upper":
-      continue
 
-    rxn_id = r["reaccion"]
-    valor = float(r["valor"])
+def resolver_escenarios(registrado, escenarios, incluir_flujos, usar_pool):
+  """
+  Iterador de resúmenes en el orden de `escenarios`: en el pool de
+  procesos o en este hilo con la sesión de solver del modelo (warm
+  start; el modelo reducido si está listo), tomando su lock de
+  escritura escenario por escenario.
 
-    if rxn_id not in modelo.reactions:
-      warnings_list.append(f"⚠ La reacción {rxn_id} no existe.")
-      continue
+  Si el pool falla a mitad (su LRU retiró este modelo o se cayó un
+  worker), los escenarios que faltan se resuelven en este hilo.
+  """
+  hechos = 0
+  if usar_pool:
+    try:
+      for resumen in pool_fba.escenarios(registrado.modelo_id, escenarios, incluir_flujos):
+        hechos += 1
+        yield resumen
+      return
+    except ERRORES_POOL:
+      pass
+
+  for esc in escenarios[hechos:]:
+    try:
+      with registrado.lock.escritura():
+        resultado = registrado.resolver(
+          esc.get("funcion_objetivo"), restricciones_de_escenario(esc)
+        )
+      yield resumen_escenario(resultado, incluir_flujos)
+    except Exception as e:
+      yield {"error": str(e)}
+
+
+# Partes opcionales de la respuesta de /solicitud, por perfil
+CAMPOS_SOLICITUD = ("grafica", "flujos", "kpis", "restricciones")
+PERFILES_SOLICITUD = {
+  "minimal": set(),
+  "kpis": {"kpis", "restricciones"},
+  "full": set(CAMPOS_SOLICITUD)
+}
+
+
+def campos_solicitud(data, args=None):
+  """Conjunto de campos pedidos (None si el perfil no existe)."""
+  args = args or {}
+  campos = data.get("campos") or args.get("campos")
+  if campos:
+    if isinstance(campos, str):
+      campos = campos.split(",")
+    return {c.strip() for c in campos} & set(CAMPOS_SOLICITUD)
+
+  perfil = data.get("perfil") or args.get("perfil") or "full"
+  return PERFILES_SOLICITUD.get(perfil)
+
+
+def leer_top_n(valor):
+  try:
+    top_n = int(valor) if valor is not None else TOP_N
+  except (TypeError, ValueError):
+    top_n = TOP_N
+  return max(1, min(top_n, MAX_TOP_N))
 
-    rxn = modelo.reactions.get_by_id(rxn_id)
 
-    if valor < rxn.lower_bound:
-      warnings_list.append(
-        f"⚠ Ajuste automático: upper {valor} → {rxn.lower_bound} porque lower es mayor."
-      )
-      valor = rxn.lower_bound
+# =====================================================
+# RUTA: FVA (rangos de flujo, NDJSON EN STREAMING)
+# =====================================================
+@app.route("/fva", methods=["POST"])
+def fva():
+  """
+  Flux Variability Analysis con el objetivo y las restricciones dados.
+  Cuerpo JSON:
+    {
+      "modelo_id": "...",                    # opcional (último subido)
+      "funcion_objetivo": "...",
+      "restricciones": [...],
+      "fraccion_optimo": 1.0,                # objetivo >= fracción × óptimo
+      "reacciones": [...],                   # o bien un subsistema:
+      "subsistema": "Glycolysis/gluconeogenesis",
+      "paralelo": true
+    }
+  Respuesta NDJSON:
+    1ª línea   {"reacciones_total", "bloques", "objective_value", "paralelo"}
+    por bloque {"bloque", "reacciones", "minimo", "maximo"} (o "error"),
+               en el orden en que terminan
+    última     {"run_id", "terminado": true, "bloques_con_error"}
+  El run guarda los flujos del FBA y el rango min/max por reacción;
+  /grafo_datos?run_id=...&color=variabilidad colorea por max − min.
+  """
+  data = request.get_json(silent=True) or {}
+  funcion_objetivo = data.get("funcion_objetivo")
+  restricciones = data.get("restricciones") or []
 
-    rxn.upper_bound = valor
+  try:
+    fraccion_optimo = float(data.get("fraccion_optimo", 1.0))
+  except (TypeError, ValueError):
+    fraccion_optimo = -1.0
+  if not 0.0 <= fraccion_optimo <= 1.0:
+    return jsonify({"error": "fraccion_optimo debe estar entre 0 y 1."}), 400
 
-    restricciones_aplicadas.append({
-      "reaccion": rxn_id,
-      "limite": "upper",
-      "valor": valor,
-      "nuevo_lower": rxn.lower_bound,
-      "nuevo_upper": rxn.upper_bound
-    })
+  try:
+    registrado = modelo_de_request(data)
+  except Exception as e:
+    return jsonify({"error": str(e)})
+
+  topo = registrado.topologia()
+  seleccion = reacciones_fva(topo, data)
+  if isinstance(seleccion, str):
+    return jsonify({"error": seleccion}), 400
 
-  # ------------------ OPTIMIZAR --------------------------
+  # FBA de referencia: flujos del run y comprobación de factibilidad
   try:
-    solution = modelo.optimize()
+    with registrado.lock.escritura():
+      resultado = registrado.resolver(funcion_objetivo, restricciones)
   except Exception as e:
     return jsonify({"error": str(e)})
 
-  # ------------------ KPIs ------------------------------
-  flujos_abs = solution.fluxes.abs()
-  activas = int((flujos_abs > 1e-6).sum())
-  inactivas = len(flujos_abs) - activas
+  solution = resultado["solution"]
+  if solution.status != "optimal":
+    return jsonify({"error": f"El FBA no tiene solución óptima ({solution.status}); no se puede calcular FVA."})
+
+  posiciones = bloques_reacciones(seleccion.tolist())
+  bloques = [[topo.rxn_ids[i] for i in pos] for pos in posiciones]
+  usar_pool = bool(data.get("paralelo", True)) and preparar_pool(registrado.modelo_id)
+
+  def resultados():
+    # Si el pool falla a mitad, los bloques que faltan van en este hilo
+    pendientes = set(range(len(bloques)))
+    if usar_pool:
+      try:
+        for i, rango_bloque in pool_fba.fva(registrado.modelo_id, bloques, funcion_objetivo,
+                                            restricciones, fraccion_optimo):
+          pendientes.discard(i)
+          yield i, rango_bloque
+        return
+      except ERRORES_POOL:
+        pass
+
+    for i in sorted(pendientes):
+      rxn_ids = bloques[i]
+      try:
+        with registrado.lock.escritura():
+          rango_bloque = fva_bloque(
+            registrado.modelo, funcion_objetivo, restricciones, rxn_ids, fraccion_optimo
+          )
+      except Exception as e:
+        rango_bloque = {"error": str(e)}
+      yield i, rango_bloque
+
+  def generar():
+    yield json.dumps({
+      "reacciones_total": int(len(seleccion)),
+      "bloques": len(bloques),
+      "objective_value": float(solution.objective_value),
+      "paralelo": usar_pool
+    }) + "\n"
+
+    rango = rango_vacio(topo.n_reacciones)
+    con_error = 0
+    for i, rango_bloque in resultados():
+      linea = {"bloque": i, "reacciones": bloques[i]}
+      if "error" in rango_bloque:
+        con_error += 1
+        linea["error"] = rango_bloque["error"]
+      else:
+        llenar_rango(rango, posiciones[i], rango_bloque)
+        linea["minimo"] = valores_json(rango_bloque["minimo"])
+        linea["maximo"] = valores_json(rango_bloque["maximo"])
+      yield json.dumps(linea) + "\n"
+
+    run_id = fba_results_store.guardar(
+      registrado.modelo_id, solution.fluxes.index.tolist(), solution.fluxes.values,
+      meta={
+        "funcion_objetivo": funcion_objetivo,
+        "objective_value": float(solution.objective_value),
+        "status": solution.status,
+        "restricciones": restricciones,
+        "fva": {"fraccion_optimo": fraccion_optimo, "reacciones": int(len(seleccion))}
+      },
+      rango=rango
+    )
+    yield json.dumps({"run_id": run_id, "terminado": True, "bloques_con_error": con_error}) + "\n"
 
-  biomasa_value = 0.0
-  if "BIOMASS_Ecoli_core_w_GAM" in modelo.reactions:
-    biomasa_value = float(solution.fluxes.get("BIOMASS_Ecoli_core_w_GAM", 0))
+  return Response(stream_with_context(generar()), mimetype="application/x-ndjson")
 
-  atp_value = 0.0
-  if "ATPM" in modelo.reactions:
-    atp_value = abs(float(solution.fluxes.get("ATPM", 0)))
 
-  flujo_total = float(flujos_abs.sum())
+def reacciones_fva(topo, data):
+  """Índices (en el modelo) de las reacciones a analizar, o mensaje de error."""
+  if data.get("reacciones"):
+    posicion = {rxn_id: i for i, rxn_id in enumerate(topo.rxn_ids)}
+    faltan = [r for r in data["reacciones"] if r not in posicion]
+    if faltan:
+      return f"Reacciones que no existen en el modelo: {', '.join(faltan[:10])}"
+    return np.array([posicion[r] for r in data["reacciones"]], dtype=np.int64)
 
-  # ------------------ GRÁFICA (PLOTLY) -------------------
-  graph_json = Graficas.generar_grafica(solution, modelo)
+  if data.get("subsistema"):
+    if data["subsistema"] not in topo.lista_subsistemas:
+      return f"El subsistema '{data['subsistema']}' no existe en el modelo."
+    return topo.seleccionar(None, data["subsistema"])
 
-  # ------------------ RESPUESTA AL FRONTEND --------------
-  graph_json["restricciones"] = restricciones_aplicadas
-  graph_json["warnings"] = warnings_list
-  graph_json["objective_value"] = float(solution.objective_value)
-  graph_json["status"] = solution.status
+  return np.arange(topo.n_reacciones, dtype=np.int64)
 
-  # 🔥 ENVÍA TODOS LOS FLUJOS COMPLETOS (PARA EXCEL)
-  flujos_dict = solution.fluxes.to_dict()
-  graph_json["flujos_completos"] = flujos_dict
 
-  # 🔥 ENVÍA KPIs PARA EL DASHBOARD
-  graph_json["kpi_biomasa"] = biomasa_value
-  graph_json["kpi_atp"] = atp_value
-  graph_json["kpi_flujo_total"] = flujo_total
-  graph_json["kpi_activas"] = {
-    "activas": activas,
-    "inactivas": inactivas
-  }
+def valores_json(valores):
+  """NaN / inf no son JSON válido → null."""
+  return [v if np.isfinite(v) else None for v in valores]
 
-  # =====================================================
-  # 🔥 GUARDAR RESULTADO FBA PARA EL GRAFO 3D
-  # =====================================================
-  run_id = str(uuid.uuid4())
-  fba_results_store[run_id] = {
-    "fluxes": flujos_dict
+
+# =====================================================
+# RUTA: CRIBADO DE KNOCKOUTS (SIMPLES Y DOBLES)
+# =====================================================
+@app.route("/knockouts", methods=["POST"])
+def knockouts():
+  """
+  Elimina reacciones o genes, uno a uno y (opcional) por pares, y
+  devuelve la tabla ordenada por impacto en el objetivo.
+  Cuerpo JSON:
+    {
+      "run_id": "...",                       # run silvestre (WT) de base, o bien:
+      "modelo_id": "...", "funcion_objetivo": "...", "restricciones": [...],
+      "tipo": "reacciones",                  # reacciones | genes
+      "ids": [...],                          # o bien un subsistema:
+      "subsistema": "Glycolysis/gluconeogenesis",
+      "doble": false,                        # también pares
+      "paralelo": true,
+      "top": 100                             # filas en la respuesta (la tabla
+                                             # completa queda en el run)
+    }
+
+  Con run_id se usan el objetivo y las restricciones de ese run (la
+  poda solo vale para esa solución). Los knockouts que no tocan ninguna
+  reacción con flujo en el WT no se resuelven ("podado": true) y los
+  pares se podan igual con las soluciones simples.
+
+  La tabla queda en un run nuevo (flujos WT): /descargar_excel?run_id=
+  la exporta en la hoja "Knockouts".
+  """
+  data = request.get_json(silent=True) or {}
+  top = data.get("top")
+  if top is not None:
+    try:
+      top = int(top)
+    except (TypeError, ValueError):
+      top = -1
+    if top < 0:
+      return jsonify({"error": "top debe ser un entero >= 0."}), 400
+
+  try:
+    resultado = cribado_knockouts(data)
+  except Exception as e:
+    return jsonify({"error": str(e)}), 400
+
+  if top is not None:
+    resultado["tabla"] = resultado["tabla"][:top]
+  return jsonify(resultado)
+
+
+def cribado_knockouts(data, progreso=sin_progreso):
+  """Cuerpo de /knockouts (también lo ejecutan los trabajos en segundo plano)."""
+  tipo = data.get("tipo", "reacciones")
+  doble = bool(data.get("doble", False))
+  run_id_base = data.get("run_id")
+  if tipo not in TIPOS_KNOCKOUT:
+    raise ValueError("Tipo de knockout no soportado. Use reacciones o genes")
+
+  # ------------------ SOLUCIÓN SILVESTRE (WT) ------------
+  if run_id_base:
+    entrada = fba_results_store.obtener(run_id_base)
+    if entrada is None:
+      raise ValueError("run_id inválido o expirado")
+    registrado = modelo_de_run(entrada)
+    meta = entrada["meta"]
+    funcion_objetivo = meta.get("funcion_objetivo")
+    restricciones = meta.get("restricciones") or []
+    flujos_wt = registrado.topologia().flujos_de_run(entrada)
+    objetivo_wt, status_wt = meta.get("objective_value"), meta.get("status")
+  else:
+    registrado = obtener_modelo_actual(data.get("modelo_id"))
+    funcion_objetivo = data.get("funcion_objetivo")
+    restricciones = data.get("restricciones", [])
+    progreso(0.02, "resolviendo FBA silvestre")
+    with registrado.lock.escritura():
+      resultado = registrado.resolver(funcion_objetivo, restricciones)
+    solution = resultado["solution"]
+    flujos_wt = solution.fluxes.values
+    objetivo_wt, status_wt = float(solution.objective_value), solution.status
+
+  if status_wt != "optimal" or not objetivo_wt:
+    raise ValueError("El FBA silvestre no es óptimo o su objetivo es 0: no hay crecimiento que comparar.")
+
+  # El índice se pide antes del lock: topologia() toma también el de
+  # lectura y ese lock no es reentrante
+  topo = registrado.topologia()
+  with registrado.lock.lectura():
+    candidatos = CandidatosKnockout(registrado.modelo, tipo, ids_knockout(registrado, topo, data, tipo))
+  if doble and len(candidatos) > MAX_CANDIDATOS_DOBLE:
+    raise ValueError(
+      f"Demasiados candidatos para el cribado doble ({len(candidatos)} > "
+      f"{MAX_CANDIDATOS_DOBLE}). Indica ids o un subsistema."
+    )
+
+  usar_pool = bool(data.get("paralelo", True)) and preparar_pool(registrado.modelo_id)
+  fin_simples = 0.5 if doble else 0.95
+
+  # ------------------ KNOCKOUTS SIMPLES ------------------
+  evaluar = np.flatnonzero(podar_simples(candidatos, flujos_wt)).tolist()
+  escenarios = escenarios_knockout(
+    funcion_objetivo, restricciones,
+    [candidatos.reacciones_de(candidatos.desactiva[i]) for i in evaluar]
+  )
+
+  # Reacciones con flujo en la solución de cada simple (las podadas
+  # conservan la solución WT); solo hacen falta para podar los pares
+  activas = [np.abs(flujos_wt) > UMBRAL_ACTIVA] * len(candidatos)
+  resumenes = {}
+  resultados = resolver_escenarios(registrado, escenarios, doble, usar_pool)
+  for k, (i, resumen) in enumerate(zip(evaluar, resultados)):
+    flujos = resumen.pop("flujos", None)
+    if flujos is not None:
+      activas[i] = np.abs(np.asarray(flujos, dtype=np.float64)) > UMBRAL_ACTIVA
+    resumenes[i] = resumen
+    progreso(0.05 + (fin_simples - 0.05) * (k + 1) / len(evaluar), "knockouts simples")
+
+  sin_cambio = {"objective_value": objetivo_wt, "status": "optimal"}
+  filas = [
+    fila_knockout(
+      [candidatos.ids[i]], candidatos.reacciones_de(candidatos.desactiva[i]),
+      resumenes.get(i, sin_cambio), objetivo_wt, podado=i not in resumenes
+    )
+    for i in range(len(candidatos))
+  ]
+
+  # ------------------ KNOCKOUTS DOBLES -------------------
+  pares, pares_podados = [], 0
+  if doble:
+    progreso(0.5, "podando pares")
+    no_letales = np.array([not f["letal"] for f in filas], dtype=bool)
+    pares, pares_podados = pares_a_evaluar(candidatos, activas, no_letales)
+    if len(pares) > MAX_PARES:
+      raise ValueError(
+        f"Quedan {len(pares)} pares después de la poda (máximo {MAX_PARES}). "
+        "Reduce los candidatos."
+      )
+
+    desactiva = [candidatos.desactiva_par(i, j) for i, j in pares]
+    escenarios = escenarios_knockout(
+      funcion_objetivo, restricciones, [candidatos.reacciones_de(d) for d in desactiva]
+    )
+    resultados = resolver_escenarios(registrado, escenarios, False, usar_pool)
+    for k, ((i, j), d, resumen) in enumerate(zip(pares, desactiva, resultados)):
+      filas.append(fila_knockout(
+        [candidatos.ids[i], candidatos.ids[j]], candidatos.reacciones_de(d),
+        resumen, objetivo_wt
+      ))
+      progreso(0.5 + 0.45 * (k + 1) / len(pares), "knockouts dobles")
+
+  # ------------------ TABLA + RUN PARA EXPORTAR ----------
+  tabla = ordenar_tabla(filas)
+  resumen_cribado = {
+    "run_id_base": run_id_base,
+    "tipo": tipo,
+    "doble": doble,
+    "objective_wt": objetivo_wt,
+    "candidatos": len(candidatos),
+    "simples_evaluados": len(evaluar),
+    "simples_podados": len(candidatos) - len(evaluar),
+    "pares_evaluados": len(pares),
+    "pares_podados": pares_podados,
+    "letales": sum(f["letal"] for f in tabla),
+    "paralelo": usar_pool
   }
-  graph_json["run_id"] = run_id
 
-  return jsonify(graph_json)
+  progreso(0.97, "guardando run")
+  run_id = fba_results_store.guardar(
+    registrado.modelo_id, candidatos.rxn_ids, flujos_wt,
+    meta={
+      "funcion_objetivo": funcion_objetivo,
+      "objective_value": objetivo_wt,
+      "status": status_wt,
+      "restricciones": restricciones,
+      "knockouts": tabla,
+      "cribado": resumen_cribado
+    }
+  )
+  return {"run_id": run_id, **resumen_cribado, "tabla": tabla}
+
+
+def ids_knockout(registrado, topo, data, tipo):
+  """
+  IDs pedidos, los del subsistema (sus reacciones o sus genes) o None =
+  todos. Se llama con el lock de lectura tomado (`topo` ya construido).
+  """
+  if data.get("ids"):
+    return data["ids"]
+  if not data.get("subsistema"):
+    return None
+
+  if data["subsistema"] not in topo.lista_subsistemas:
+    raise ValueError(f"El subsistema '{data['subsistema']}' no existe en el modelo.")
+  rxn_ids = [topo.rxn_ids[i] for i in topo.seleccionar(None, data["subsistema"]).tolist()]
+  if tipo != "genes":
+    return rxn_ids
+
+  reacciones = registrado.modelo.reactions
+  genes = {}
+  for rxn_id in rxn_ids:
+    genes.update(dict.fromkeys(g.id for g in reacciones.get_by_id(rxn_id).genes))
+  return list(genes)
+
+
+# =====================================================
+# API: FLUJOS DE UN RUN GUARDADO (bajo demanda)
+# =====================================================
+@app.route("/flujos")
+def flujos_run():
+  """
+  Vector de flujos de un run: ?run_id=...
+    &reacciones=R1,R2   solo esas reacciones (por defecto todas)
+    &formato=lista      {"reacciones": [...], "flujos": [...]} en vez
+                        de un dict {reacción: flujo}
+  """
+  run_id = request.args.get("run_id")
+  entrada = fba_results_store.obtener(run_id)
+  if entrada is None:
+    return jsonify({"error": "run_id inválido o expirado"}), 400
+
+  indice = entrada["indice"]
+  flujos = entrada["flujos"]
+  respuesta = {"run_id": run_id, "modelo_id": entrada["modelo_id"]}
+
+  pedidas = request.args.get("reacciones")
+  if pedidas:
+    pedidas = [r.strip() for r in pedidas.split(",") if r.strip()]
+    ids = [r for r in pedidas if r in indice.posicion]
+    valores = np.asarray(flujos)[[indice.posicion[r] for r in ids]].tolist()
+    respuesta["no_encontradas"] = [r for r in pedidas if r not in indice.posicion]
+  else:
+    ids = indice.ids
+    valores = np.asarray(flujos).tolist()
+
+  if request.args.get("formato") == "lista":
+    respuesta["reacciones"] = ids
+    respuesta["flujos"] = valores
+  else:
+    respuesta["flujos"] = dict(zip(ids, valores))
+
+  return jsonify(respuesta)
+
+
+# =====================================================
+# API: GRÁFICAS DE UN RUN GUARDADO
+# =====================================================
+@app.route("/grafica")
+def grafica():
+  """
+  Figura Plotly de un run guardado, sin volver a resolver ni recorrer
+  el modelo: ?run_id=...&tipo=top|subsistemas&top_n=10
+  """
+  run_id = request.args.get("run_id")
+  tipo = request.args.get("tipo", "top")
+  entrada = fba_results_store.obtener(run_id)
+  if entrada is None:
+    return jsonify({"error": "run_id inválido o expirado"}), 400
+
+  try:
+    registrado = modelo_de_run(entrada)
+  except Exception as e:
+    return jsonify({"error": str(e)})
+
+  topo = registrado.topologia()
+  flujos = topo.flujos_de_run(entrada)
+
+  if tipo == "subsistemas":
+    return jsonify(Graficas.histograma_subsistemas(
+      flujos, topo.codigo_subsistema, topo.lista_subsistemas
+    ))
+  if tipo == "top":
+    flujos_abs = np.abs(flujos)
+    top = indices_top_n(flujos_abs, leer_top_n(request.args.get("top_n")))
+    return jsonify(Graficas.grafica_top(
+      flujos_abs[top], [topo.rxn_nombres[i] for i in top.tolist()]
+    ))
+
+  return jsonify({"error": "Tipo de gráfica no soportado. Use top o subsistemas"}), 400
+
+
+# =====================================================
+# API: ESTADÍSTICAS DEL ALMACÉN DE RESULTADOS
+# =====================================================
+@app.route("/almacen/estadisticas")
+def almacen_estadisticas():
+  return jsonify(fba_results_store.estadisticas())
+
+
+@app.route("/modelos/estadisticas")
+def modelos_estadisticas():
+  return jsonify(registro_modelos.estadisticas())
+
+
+@app.route("/modelos/reduccion")
+def modelos_reduccion():
+  """
+  Preprocesado del modelo (?modelo_id=, por defecto el último subido):
+  reacciones bloqueadas, metabolitos sin salida y cadenas agrupadas.
+  Con &detalle=1 incluye las listas de IDs.
+  """
+  try:
+    registrado = modelo_de_request()
+  except Exception as e:
+    return jsonify({"error": str(e)}), 400
+
+  respuesta = estado_reduccion(registrado)
+  if registrado.reducido is not None and request.args.get("detalle") in ("1", "true"):
+    respuesta["bloqueadas"] = registrado.reducido.bloqueadas
+    respuesta["metabolitos_sin_salida"] = registrado.reducido.metabolitos_sin_salida
+  return jsonify(respuesta)
 
 
 # =====================================================
 # RUTA: DESCARGAR EXCEL
 # =====================================================
-@app.route("/descargar_excel", methods=["POST"])
+@app.route("/descargar_excel", methods=["GET", "POST"])
 def descargar_excel():
+  """
+  Exporta un run guardado: GET /descargar_excel?run_id=...&formato=xlsx
+  (formato: xlsx | csv | parquet). Los flujos se leen del almacén de
+  resultados y el archivo se envía en streaming mientras se escribe.
+
+  Compatibilidad: un POST con "flujos_completos" en el JSON genera el
+  Excel como antes, con los datos enviados por el cliente.
+  """
   data = request.get_json(silent=True)
+  run_id = request.args.get("run_id") or (data or {}).get("run_id")
+  if run_id:
+    formato = (request.args.get("formato") or (data or {}).get("formato") or "xlsx").lower()
+    return exportar_run_streaming(run_id, formato)
 
   # ---------------------------------------------------------
   # VALIDACIÓN: si no llegó nada, regresar sin error
@@ -326,6 +1088,25 @@ def descargar_excel():
   )
 
 
+
+def exportar_run_streaming(run_id, formato):
+  if formato not in FORMATOS_EXPORTACION:
+    return jsonify({"error": "Formato no soportado. Use xlsx, csv o parquet"}), 400
+  if formato == "parquet" and not parquet_disponible():
+    return jsonify({"error": "El formato parquet requiere pyarrow instalado."}), 400
+
+  entrada = fba_results_store.obtener(run_id)
+  if entrada is None:
+    return jsonify({"error": "run_id inválido o expirado"}), 400
+
+  contenido = exportar_run(entrada["indice"].ids, entrada["flujos"], entrada["meta"], formato)
+  return Response(
+    contenido,
+    mimetype=FORMATOS_EXPORTACION[formato],
+    headers={"Content-Disposition": f"attachment; filename=fba_resultado.{formato}"}
+  )
+
+
 # =====================================================
 # RUTA: PÁGINA DEL GRAFO 3D
 # =====================================================
@@ -347,6 +1128,12 @@ def grafo_datos():
   """
   Devuelve los datos del grafo 3D (nodes, links) en base a un run_id.
 
+  Con ?formato=binario responde en formato columnar FBG1
+  (ver utils/formato_binario.py), que decodifica static/js/grafo.js.
+
+  Con ?color=variabilidad (runs de /fva) las reacciones se colorean por
+  max − min de FVA en lugar de |flujo| (las no analizadas, color NaN).
+
   Implementa OPTIMIZACIÓN para modelos grandes (>3000 rxns):
   - Si el modelo es gigante y NO hay filtro de subsistema:
     → solo se muestran reacciones activas (flujo != 0)
@@ -354,128 +1141,126 @@ def grafo_datos():
     → mostrar todo lo de ese subsistema (completo)
   """
   run_id = request.args.get("run_id")
-  if not run_id or run_id not in fba_results_store:
+  entrada = fba_results_store.obtener(run_id)
+  if entrada is None:
     return jsonify({"error": "run_id inválido o expirado"}), 400
 
-  fluxes = fba_results_store[run_id]["fluxes"]
-
   # Cargar modelo
   try:
-    modelo = obtener_modelo_actual()
+    registrado = modelo_de_run(entrada)
   except Exception as e:
     return jsonify({"error": str(e)})
 
   # Subsistema filtrado (opcional)
   filtro_sub = request.args.get("subsystem", None)
 
-  # Lista de subsistemas únicos
-  lista_subsistemas = sorted(
-    set(r.subsystem for r in modelo.reactions if r.subsystem)
-  )
-
-  # ============================================================
-  # 🚦 DETECTAR SI EL MODELO ES GIGANTE
-  # ============================================================
-  es_gigante = len(modelo.reactions) > 3000
+  # Topología precalculada del modelo + flujos de ESTE run
+  topo = registrado.topologia()
+  flujos = topo.flujos_de_run(entrada)
 
   # Cálculo de flujo máximo
-  flux_abs_vals = [abs(v) for v in fluxes.values()]
-  max_flux = max(flux_abs_vals) if flux_abs_vals else 0.0
+  max_flux = float(np.abs(flujos).max()) if len(flujos) else 0.0
 
-  # Heatmap colores
-  if max_flux <= 0:
-    def flux_to_color(_flux):
-      return "#CCCCCC"
-  else:
-    norm = mcolors.Normalize(vmin=0, vmax=max_flux)
-    cmap = cm.plasma
+  # Variabilidad FVA (max − min) si el run la trae y se pide
+  variabilidad = None
+  rango = topo.rango_de_run(entrada) if request.args.get("color") == "variabilidad" else None
+  if rango is not None:
+    variabilidad = rango[1] - rango[0]
+    max_variabilidad = float(np.nanmax(variabilidad)) if np.isfinite(variabilidad).any() else 0.0
 
-    def flux_to_color(flux):
-      rgba = cmap(norm(abs(flux)))
-      return mcolors.to_hex(rgba)
+  # ------------------------------------------------------------
+  # Formato binario columnar opcional (?formato=binario)
+  # ------------------------------------------------------------
+  if request.args.get("formato") == "binario":
+    cols = columnas_grafo(topo, flujos, filtro_sub)
+    if variabilidad is None:
+      blob = empaquetar_grafo(topo, cols, mapa_plasma, max_flux, topo.es_gigante)
+    else:
+      blob = empaquetar_grafo(topo, cols, mapa_plasma, max_flux, topo.es_gigante,
+                              variabilidad[cols["rxn_sel"]], max_variabilidad)
+    return Response(blob, mimetype="application/octet-stream")
 
-  nodes = {}
-  links = []
+  # Heatmap colores (tabla plasma precalculada, vectorizado)
+  def colores_rxn(flujos_sel, rxn_sel):
+    if variabilidad is not None:
+      return mapa_plasma.colores_flujo(variabilidad[rxn_sel], max_variabilidad)
+    return mapa_plasma.colores_flujo(flujos_sel, max_flux)
 
   # ============================================================
-  # 🔥 CONSTRUCCIÓN DEL GRAFO (OPTIMIZADO)
+  # 🔥 CONSTRUCCIÓN DEL GRAFO (solo reacciones seleccionadas)
+  # - modelo gigante sin filtro → solo reacciones activas
+  # - con filtro → todo el subsistema
   # ============================================================
-  for rxn in modelo.reactions:
-    # Filtro por subsistema seleccionado
-    if filtro_sub and rxn.subsystem != filtro_sub:
-      continue
-
-    # Flujo real del FBA
-    rxn_flux = float(fluxes.get(rxn.id, 0.0))
-
-    # ========================================================
-    # 🚀 OPTIMIZACIÓN: si modelo gigante y NO hay filtro,
-    # solo incluir reacciones activas
-    # ========================================================
-    if es_gigante and not filtro_sub:
-      if abs(rxn_flux) < 1e-9:
-        continue  # ignorar reacciones sin actividad
-
-    # ========================================================
-    # NODO REACCIÓN
-    # ========================================================
-    if rxn.id not in nodes:
-      nodes[rxn.id] = {
-        "id": rxn.id,
-        "name": rxn.id,
-        "group": "reaction",
-        "subsystem": rxn.subsystem or "NA",
-        "val": 6,
-        "flux": abs(rxn_flux),
-        "color": flux_to_color(rxn_flux)
-      }
-
-    # ========================================================
-    # METABOLITOS Y ARISTAS
-    # ========================================================
-    for met, coeff in rxn.metabolites.items():
-      met_id = met.id
-
-      # Crear nodo del metabolito
-      if met_id not in nodes:
-        nodes[met_id] = {
-          "id": met_id,
-          "name": met_id,
-          "group": "metabolite",
-          "subsystem": rxn.subsystem or "NA",
-          "val": 2,
-          "flux": 0.0,
-          "color": "#1f77b4"
-        }
-
-      # Dirección bioquímica correcta
-      if coeff < 0:
-        source = met_id
-        target = rxn.id
-      elif coeff > 0:
-        source = rxn.id
-        target = met_id
-      else:
-        continue
-
-      links.append({
-        "source": source,
-        "target": target,
-        "flux": abs(rxn_flux),
-        "flux_signed": rxn_flux,
-        "coeff": float(coeff),
-        "color": flux_to_color(rxn_flux)
-      })
+  nodes, links = construir_grafo(topo, flujos, filtro_sub, colores_rxn)
 
   # ------------------------------------------------------------
   # RESPUESTA → enviar indicador de modelo gigante al frontend
   # ------------------------------------------------------------
-  return jsonify({
-    "nodes": list(nodes.values()),
+  respuesta = {
+    "nodes": nodes,
     "links": links,
     "max_flux": max_flux,
-    "subsistemas": lista_subsistemas,
-    "modelo_gigante": es_gigante  # 👈 NEW
+    "subsistemas": topo.lista_subsistemas,
+    "modelo_gigante": topo.es_gigante  # 👈 NEW
+  }
+  if variabilidad is not None:
+    respuesta["max_color"] = max_variabilidad
+  return jsonify(respuesta)
+
+
+# =====================================================
+# API: DIFERENCIA ENTRE LOS GRAFOS 3D DE DOS RUNS
+# =====================================================
+@app.route("/grafo_diff")
+def grafo_diff():
+  """
+  Parche para pasar el grafo 3D ya dibujado del run `base` al run
+  `other` sin volver a pedir todo el grafo (grafo.js lo aplica sobre el
+  layout existente). Ambos runs deben ser del mismo modelo; acepta el
+  mismo ?subsystem= que /grafo_datos.
+
+  La diferencia de flujos por reacción se calcula en un solo paso
+  vectorizado; solo viajan las reacciones cuyo flujo o color cambió y
+  las que entran o salen del grafo (modelo gigante sin filtro).
+  """
+  base = fba_results_store.obtener(request.args.get("base"))
+  otro = fba_results_store.obtener(request.args.get("other"))
+  if base is None or otro is None:
+    return jsonify({"error": "run_id inválido o expirado"}), 400
+  if base["modelo_id"] != otro["modelo_id"]:
+    return jsonify({"error": "Los runs son de modelos distintos; pida el grafo completo."}), 400
+
+  try:
+    registrado = modelo_de_run(otro)
+  except Exception as e:
+    return jsonify({"error": str(e)})
+
+  filtro_sub = request.args.get("subsystem", None)
+  topo = registrado.topologia()
+  flujos_base = topo.flujos_de_run(base)
+  flujos_otro = topo.flujos_de_run(otro)
+
+  max_base = float(np.abs(flujos_base).max()) if len(flujos_base) else 0.0
+  max_otro = float(np.abs(flujos_otro).max()) if len(flujos_otro) else 0.0
+
+  # Cambia el flujo o el color (el color depende también del máximo del run)
+  delta = flujos_otro - flujos_base
+  cambia = (np.abs(delta) > UMBRAL_FLUJO_ACTIVO) | (
+    mapa_plasma.indices_flujo(flujos_base, max_base)
+    != mapa_plasma.indices_flujo(flujos_otro, max_otro)
+  )
+
+  def colores_rxn(flujos_sel, rxn_sel):
+    return mapa_plasma.colores_flujo(flujos_sel, max_otro)
+
+  parche = diff_grafo(topo, flujos_base, flujos_otro, filtro_sub, cambia, colores_rxn)
+  return jsonify({
+    "base": request.args.get("base"),
+    "other": request.args.get("other"),
+    "max_flux": max_otro,
+    "max_flux_base": max_base,
+    "modelo_gigante": topo.es_gigante,
+    **parche
   })
 
 
@@ -495,96 +1280,77 @@ def grafo_alt():
 @app.route("/grafo_datos_alt")
 def grafo_datos_alt():
   run_id = request.args.get("run_id")
-  if not run_id or run_id not in fba_results_store:
+  entrada = fba_results_store.obtener(run_id)
+  if entrada is None:
     return jsonify({"error": "run_id inválido o expirado"}), 400
 
-  def limpiar_metabolito(metab_id):
-    return re.sub(r"(_\w$)", "", metab_id)
-
   # ===============================
   # 1. Cargar modelo y flujos
   # ===============================
   try:
-    modelo = obtener_modelo_actual()
+    registrado = modelo_de_run(entrada)
   except Exception as e:
     return jsonify({"error": str(e)})
 
-  fluxes = fba_results_store[run_id]["fluxes"]
+  # Listas de reacciones por metabolito solo si se piden (?reacciones=1);
+  # el frontend las pide por metabolito a /grafo_datos_alt/reacciones
+  incluir_reacciones = request.args.get("reacciones") in ("1", "true")
+
+  return jsonify(datos_grafo_alt(registrado, entrada, incluir_reacciones))
+
+
+def datos_grafo_alt(registrado, entrada, incluir_reacciones=False, progreso=sin_progreso):
+  """Nodos, enlaces y matriz S×S del grafo ALT para un run guardado."""
+  progreso(0.05, "indexando topología")
+  modelo = registrado.modelo
+  topo = registrado.topologia()
+  flujos = topo.flujos_de_run(entrada)  # en el orden de topo.rxn_ids
 
   # ===============================
-  # 2. Calcular matriz subsistemas
+  # 2. Matriz subsistemas (memorizada por modelo)
   # ===============================
-  datos_subs = generar_matriz_subsistemas(modelo)
+  progreso(0.2, "analizando subsistemas")
+  with registrado.lock.lectura():
+    datos_subs = cache_analisis.obtener(modelo, topo, registrado.modelo_id)
   metabolitos_filtrados = datos_subs["metabolitos_filtrados"]
   todos_subsistemas = datos_subs["todos_subsistemas"]
-  matriz_corr = datos_subs["matriz_correlacion"]
-  matriz_corr_dict = matriz_corr.to_dict()
+  matriz_corr_dict = datos_subs["matriz_correlacion_dict"]
 
   # ===============================
-  # 3. REACCIONES + ACTIVIDAD POR METABOLITO
+  # 3. ACTIVIDAD POR METABOLITO (|flujo| de sus reacciones)
   # ===============================
-  actividad_max = {}
-  actividad_sum = {}
-  actividad_prom = {}
-  reacciones_por_metabolito = {}  # ← AQUÍ SE GUARDAN LAS REACCIONES
-
-  # Inicializar diccionario
-  for m in metabolitos_filtrados.keys():
-    reacciones_por_metabolito[m] = []
-
-  # Recorrer reacciones del modelo
-  for rxn in modelo.reactions:
-    flujo = float(fluxes.get(rxn.id, 0.0))
-    for met in rxn.metabolites:
-      metab_limpio = limpiar_metabolito(met.id)
-      if metab_limpio in reacciones_por_metabolito:
-        reacciones_por_metabolito[metab_limpio].append({
-          "id": rxn.id,
-          "flux": flujo
-        })
-
-  # Calcular actividad metabólica
-  for metab, lista_rxn in reacciones_por_metabolito.items():
-    flujos_abs = [abs(r["flux"]) for r in lista_rxn]
-    if len(flujos_abs) == 0:
-      actividad_max[metab] = 0
-      actividad_sum[metab] = 0
-      actividad_prom[metab] = 0
-    else:
-      actividad_max[metab] = max(flujos_abs)
-      actividad_sum[metab] = sum(flujos_abs)
-      actividad_prom[metab] = actividad_sum[metab] / len(flujos_abs)
+  progreso(0.7, "calculando actividad")
+  incidencia = datos_subs["incidencia"]
+  maximo, suma, promedio = incidencia.actividad(flujos)
+  actividad_max = dict(zip(incidencia.metabolitos, maximo.tolist()))
+  actividad_sum = dict(zip(incidencia.metabolitos, suma.tolist()))
+  actividad_prom = dict(zip(incidencia.metabolitos, promedio.tolist()))
 
   # Normalización de colores (heatmap actividad)
   max_global = max(actividad_max.values()) if actividad_max else 1
-  norm = mcolors.Normalize(vmin=0, vmax=max_global)
-  cmap = cm.plasma
-
-  def actividad_to_color(v):
-    rgba = cmap(norm(v))
-    return mcolors.to_hex(rgba)
 
   # ============================================================
   # 🚦 DETECTAR SI EL MODELO ES GIGANTE Y FILTRAR METABOLITOS
+  #    (gigante: solo metabolitos con actividad_max > 0 y los
+  #    subsistemas que tengan al menos uno de ellos)
   # ============================================================
   es_gigante = len(modelo.reactions) > 3000
-  if es_gigante:
-    # Solo conservar metabolitos con actividad_max > 0
-    metabolitos_filtrados_activos = {
-      m: subs
-      for m, subs in metabolitos_filtrados.items()
-      if actividad_max.get(m, 0) > 0
-    }
-  else:
-    metabolitos_filtrados_activos = metabolitos_filtrados
+  metabolitos_filtrados_activos, subs_conectados = seleccionar_metabolitos_alt(
+    metabolitos_filtrados, todos_subsistemas, actividad_max, es_gigante
+  )
 
   # ===============================
   # 4. Construcción NODOS ALT
   # ===============================
+  progreso(0.85, "construyendo nodos")
   nodos = []
 
   # --- Metabolitos ---
-  for metab, subs in metabolitos_filtrados_activos.items():
+  colores_metab = mapa_plasma.colores(
+    [actividad_max.get(m, 0) for m in metabolitos_filtrados_activos],
+    max_global
+  )
+  for (metab, subs), color in zip(metabolitos_filtrados_activos.items(), colores_metab):
     nodos.append({
       "id": metab,
       "type": "metabolite",
@@ -593,20 +1359,13 @@ def grafo_datos_alt():
       "actividad_max": actividad_max.get(metab, 0),
       "actividad_suma": actividad_sum.get(metab, 0),
       "actividad_promedio": actividad_prom.get(metab, 0),
-      "color": actividad_to_color(actividad_max.get(metab, 0)),
-      "val": 5,
-      "reacciones": reacciones_por_metabolito.get(metab, [])
+      "color": color,
+      "val": 5
     })
+    if incluir_reacciones:
+      nodos[-1]["reacciones"] = incidencia.reacciones(metab, flujos, topo.rxn_ids)
 
   # --- Subsistemas ---
-  if es_gigante:
-    # Solo subsistemas que tengan al menos un metabolito activo
-    subs_conectados = sorted(
-      {s for subs in metabolitos_filtrados_activos.values() for s in subs}
-    )
-  else:
-    subs_conectados = todos_subsistemas
-
   for subs in subs_conectados:
     nodos.append({
       "id": subs,
@@ -636,7 +1395,7 @@ def grafo_datos_alt():
     for m, subs in metabolitos_filtrados_activos.items()
   }
 
-  return jsonify({
+  return {
     "nodes": nodos,
     "links": enlaces,
     "subsistemas": subs_conectados,
@@ -644,47 +1403,89 @@ def grafo_datos_alt():
     "metabolitos_filtrados": metab_json,
     "ruta_xlsx": datos_subs["ruta_xlsx"],
     "modelo_gigante": es_gigante
+  }
+
+
+@app.route("/grafo_datos_alt/reacciones")
+def grafo_datos_alt_reacciones():
+  """
+  Reacciones (id + flujo del run) donde participa un metabolito del
+  grafo ALT: ?run_id=...&metabolito=...
+  """
+  run_id = request.args.get("run_id")
+  metabolito = request.args.get("metabolito", "")
+  entrada = fba_results_store.obtener(run_id)
+  if entrada is None:
+    return jsonify({"error": "run_id inválido o expirado"}), 400
+
+  try:
+    registrado = modelo_de_run(entrada)
+  except Exception as e:
+    return jsonify({"error": str(e)})
+
+  topo = registrado.topologia()
+  with registrado.lock.lectura():
+    incidencia = cache_analisis.obtener(registrado.modelo, topo, registrado.modelo_id)["incidencia"]
+  if metabolito not in incidencia.posicion:
+    return jsonify({"error": f"El metabolito '{metabolito}' no está en el grafo ALT."}), 404
+
+  return jsonify({
+    "metabolito": metabolito,
+    "reacciones": incidencia.reacciones(metabolito, topo.flujos_de_run(entrada), topo.rxn_ids)
   })
 
 
-@app.route("/descargar_matriz_alt", methods=["POST"])
+@app.route("/descargar_matriz_alt", methods=["GET", "POST"])
 def descargar_matriz_alt():
   """
   Exporta:
   - Hoja 1: matriz S×S
   - Hoja 2: tabla de relaciones con lista de metabolitos que conectan cada par
+
+  GET /descargar_matriz_alt?run_id=...: todo se calcula en el servidor
+  (análisis memorizado del modelo + metabolitos activos del run).
+  Compatibilidad: un POST con matriz_correlacion, metabolitos_filtrados
+  y subsistemas usa los datos enviados por el cliente.
   """
-  data = request.get_json()
-  matriz_corr = data.get("matriz_correlacion")
-  metabolitos_filtrados = data.get("metabolitos_filtrados") or {}  # {metabolito: [subsistemas]}
-  todos_subsistemas = data.get("subsistemas")
+  data = request.get_json(silent=True) or {}
+  run_id = request.args.get("run_id") or data.get("run_id")
+
+  if run_id:
+    entrada = fba_results_store.obtener(run_id)
+    if entrada is None:
+      return jsonify({"error": "run_id inválido o expirado"}), 400
+    try:
+      registrado = modelo_de_run(entrada)
+    except Exception as e:
+      return jsonify({"error": str(e)})
+
+    topo = registrado.topologia()
+    with registrado.lock.lectura():
+      datos_subs = cache_analisis.obtener(registrado.modelo, topo, registrado.modelo_id)
+    incidencia = datos_subs["incidencia"]
+    maximo, _, _ = incidencia.actividad(topo.flujos_de_run(entrada))
+    metabolitos_filtrados, todos_subsistemas = seleccionar_metabolitos_alt(
+      datos_subs["metabolitos_filtrados"],
+      datos_subs["todos_subsistemas"],
+      dict(zip(incidencia.metabolitos, maximo.tolist())),
+      len(topo.rxn_ids) > 3000
+    )
+    df_matriz = datos_subs["matriz_correlacion"]
+  else:
+    matriz_corr = data.get("matriz_correlacion")
+    metabolitos_filtrados = data.get("metabolitos_filtrados") or {}  # {metabolito: [subsistemas]}
+    todos_subsistemas = data.get("subsistemas") or []
 
-  if not matriz_corr:
-    return jsonify({"error": "No se recibió matriz"}), 400
+    if not matriz_corr:
+      return jsonify({"error": "No se recibió matriz"}), 400
 
-  # Convertir dict → DataFrame
-  df_matriz = pd.DataFrame(matriz_corr)
+    # Convertir dict → DataFrame
+    df_matriz = pd.DataFrame(matriz_corr)
 
   # ============================================================
-  # 2. Construcción de la tabla de relaciones
+  # 2. Construcción de la tabla de relaciones (índice invertido)
   # ============================================================
-  filas = []
-  for i, subsA in enumerate(todos_subsistemas):
-    for subsB in todos_subsistemas[i + 1:]:  # evitar duplicados A–B y B–A
-      # Metabolitos que conectan ambos
-      conectan = []
-      for metab, lista_subs in metabolitos_filtrados.items():
-        if subsA in lista_subs and subsB in lista_subs:
-          conectan.append(metab)
-
-      if len(conectan) > 0:
-        filas.append({
-          "Subsistema A": subsA,
-          "Subsistema B": subsB,
-          "Metabolitos": ", ".join(conectan)
-        })
-
-  df_relaciones = pd.DataFrame(filas)
+  df_relaciones = pd.DataFrame(tabla_relaciones(metabolitos_filtrados, todos_subsistemas))
 
   # ============================================================
   # 3. Generar Excel en memoria
@@ -717,6 +1518,189 @@ def descargar_matriz_alt():
   )
 
 
+# =====================================================
+# API: TRABAJOS EN SEGUNDO PLANO (progreso + cancelación)
+# =====================================================
+# POST /trabajos {"tipo": ..., "parametros": {...}} → 202 + trabajo_id
+#   solicitud  → parámetros de /solicitud (perfil, campos, restricciones...)
+#   grafo_alt  → {"run_id", "reacciones"}
+#   exportar   → {"run_id", "formato"}  (xlsx | csv | parquet)
+#   knockouts  → parámetros de /knockouts (run_id, tipo, doble...)
+# POST /trabajos/cargar_modelo (multipart, igual que /cargar_modelo)
+# GET  /trabajos/<id>            estado, progreso (0–1) y etapa
+# GET  /trabajos/<id>/resultado  JSON o archivo (202 si no terminó)
+# POST /trabajos/<id>/cancelar   (o DELETE /trabajos/<id>)
+@app.errorhandler(ColaLlena)
+def cola_llena(e):
+  return jsonify({"error": str(e)}), 503
+
+
+@app.route("/trabajos", methods=["POST"])
+def crear_trabajo():
+  data = request.get_json(silent=True) or {}
+  tipo = data.get("tipo")
+  parametros = data.get("parametros") or {}
+
+  if tipo == "solicitud":
+    campos = campos_solicitud(parametros)
+    if campos is None:
+      return jsonify({"error": "Perfil no soportado. Use minimal, kpis o full"}), 400
+    trabajo = cola_trabajos.enviar(tipo, trabajo_solicitud, parametros, campos)
+
+  elif tipo == "grafo_alt":
+    if fba_results_store.obtener(parametros.get("run_id")) is None:
+      return jsonify({"error": "run_id inválido o expirado"}), 400
+    trabajo = cola_trabajos.enviar(
+      tipo, trabajo_grafo_alt, parametros["run_id"],
+      parametros.get("reacciones") in (True, "1", "true")
+    )
+
+  elif tipo == "exportar":
+    formato = (parametros.get("formato") or "xlsx").lower()
+    if formato not in FORMATOS_EXPORTACION:
+      return jsonify({"error": "Formato no soportado. Use xlsx, csv o parquet"}), 400
+    if formato == "parquet" and not parquet_disponible():
+      return jsonify({"error": "El formato parquet requiere pyarrow instalado."}), 400
+    if fba_results_store.obtener(parametros.get("run_id")) is None:
+      return jsonify({"error": "run_id inválido o expirado"}), 400
+    trabajo = cola_trabajos.enviar(tipo, trabajo_exportar, parametros["run_id"], formato)
+
+  elif tipo == "knockouts":
+    trabajo = cola_trabajos.enviar(tipo, trabajo_knockouts, parametros)
+
+  else:
+    return jsonify({
+      "error": "Tipo de trabajo no soportado. Use solicitud, grafo_alt, exportar o knockouts"
+    }), 400
+
+  return jsonify(trabajo.a_dict()), 202
+
+
+@app.route("/trabajos/cargar_modelo", methods=["POST"])
+def crear_trabajo_cargar_modelo():
+  datos, ext, nombre = leer_archivo_modelo()
+  if datos is None:
+    return jsonify({"error": ext}), 400
+
+  trabajo = cola_trabajos.enviar("cargar_modelo", registrar_modelo_en_trabajo, datos, ext, nombre)
+  return jsonify(trabajo.a_dict()), 202
+
+
+def obtener_trabajo(trabajo_id):
+  """Trabajo de /trabajos o del preprocesado de modelos (None si no existe)."""
+  return cola_trabajos.obtener(trabajo_id) or cola_preprocesado.obtener(trabajo_id)
+
+
+@app.route("/trabajos/<trabajo_id>", methods=["GET", "DELETE"])
+def estado_trabajo(trabajo_id):
+  trabajo = obtener_trabajo(trabajo_id)
+  if trabajo is None:
+    return jsonify({"error": "trabajo_id inválido o expirado"}), 404
+  if request.method == "DELETE":
+    trabajo.cancelar()
+  return jsonify(trabajo.a_dict())
+
+
+@app.route("/trabajos/<trabajo_id>/cancelar", methods=["POST"])
+def cancelar_trabajo(trabajo_id):
+  trabajo = obtener_trabajo(trabajo_id)
+  if trabajo is None:
+    return jsonify({"error": "trabajo_id inválido o expirado"}), 404
+  trabajo.cancelar()
+  return jsonify(trabajo.a_dict())
+
+
+@app.route("/trabajos/<trabajo_id>/resultado")
+def resultado_trabajo(trabajo_id):
+  trabajo = obtener_trabajo(trabajo_id)
+  if trabajo is None:
+    return jsonify({"error": "trabajo_id inválido o expirado"}), 404
+  if trabajo.estado not in ESTADOS_FINALES:
+    return jsonify(trabajo.a_dict()), 202
+  if trabajo.estado != TERMINADO:
+    return jsonify(trabajo.a_dict()), 409
+
+  resultado = trabajo.resultado
+  if trabajo.tipo == "exportar":
+    return send_file(
+      resultado["archivo"],
+      as_attachment=True,
+      download_name=resultado["nombre"],
+      mimetype=resultado["mimetype"]
+    )
+  return jsonify(resultado)
+
+
+@app.route("/trabajos/estadisticas")
+def trabajos_estadisticas():
+  return jsonify({**cola_trabajos.estadisticas(), "preprocesado": cola_preprocesado.estadisticas()})
+
+
+def trabajo_solicitud(progreso, data, campos):
+  return resultado_solicitud(data, campos, progreso)
+
+
+def trabajo_grafo_alt(progreso, run_id, incluir_reacciones):
+  entrada = fba_results_store.obtener(run_id)
+  if entrada is None:
+    raise ValueError("run_id inválido o expirado")
+  return datos_grafo_alt(modelo_de_run(entrada), entrada, incluir_reacciones, progreso)
+
+
+def trabajo_exportar(progreso, run_id, formato):
+  """Escribe la exportación a un archivo temporal (se borra al expirar el trabajo)."""
+  entrada = fba_results_store.obtener(run_id)
+  if entrada is None:
+    raise ValueError("run_id inválido o expirado")
+
+  progreso(0.05, "leyendo run")
+  fd, ruta = tempfile.mkstemp(prefix="fba_resultado_", suffix=f".{formato}")
+  try:
+    with os.fdopen(fd, "wb") as archivo:
+      for trozo in exportar_run(
+        entrada["indice"].ids, entrada["flujos"], entrada["meta"], formato, progreso
+      ):
+        archivo.write(trozo)
+  except BaseException:
+    os.remove(ruta)
+    raise
+
+  return {
+    "archivo": ruta,
+    "nombre": f"fba_resultado.{formato}",
+    "mimetype": FORMATOS_EXPORTACION[formato]
+  }
+
+
+def trabajo_knockouts(progreso, data):
+  return cribado_knockouts(data, progreso)
+
+
+def registrar_modelo_en_trabajo(progreso, datos, ext, nombre):
+  return registrar_modelo(datos, ext, nombre, progreso)
+
+
+def trabajo_reducir_modelo(progreso, registrado):
+  """Modelo reducido del caché o, la primera vez, calculado y guardado."""
+  clave = registrado.modelo_id
+  reducido = cache_modelos.obtener_reduccion(clave)
+  if reducido is None:
+    # En un proceso aparte (los LPs retienen el GIL) que lee su propia
+    # copia del pickle: el preprocesado cambia sus bounds y su objetivo,
+    # y así no toma el lock del modelo compartido
+    if not cache_modelos.contiene(clave):
+      raise ValueError("El modelo ya no está en el caché.")
+    progreso(0.01, "leyendo copia del modelo")
+    reducir_en_proceso(cache_modelos.ruta(clave), cache_modelos.ruta_reduccion(clave), progreso)
+    cache_modelos.reduccion_escrita(clave)
+    reducido = cache_modelos.obtener_reduccion(clave)
+    if reducido is None:
+      raise ValueError("No se pudo leer el modelo reducido.")
+
+  registrado.reducido = reducido
+  return reducido.resumen
+
+
 # =====================================================
 # EJECUTAR SERVIDOR
 # =====================================================
@@ -0,0 +1,75 @@
+# benchmarks/bench_aislamiento.py
+"""
+Microbenchmark del aislamiento de restricciones por petición.
+
+Mide el coste de aplicar k restricciones dentro de `with modelo:` y
+revertirlas al salir (sin resolver el LP), para modelos sintéticos de
+tamaño creciente. El coste debe mantenerse plano con el tamaño del
+modelo; como referencia se mide también `modelo.copy()`.
+
+Uso:
+    python -m benchmarks.bench_aislamiento [ruta_modelo.mat ...]
+"""
+import sys
+import time
+
+import cobra
+
+from utils.cache_modelos import leer_modelo
+from utils.restricciones import aplicar_restricciones
+
+
+def modelo_sintetico(n_reacciones: int) -> cobra.Model:
+    """Cadena lineal M0 -> M1 -> ... con intercambio en los extremos."""
+    modelo = cobra.Model(f"cadena_{n_reacciones}")
+    metabolitos = [cobra.Metabolite(f"M{i}_c") for i in range(n_reacciones + 1)]
+
+    reacciones = []
+    for i in range(n_reacciones):
+        rxn = cobra.Reaction(f"R{i}", lower_bound=-1000, upper_bound=1000)
+        rxn.add_metabolites({metabolitos[i]: -1, metabolitos[i + 1]: 1})
+        reacciones.append(rxn)
+
+    entrada = cobra.Reaction("EX_in", lower_bound=-10, upper_bound=1000)
+    entrada.add_metabolites({metabolitos[0]: -1})
+    salida = cobra.Reaction("EX_out", lower_bound=0, upper_bound=1000)
+    salida.add_metabolites({metabolitos[-1]: -1})
+
+    modelo.add_reactions(reacciones + [entrada, salida])
+    modelo.objective = "EX_out"
+    return modelo
+
+
+def medir(modelo: cobra.Model, k: int = 5, repeticiones: int = 200) -> tuple[float, float]:
+    ids = [r.id for r in modelo.reactions[:k]]
+    restricciones = [
+        {"reaccion": rxn_id, "limite": "upper", "valor": 5.0} for rxn_id in ids
+    ]
+
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        with modelo:
+            aplicar_restricciones(modelo, restricciones)
+    por_peticion = (time.perf_counter() - t0) / repeticiones
+
+    t0 = time.perf_counter()
+    modelo.copy()
+    copia = time.perf_counter() - t0
+
+    return por_peticion, copia
+
+
+def main():
+    casos = [(f"sintético {n}", modelo_sintetico(n)) for n in (100, 1000, 5000, 20000)]
+    for ruta in sys.argv[1:]:
+        casos.append((ruta, leer_modelo(ruta, ruta.rsplit(".", 1)[-1])))
+
+    print(f"{'modelo':<30}{'reacciones':>12}{'with+rollback (ms)':>22}{'copy() (ms)':>14}")
+    for nombre, modelo in casos:
+        por_peticion, copia = medir(modelo)
+        print(f"{nombre:<30}{len(modelo.reactions):>12}"
+              f"{por_peticion * 1e3:>22.3f}{copia * 1e3:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
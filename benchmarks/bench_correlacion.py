@@ -0,0 +1,153 @@
+# benchmarks/bench_correlacion.py
+"""
+Benchmark del análisis de subsistemas del grafo ALT.
+
+Compara las versiones actuales (matriz de intensidad dispersa y matriz
+S×S por niveles con productos de incidencia) contra las implementaciones
+originales (matriz densa con listas, `df.loc` fila a fila y bucles por
+par con `.loc[A, B] += 1`), copiadas aquí como referencia. Verifica
+además que den exactamente el mismo resultado.
+
+Uso:
+    python -m benchmarks.bench_correlacion [ruta_modelo.mat ...]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.cache_modelos import leer_modelo
+from utils.filtrado_alt import (
+    buscar_en_rango_por_columna,
+    construir_diccionario_metabolitos,
+    construir_matriz_correlacion,
+    construir_matriz_intensity,
+    filtrar_metabolitos,
+)
+
+
+# ============================================================
+# Implementaciones originales (referencia)
+# ============================================================
+def matriz_intensity_original(metabolitos_filtrados: dict) -> pd.DataFrame:
+    metabolitos_lista = sorted(metabolitos_filtrados.keys())
+    subs_fila = sorted({s for subs in metabolitos_filtrados.values() for s in subs})
+
+    matrix_intensity = []
+    for subsistema in subs_fila:
+        fila = []
+        for metab in metabolitos_lista:
+            if subsistema in metabolitos_filtrados[metab]:
+                fila.append(len(metabolitos_filtrados[metab]))
+            else:
+                fila.append(0)
+        matrix_intensity.append(fila)
+
+    return pd.DataFrame(matrix_intensity, index=subs_fila, columns=metabolitos_lista)
+
+
+def buscar_en_rango_original(df: pd.DataFrame, min_val: int = 2) -> dict:
+    total_subsistemas = df.shape[0]
+    max_val_bruto = int(df.values.max())
+    if max_val_bruto == total_subsistemas:
+        max_val = max_val_bruto - 1
+    else:
+        max_val = max_val_bruto
+
+    resultados = {}
+    for subs in df.index:
+        fila = df.loc[subs]
+        valores = fila[(fila >= min_val) & (fila <= max_val)]
+        for col, val in valores.items():
+            if val not in resultados:
+                resultados[val] = {}
+            if col not in resultados[val]:
+                resultados[val][col] = []
+            resultados[val][col].append(subs)
+
+    return resultados
+
+
+def matriz_correlacion_original(df_intensity: pd.DataFrame) -> pd.DataFrame:
+    resultados = buscar_en_rango_original(df_intensity, min_val=2)
+
+    resultados_legibles = {
+        int(k): {col: sorted(v) for col, v in valores.items()}
+        for k, valores in sorted(resultados.items())
+    }
+
+    subsistemas = df_intensity.index
+    matriz = np.identity(len(subsistemas))
+    matriz_correlacion = pd.DataFrame(matriz, index=subsistemas, columns=subsistemas)
+
+    numeros = list(resultados_legibles.keys())
+    indice = 0
+
+    while 1.0 in matriz_correlacion.sum(axis=1).values:
+        if indice >= len(numeros):
+            break
+
+        numero = numeros[indice]
+
+        for metabolito, filas in resultados_legibles[numero].items():
+            for i in range(len(filas)):
+                for j in range(i + 1, len(filas)):
+                    A = filas[i]
+                    B = filas[j]
+                    matriz_correlacion.loc[A, B] += 1
+                    matriz_correlacion.loc[B, A] += 1
+
+        if 1.0 not in matriz_correlacion.sum(axis=1).values:
+            break
+
+        indice += 1
+
+    return matriz_correlacion
+
+
+# ============================================================
+# Medición
+# ============================================================
+def medir(funcion, entrada, repeticiones: int) -> tuple[float, object]:
+    mejor = float("inf")
+    resultado = None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = funcion(entrada)
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor, resultado
+
+
+def fila(modelo_id: str, paso: str, forma: str, t_orig: float, t_nuevo: float,
+         igual: bool) -> None:
+    print(f"{modelo_id[:19]:<20}{paso:<14}{forma:>12}{t_orig:>11.3f}s"
+          f"{t_nuevo:>11.4f}s{t_orig / t_nuevo:>7.0f}x  {igual}")
+
+
+def main(rutas: list) -> None:
+    rutas = rutas or ["models/e_coli_core.mat"]
+
+    print(f"{'modelo':<20}{'paso':<14}{'S×M':>12}{'original':>12}{'nuevo':>12}{'x':>8}  igual")
+    for ruta in rutas:
+        modelo = leer_modelo(ruta, ruta.rsplit(".", 1)[-1].lower())
+        metabolitos_dict = construir_diccionario_metabolitos(modelo)
+        metabolitos_filtrados, _ = filtrar_metabolitos(metabolitos_dict)
+
+        t_orig, df = medir(matriz_intensity_original, metabolitos_filtrados, 1)
+        t_nuevo, intensidad = medir(construir_matriz_intensity, metabolitos_filtrados, 5)
+        forma = f"{df.shape[0]}×{df.shape[1]}"
+        fila(modelo.id, "intensidad", forma, t_orig, t_nuevo,
+             intensidad.a_dataframe().equals(df))
+
+        t_orig, r_orig = medir(buscar_en_rango_original, df, 1)
+        t_nuevo, r_nuevo = medir(buscar_en_rango_por_columna, intensidad, 5)
+        fila(modelo.id, "rango", forma, t_orig, t_nuevo, r_orig == r_nuevo)
+
+        t_orig, m_orig = medir(matriz_correlacion_original, df, 1)
+        t_nuevo, m_nuevo = medir(construir_matriz_correlacion, intensidad, 5)
+        fila(modelo.id, "correlacion", forma, t_orig, t_nuevo, m_orig.equals(m_nuevo))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
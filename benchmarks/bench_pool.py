@@ -0,0 +1,64 @@
+# benchmarks/bench_pool.py
+"""
+Throughput del pool de procesos frente a la ejecución en serie.
+
+Barrido de captación de glucosa (o del bound indicado) con N puntos,
+primero en un solo proceso y después con el pool para 1, 2, 4, ...
+workers hasta `os.cpu_count()`.
+
+Uso:
+    python -m benchmarks.bench_pool ruta_modelo.mat OBJETIVO REACCION [puntos]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from utils.cache_modelos import CacheModelos
+from utils.escenarios import ejecutar_escenario, restricciones_de_escenario
+from utils.pool_fba import PoolFBA, escenarios_barrido
+from utils.sesion_solver import SesionSolver
+
+
+def main():
+    ruta, objetivo, reaccion = sys.argv[1:4]
+    puntos = int(sys.argv[4]) if len(sys.argv) > 4 else 200
+
+    with open(ruta, "rb") as f:
+        datos = f.read()
+    cache = CacheModelos(directorio=tempfile.mkdtemp())
+    modelo, clave, _ = cache.cargar(datos, ruta.rsplit(".", 1)[-1],
+                                    os.path.join(cache.directorio, "original"))
+
+    escenarios = escenarios_barrido(
+        objetivo, [], reaccion, "lower", np.linspace(-20, 0, puntos).tolist()
+    )
+
+    sesion = SesionSolver(modelo)
+    t0 = time.perf_counter()
+    for esc in escenarios:
+        ejecutar_escenario(modelo, sesion, esc["funcion_objetivo"],
+                           restricciones_de_escenario(esc))
+    serie = time.perf_counter() - t0
+    print(f"serie: {serie:.2f} s ({puntos / serie:.1f} escenarios/s)")
+
+    n = 1
+    while n <= (os.cpu_count() or 1):
+        pool = PoolFBA(n_procesos=n)
+        pool.preparar(clave, cache.ruta(clave))
+        list(pool.escenarios(clave, escenarios[:n]))  # arranque + carga del modelo
+
+        t0 = time.perf_counter()
+        list(pool.escenarios(clave, escenarios))
+        tiempo = time.perf_counter() - t0
+        pool.cerrar()
+
+        print(f"pool {n:>2} workers: {tiempo:.2f} s "
+              f"({puntos / tiempo:.1f} escenarios/s, x{serie / tiempo:.2f})")
+        n *= 2
+
+
+if __name__ == "__main__":
+    main()
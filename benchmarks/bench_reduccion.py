@@ -0,0 +1,102 @@
+# benchmarks/bench_reduccion.py
+"""
+Tiempo de resolución con el modelo reducido frente al completo.
+
+Preprocesa el modelo (reacciones bloqueadas, metabolitos sin salida y
+cadenas lineales, ver utils/reduccion.py) y resuelve los mismos
+escenarios con ambos: cada escenario escala la captación de los
+intercambios abiertos del modelo. Verifica además que el valor objetivo
+coincida.
+
+Uso:
+    python -m benchmarks.bench_reduccion [ruta_modelo.mat] [escenarios]
+"""
+import pickle
+import sys
+import time
+
+import numpy as np
+
+from utils.cache_modelos import leer_modelo
+from utils.escenarios import ejecutar_escenario
+from utils.reduccion import ejecutar_escenario_reducido, reducir_modelo
+from utils.sesion_solver import SesionSolver
+
+
+def escenarios_captacion(modelo, n: int, semilla: int = 0) -> list:
+    """Bound inferior de cada intercambio abierto × factor aleatorio (0.1–1)."""
+    abiertos = [r for r in modelo.exchanges if r.lower_bound < 0]
+    rng = np.random.default_rng(semilla)
+    return [
+        [
+            {"reaccion": r.id, "limite": "lower", "valor": r.lower_bound * float(f)}
+            for r, f in zip(abiertos, rng.uniform(0.1, 1.0, len(abiertos)))
+        ]
+        for _ in range(n)
+    ]
+
+
+def medir(resolver, escenarios: list) -> tuple[float, list, list]:
+    valores, iteraciones = [], []
+    t0 = time.perf_counter()
+    for restricciones in escenarios:
+        resultado = resolver(restricciones)
+        valores.append(resultado["solution"].objective_value)
+        iteraciones.append(resultado["solver"]["iteraciones"] or 0)
+    return time.perf_counter() - t0, valores, iteraciones
+
+
+def main():
+    ruta = sys.argv[1] if len(sys.argv) > 1 else "models/Recon3D_301.mat"
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    t0 = time.perf_counter()
+    modelo = leer_modelo(ruta, ruta.rsplit(".", 1)[-1])
+    print(f"{ruta}: {len(modelo.reactions)} reacciones, "
+          f"{len(modelo.metabolites)} metabolitos (lectura {time.perf_counter() - t0:.1f} s)")
+
+    copia = pickle.loads(pickle.dumps(modelo, protocol=pickle.HIGHEST_PROTOCOL))
+    reducido = reducir_modelo(copia)
+    r = reducido.resumen
+    print(f"preprocesado: {r['segundos']:.1f} s, {r['lps']} LPs")
+    print(f"  bloqueadas {r['bloqueadas']} ({r['bloqueadas_estructurales']} estructurales), "
+          f"metabolitos sin salida {r['metabolitos_sin_salida']}, "
+          f"{r['reacciones_agrupadas']} reacciones agrupadas en {r['cadenas']} cadenas")
+    print(f"  reducido: {r['reacciones_reducido']} reacciones, "
+          f"{r['metabolitos_reducido']} metabolitos")
+
+    objetivo = [v.name for v in modelo.objective.variables if "_reverse_" not in v.name][0]
+    escenarios = escenarios_captacion(modelo, n)
+
+    sesion = SesionSolver(modelo)
+    completo = medir(
+        lambda restricciones: ejecutar_escenario(modelo, sesion, objetivo, restricciones),
+        escenarios
+    )
+
+    sesion_reducida = SesionSolver(reducido.modelo)
+    sin_reducir = []
+
+    def resolver_reducido(restricciones):
+        resultado = ejecutar_escenario_reducido(
+            modelo, reducido, sesion_reducida, objetivo, restricciones
+        )
+        if resultado is None:
+            sin_reducir.append(restricciones)
+            resultado = ejecutar_escenario(modelo, sesion, objetivo, restricciones)
+        return resultado
+
+    reduccion = medir(resolver_reducido, escenarios)
+
+    for nombre, (tiempo, _, iteraciones) in (("completo", completo), ("reducido", reduccion)):
+        print(f"{nombre}: {tiempo:.2f} s para {n} escenarios "
+              f"({1e3 * tiempo / n:.1f} ms/escenario, {np.mean(iteraciones):.0f} iteraciones simplex)")
+    print(f"aceleración x{completo[0] / reduccion[0]:.2f}, "
+          f"escenarios que cayeron al modelo completo: {len(sin_reducir)}")
+
+    diferencia = np.nanmax(np.abs(np.array(completo[1]) - np.array(reduccion[1])))
+    print(f"máx |Δ objetivo|: {diferencia:.2e}")
+
+
+if __name__ == "__main__":
+    main()
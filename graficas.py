@@ -1,24 +1,56 @@
 import numpy as np
 
-class Graficas:
-    @staticmethod
-    def generar_grafica(solution, modelo):
 
-        flujos_ord = solution.fluxes.abs().sort_values(ascending=False)
-        flujos = np.array(flujos_ord.values)
+TOP_N = 10          # reacciones en la gráfica principal (por defecto)
+MAX_TOP_N = 200
+
 
-        # =============================
-        # 🔥 Obtener nombre completo
-        # =============================
-        rxns_ids = list(flujos_ord.index)
+def indices_top_n(valores: np.ndarray, n: int) -> np.ndarray:
+    """
+    Índices de los n valores más grandes, ordenados de mayor a menor
+    (empates por posición). Selección parcial con argpartition: O(R)
+    en vez de ordenar todo el vector. NaN cuenta como el menor.
+    """
+    valores = np.where(np.isnan(valores), -np.inf, valores)
+    n = min(n, len(valores))
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
 
-        rxns = np.array([
-            modelo.reactions.get_by_id(r).name if modelo.reactions.get_by_id(r).name else r
-            for r in rxns_ids
-        ])
+    umbral = np.partition(valores, len(valores) - n)[len(valores) - n]
+    mayores = np.flatnonzero(valores > umbral)
+    iguales = np.flatnonzero(valores == umbral)[:n - len(mayores)]
+    sel = np.concatenate([mayores, iguales])
+    return sel[np.lexsort((sel, -valores[sel]))]
 
-        top_n = 10
-        values = np.round(flujos[:top_n], 2).astype(str)
+
+class Graficas:
+    @staticmethod
+    def generar_grafica(solution, modelo, top_n: int = TOP_N, nombres=None):
+        """
+        Barras horizontales con las `top_n` reacciones de mayor |flujo|.
+        `nombres` (opcional): nombre por reacción en el orden del modelo
+        (ver IndiceTopologia.rxn_nombres); si no se pasa, solo se buscan
+        en el modelo los nombres de las `top_n` elegidas.
+        """
+        flujos_abs = np.abs(solution.fluxes.values)
+        top = indices_top_n(flujos_abs, top_n)
+
+        if nombres is not None and len(nombres) == len(flujos_abs):
+            etiquetas = [nombres[i] for i in top.tolist()]
+        else:
+            ids = solution.fluxes.index
+            etiquetas = [
+                modelo.reactions.get_by_id(ids[i]).name or ids[i] for i in top.tolist()
+            ]
+
+        return Graficas.grafica_top(flujos_abs[top], etiquetas)
+
+    @staticmethod
+    def grafica_top(flujos, rxns):
+        """Figura Plotly de barras para flujos ya seleccionados y ordenados."""
+        flujos = np.asarray(flujos, dtype=np.float64)
+        top_n = len(flujos)
+        values = np.round(flujos, 2).astype(str)
 
         # ====================================================
         # 🎨 GENERADOR DEGRADADO
@@ -42,8 +74,8 @@ class Graficas:
         # ====================================================
         trace = {
             "type": "bar",
-            "x": flujos[:top_n].tolist(),
-            "y": rxns[:top_n].tolist(),
+            "x": flujos.tolist(),
+            "y": list(rxns),
             "orientation": "h",
 
             "text": values.tolist(),
@@ -100,3 +132,55 @@ class Graficas:
         }
 
         return {"data": [trace], "layout": layout}
+
+    @staticmethod
+    def histograma_subsistemas(flujos, codigo_subsistema, lista_subsistemas):
+        """
+        Suma de |flujo| por subsistema (barras horizontales, de mayor a
+        menor). `codigo_subsistema`: índice en `lista_subsistemas` por
+        reacción (-1 = sin subsistema, se agrupa como "NA").
+        """
+        flujos_abs = np.abs(np.asarray(flujos, dtype=np.float64))
+        codigo = np.where(codigo_subsistema < 0, len(lista_subsistemas), codigo_subsistema)
+        etiquetas = list(lista_subsistemas) + ["NA"]
+
+        total = np.bincount(codigo, weights=flujos_abs, minlength=len(etiquetas))
+        activas = np.bincount(codigo, weights=flujos_abs > 1e-6, minlength=len(etiquetas))
+        orden = [i for i in np.argsort(-total, kind="stable").tolist() if total[i] > 0]
+
+        trace = {
+            "type": "bar",
+            "x": total[orden].tolist(),
+            "y": [etiquetas[i] for i in orden],
+            "orientation": "h",
+            "customdata": activas[orden].astype(int).tolist(),
+            "hovertemplate": "%{y}<br>Σ|flux| = %{x:.2f}<br>%{customdata} active reactions<extra></extra>",
+            "marker": {
+                "color": "rgb(72,20,143)",
+                "line": {"color": "#0C5050", "width": 1.0}
+            }
+        }
+
+        layout = {
+            "title": {
+                "text": "Flux per subsystem",
+                "x": 0.5,
+                "font": {"family": "Poppins", "size": 22}
+            },
+            "paper_bgcolor": "#FFFFFF",
+            "plot_bgcolor": "#FFFFFF",
+            "xaxis": {
+                "title": "Σ |flux| (mmol/gDW/h)",
+                "tickfont": {"family": "Poppins", "size": 12}
+            },
+            "yaxis": {
+                "title": "Subsystems",
+                "autorange": "reversed",
+                "tickfont": {"family": "Poppins", "size": 9}
+            },
+            "height": max(400, 18 * len(orden) + 140),
+            "margin": dict(t=70, l=260, r=40, b=60),
+            "autosize": True
+        }
+
+        return {"data": [trace], "layout": layout}
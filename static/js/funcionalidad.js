@@ -2,7 +2,6 @@
    GLOBAL VARIABLES
    ============================================================ */
 let filaSeleccionada = null;
-let flujosCompletos = {};
 let ultimaRestriccionDetalle = [];
 let ultimaBiomasa = null;
 let ultimoATP = null;
@@ -11,6 +10,8 @@ let ultimasActividades = null;
 let ultimoValorObjetivo = null;
 // 🔥 NEW: run_id for 3D graph
 let ultimoRunId = null;
+// Model this page works on (several can be loaded on the server)
+let modeloIdActual = document.body.dataset.modeloId || null;
 
 
 /* ============================================================
@@ -76,7 +77,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
   const btnDescargarExcel = document.getElementById("btnDescargarExcel");
   if (btnDescargarExcel) {
-    btnDescargarExcel.addEventListener("click", descargarExcel);
+    btnDescargarExcel.addEventListener("click", () => descargarExcel());
   }
 
   // 🔥 NEW: Graph button
@@ -117,8 +118,11 @@ function ejecutarFBA() {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({
+      modelo_id: modeloIdActual,
       funcion_objetivo: funcionObjetivo,
-      restricciones: restricciones
+      restricciones: restricciones,
+      // Fluxes stay on the server (export / graphs use run_id)
+      campos: ["grafica", "kpis", "restricciones"]
     })
   })
     .then((res) => res.json())
@@ -146,7 +150,6 @@ function ejecutarFBA() {
       actualizarKPIs(data);
 
       // === 6) Store complete data for Excel ===
-      flujosCompletos = data.flujos_completos;
       ultimaRestriccionDetalle = data.restricciones_detalle || [];
       ultimaBiomasa = data.kpi_biomasa;
       ultimoATP = data.kpi_atp;
@@ -224,43 +227,26 @@ function enviarModelo() {
 
       // Store current model name
       window.modeloActual = data.nombre_modelo;
+      modeloIdActual = data.modelo_id;
     });
 }
 
 
 /* ============================================================
-   DOWNLOAD EXCEL — SEND EVERYTHING TO BACKEND
+   DOWNLOAD EXCEL — SERVER EXPORTS THE STORED RUN (STREAMING)
    ============================================================ */
-function descargarExcel() {
-  if (!flujosCompletos) {
+function descargarExcel(formato = "xlsx") {
+  if (!ultimoRunId) {
     alert("Run an FBA first to generate results.");
     return;
   }
 
-  fetch("/descargar_excel", {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({
-      flujos_completos: flujosCompletos,
-      funcion_objetivo: document.getElementById("rxns_s").value,
-      restricciones: obtenerRestriccionesTabla(),
-      restricciones_detalle: ultimaRestriccionDetalle,
-      objective_value: ultimoValorObjetivo,
-      kpi_biomasa: ultimaBiomasa,
-      kpi_atp: ultimoATP,
-      kpi_flujo_total: ultimoFlujoTotal,
-      kpi_activas: ultimasActividades
-    })
-  })
-    .then((res) => res.blob())
-    .then((blob) => {
-      const url = window.URL.createObjectURL(blob);
-      const a = document.createElement("a");
-      a.href = url;
-      a.download = "fba_result.xlsx";
-      a.click();
-      window.URL.revokeObjectURL(url);
-    });
+  // The browser downloads the file directly while the server writes it
+  const a = document.createElement("a");
+  a.href = `/descargar_excel?run_id=${encodeURIComponent(ultimoRunId)}`
+    + `&formato=${encodeURIComponent(formato)}`;
+  a.download = `fba_result.${formato}`;
+  a.click();
 }
 
 
@@ -523,6 +509,7 @@ document.addEventListener("DOMContentLoaded", () => {
       return;
     }
 
+    modeloIdActual = data.modelo_id;
     actualizarCombosReacciones(data.reacciones);
   });
 });
@@ -10,6 +10,7 @@
     let uiInicializada = false;
 
     let mostrarNombres = true;
+    let filtroActual = "";
 
 
     document.getElementById("btnRegresar").onclick = () => {
@@ -146,6 +147,16 @@ function inicializarUI(subsistemas) {
         cargarDatosGrafo(sel.value);
     });
 
+    // Cambiar a otro run del mismo modelo aplicando solo la diferencia
+    const inputRun = document.getElementById("inputCambiarRun");
+    const btnRun = document.getElementById("btnCambiarRun");
+    if (inputRun && btnRun) {
+        btnRun.addEventListener("click", () => {
+            const otro = inputRun.value.trim();
+            if (otro) cambiarRun(otro);
+        });
+    }
+
     dibujarHeatmapLegend();
     uiInicializada = true;
 }
@@ -174,6 +185,75 @@ function inicializarUI(subsistemas) {
     });
 
 
+    /* ============================================================
+    DECODIFICAR FORMATO BINARIO (FBG1, ver utils/formato_binario.py)
+    ============================================================ */
+    function decodificarGrafoBinario(buffer) {
+        const vista = new DataView(buffer);
+        const magia = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+        if (magia !== "FBG1") throw "Formato binario desconocido";
+
+        const largoCabecera = vista.getUint32(4, true);
+        const cab = JSON.parse(
+            new TextDecoder().decode(new Uint8Array(buffer, 8, largoCabecera))
+        );
+
+        // Columnas alineadas a 8 bytes → vistas directas sin copiar
+        // (los TypedArray usan el orden de bytes de la plataforma: little-endian)
+        const tipos = {
+            utf8: Uint8Array,
+            uint8: Uint8Array,
+            uint16: Uint16Array,
+            uint32: Uint32Array,
+            float64: Float64Array
+        };
+        const col = {};
+        cab.columnas.forEach(c => {
+            col[c.nombre] = new tipos[c.tipo](buffer, c.offset, c.longitud);
+        });
+
+        const ids = cab.n_nodos > 0
+            ? new TextDecoder().decode(col.ids).split("\0")
+            : [];
+
+        const nodes = new Array(cab.n_nodos);
+        for (let i = 0; i < cab.n_nodos; i++) {
+            const esReaccion = col.nodo_grupo[i] === 0;
+            nodes[i] = {
+                id: ids[i],
+                name: ids[i],
+                group: esReaccion ? "reaction" : "metabolite",
+                subsystem: cab.subsistemas[col.nodo_subsistema[i]] ?? "NA",
+                val: esReaccion ? 6 : 2,
+                flux: col.nodo_flux[i],
+                color: cab.paleta[col.nodo_color[i]]
+            };
+        }
+
+        const links = new Array(cab.n_enlaces);
+        for (let i = 0; i < cab.n_enlaces; i++) {
+            const flujo = col.enlace_flux_signed[i];
+            links[i] = {
+                source: ids[col.enlace_origen[i]],
+                target: ids[col.enlace_destino[i]],
+                flux: Math.abs(flujo),
+                flux_signed: flujo,
+                coeff: col.enlace_coeff[i],
+                color: cab.paleta[col.enlace_color[i]]
+            };
+        }
+
+        return {
+            nodes,
+            links,
+            max_flux: cab.max_flux,
+            max_color: cab.max_color,
+            subsistemas: cab.subsistemas,
+            modelo_gigante: cab.modelo_gigante
+        };
+    }
+
+
     /* ============================================================
     CARGAR GRAFO 3D
     ============================================================ */
@@ -182,13 +262,24 @@ function inicializarUI(subsistemas) {
         try {
             runId = document.body.dataset.runId;
             if (!runId) return;
+            filtroActual = filtroSubsistema;
 
-            let url = `/grafo_datos?run_id=${encodeURIComponent(runId)}`;
+            let url = `/grafo_datos?run_id=${encodeURIComponent(runId)}&formato=binario`;
             if (filtroSubsistema)
                 url += `&subsystem=${encodeURIComponent(filtroSubsistema)}`;
 
+            // /grafo?run_id=...&color=variabilidad → color por rango FVA
+            const colorPor = new URLSearchParams(window.location.search).get("color");
+            if (colorPor)
+                url += `&color=${encodeURIComponent(colorPor)}`;
+
             const respuesta = await fetch(url);
-            const datos = await respuesta.json();
+            const tipo = respuesta.headers.get("Content-Type") || "";
+
+            // Binario columnar si el servidor lo envió; si no (errores), JSON
+            const datos = tipo.includes("application/octet-stream")
+                ? decodificarGrafoBinario(await respuesta.arrayBuffer())
+                : await respuesta.json();
 
             // 🔥 DETECTAR MODELO GIGANTE Y AVISAR USUARIO
             if (datos.modelo_gigante) {
@@ -204,7 +295,10 @@ function inicializarUI(subsistemas) {
             if (!uiInicializada) inicializarUI(datos.subsistemas);
 
             document.getElementById("legend-min").innerText = "0.0";
-            document.getElementById("legend-max").innerText = maxFluxGlobal.toFixed(5);
+            document.getElementById("legend-max").innerText =
+                (datos.max_color ?? maxFluxGlobal).toFixed(5);
+            if (colorPor === "variabilidad")
+                document.querySelector(".legend-title").innerText = "FVA range (max − min)";
 
             if (!Graph) {
                 Graph = ForceGraph3D()(document.getElementById("graph"))
@@ -326,6 +420,89 @@ function inicializarUI(subsistemas) {
         }
     }
 
+    /* ============================================================
+    CAMBIAR DE RUN CON UN PARCHE (/grafo_diff)
+    ============================================================ */
+    async function cambiarRun(otroRunId) {
+
+        // El parche solo trae colores por flujo: con otro coloreo, grafo completo
+        const colorPor = new URLSearchParams(window.location.search).get("color");
+        if (!Graph || !datosActuales || colorPor) {
+            document.body.dataset.runId = otroRunId;
+            return cargarDatosGrafo(filtroActual);
+        }
+
+        try {
+            let url = `/grafo_diff?base=${encodeURIComponent(runId)}` +
+                      `&other=${encodeURIComponent(otroRunId)}`;
+            if (filtroActual)
+                url += `&subsystem=${encodeURIComponent(filtroActual)}`;
+
+            const parche = await (await fetch(url)).json();
+            if (parche.error) throw parche.error;
+
+            aplicarDiff(parche);
+            runId = otroRunId;
+            document.body.dataset.runId = otroRunId;
+
+        } catch (err) {
+            console.error("❌ Error aplicando diferencia:", err);
+            document.getElementById("info-box").innerHTML =
+                "❗ Error cambiando de run.";
+        }
+    }
+
+    function aplicarDiff(parche) {
+        // Tras el primer render, source/target son los objetos nodo
+        const idDe = x => (typeof x === "object" ? x.id : x);
+
+        const porId = new Map(datosActuales.nodes.map(n => [n.id, n]));
+        const actualizar = new Map(parche.actualizar.nodes.map(n => [n.id, n]));
+
+        actualizar.forEach((cambio, id) => {
+            const nodo = porId.get(id);
+            if (nodo) {
+                nodo.flux = cambio.flux;
+                nodo.color = cambio.color;
+            }
+        });
+
+        // Cada enlace toma flujo y color de su reacción (origen o destino)
+        datosActuales.links.forEach(l => {
+            const cambio = actualizar.get(idDe(l.source)) || actualizar.get(idDe(l.target));
+            if (!cambio) return;
+            l.flux = cambio.flux;
+            l.flux_signed = cambio.flux_signed;
+            l.color = cambio.color;
+        });
+
+        const quitar = new Set(parche.eliminar.nodes);
+        const estructura = quitar.size > 0 || parche.agregar.nodes.length > 0;
+
+        datosActuales.max_flux = parche.max_flux;
+        maxFluxGlobal = parche.max_flux || 1;
+        document.getElementById("legend-max").innerText = maxFluxGlobal.toFixed(5);
+
+        if (!estructura) {
+            // Mismos nodos y enlaces: redibujar sin tocar el layout
+            Graph.refresh();
+            return;
+        }
+
+        // Los nodos que quedan conservan su posición (x, y, z)
+        datosActuales = {
+            ...datosActuales,
+            nodes: datosActuales.nodes
+                .filter(n => !quitar.has(n.id))
+                .concat(parche.agregar.nodes),
+            links: datosActuales.links
+                .filter(l => !quitar.has(idDe(l.source)) && !quitar.has(idDe(l.target)))
+                .concat(parche.agregar.links)
+        };
+        Graph.graphData(datosActuales);
+    }
+
+
     /* ============================================================
    AVISO PARA MODELOS GIGANTES
     ============================================================ */
@@ -329,6 +329,34 @@ function actualizarVisibilidad() {
 }
 
 
+/* ============================================================
+   REACCIONES DE UN METABOLITO (bajo demanda)
+============================================================ */
+let nodoInfoActual = null;
+
+async function cargarReaccionesMetabolito(n) {
+    if (n.cargandoReacciones) return;
+    n.cargandoReacciones = true;
+
+    try {
+        const url = `/grafo_datos_alt/reacciones?run_id=${encodeURIComponent(runId)}`
+            + `&metabolito=${encodeURIComponent(n.id)}`;
+        const respuesta = await fetch(url);
+        const datos = await respuesta.json();
+        if (datos.error) throw datos.error;
+        n.reacciones = datos.reacciones || [];
+    } catch (err) {
+        console.error("❌ Error cargando reacciones:", err);
+        n.reacciones = [];
+    } finally {
+        n.cargandoReacciones = false;
+    }
+
+    // Volver a pintar si el nodo sigue seleccionado
+    if (nodoInfoActual === n) mostrarInfoNodo(n);
+}
+
+
 /* ============================================================
    CARGAR GRAFO ALT (METABOLITOS + SUBSISTEMAS)
 ============================================================ */
@@ -436,6 +464,7 @@ async function cargarDatosGrafoAlt() {
 function mostrarInfoNodo(n) {
     const infoBox = document.getElementById("info-box");
     if (!infoBox) return;
+    nodoInfoActual = n;
 
    if (n.type === "metabolite") {
     const subs = n.subsistemas || [];
@@ -443,9 +472,15 @@ function mostrarInfoNodo(n) {
     const actSum = n.actividad_suma || 0;
     const actProm = n.actividad_promedio || 0;
 
+    // Las reacciones se piden al servidor la primera vez que se abre el nodo
+    if (n.reacciones === undefined) {
+        cargarReaccionesMetabolito(n);
+    }
     const reacciones = n.reacciones || [];
 
-    const reaccionesHTML = reacciones.length
+    const reaccionesHTML = n.reacciones === undefined
+        ? "<span style='color:#94a3b8'>Cargando reacciones…</span>"
+        : reacciones.length
         ? reacciones
             .sort((a, b) => Math.abs(b.flux) - Math.abs(a.flux)) // ordenar por |flujo|
             .map(r => `• ${r.id} — flujo: ${r.flux.toFixed(5)}`)
@@ -578,34 +613,16 @@ function stopResize(e) {
 
 function descargarMatrizAlt() {
 
-    if (!matrizCorrelacion || !listaSubsistemas || !datosActuales) {
+    if (!runId || !datosActuales) {
         alert("No hay datos cargados del grafo ALT.");
         return;
     }
 
-fetch("/descargar_matriz_alt", {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({
-        matriz_correlacion: matrizCorrelacion,
-        metabolitos_filtrados: datosActuales.metabolitos_filtrados, // ahora sí existe
-        subsistemas: listaSubsistemas
-    })
-})
-
-    .then(resp => resp.blob())
-    .then(blob => {
-        const url = window.URL.createObjectURL(blob);
-        const a = document.createElement("a");
-        a.href = url;
-        a.download = "matriz_subsistemas_alt.xlsx";
-        a.click();
-        window.URL.revokeObjectURL(url);
-    })
-    .catch(err => {
-        console.error("❌ Error descargando matriz ALT:", err);
-        alert("Error al generar el archivo.");
-    });
+    // El servidor arma matriz y relaciones a partir del run_id
+    const a = document.createElement("a");
+    a.href = `/descargar_matriz_alt?run_id=${encodeURIComponent(runId)}`;
+    a.download = "matriz_subsistemas_alt.xlsx";
+    a.click();
 }
 
 
@@ -0,0 +1,393 @@
+# utils/almacen_resultados.py
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+MAX_RUNS = int(os.environ.get("FBA_RUNS_MAX", "500"))
+MAX_RUNS_BYTES = int(os.environ.get("FBA_RUNS_MAX_MB", "256")) * 1024 * 1024
+TTL_RUNS = float(os.environ.get("FBA_RUNS_TTL", str(6 * 3600)))
+
+# Backend persistente opcional (vacío = solo memoria)
+DIRECTORIO_RUNS = os.environ.get("FBA_RUNS_DIR") or None
+TTL_RUNS_DISCO = float(os.environ.get("FBA_RUNS_DISK_TTL", str(7 * 24 * 3600)))
+
+PATRON_RUN_ID = re.compile(r"^[0-9a-f\-]{36}$")
+
+
+# ============================================================
+# 1. Índice de reacciones compartido por modelo
+# ============================================================
+class IndiceReacciones:
+    """
+    Orden fijo de los IDs de reacción de un modelo. Todas las
+    simulaciones de ese modelo guardan su vector de flujos en este
+    orden, así los IDs (strings) se guardan una sola vez.
+    """
+
+    def __init__(self, ids: list):
+        self.ids = list(ids)
+        self.posicion = {rxn_id: i for i, rxn_id in enumerate(self.ids)}
+        self._huella = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def coincide(self, ids) -> bool:
+        """Mismos IDs en el mismo orden (la longitud se compara primero)."""
+        return len(ids) == len(self.ids) and list(ids) == self.ids
+
+    def huella(self) -> str:
+        """Hash corto de la lista de IDs; nombra el índice en disco."""
+        if self._huella is None:
+            datos = json.dumps(self.ids).encode("utf-8")
+            self._huella = hashlib.sha256(datos).hexdigest()[:16]
+        return self._huella
+
+
+# ============================================================
+# 2. Backend en disco: un .npy por run, memory-mapped al leer
+# ============================================================
+class RunsEnDisco:
+    """
+    Estructura en disco:
+        <directorio>/<modelo_id>/indice_<huella>.json  IDs de reacción (orden)
+        <directorio>/<modelo_id>/<run_id>.npy    flujos float64
+        <directorio>/<modelo_id>/<run_id>.json   metadatos + nombre del índice
+        <directorio>/<modelo_id>/<run_id>.rango.npy  (n, 2) min/max FVA, opcional
+
+    Hay un índice por cada lista de IDs distinta (la huella es su hash):
+    si el mismo modelo_id llega con otras reacciones u otro orden, sus
+    runs nuevos apuntan a otro índice y los anteriores siguen leyéndose
+    con el suyo.
+
+    Al leer, el .npy se abre con mmap (no se copia a RAM), así cualquier
+    run pasado se puede consultar aunque no quepa en memoria y varios
+    procesos Flask pueden compartir los mismos runs.
+    """
+
+    def __init__(self, directorio: str, ttl_segundos: float = TTL_RUNS_DISCO):
+        self.directorio = Path(directorio)
+        self.ttl_segundos = ttl_segundos
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.limpiar()
+
+    def _carpeta(self, modelo_id: str) -> Path:
+        return self.directorio / modelo_id
+
+    def guardar(self, run_id: str, modelo_id: str, indice: IndiceReacciones,
+                flujos: np.ndarray, meta: dict, rango: np.ndarray = None) -> None:
+        carpeta = self._carpeta(modelo_id)
+        carpeta.mkdir(parents=True, exist_ok=True)
+
+        nombre_indice = f"indice_{indice.huella()}.json"
+        ruta_indice = carpeta / nombre_indice
+        if ruta_indice.exists():
+            os.utime(ruta_indice)    # que limpiar() no lo tome por huérfano
+        else:
+            _escribir_atomico(ruta_indice, json.dumps(indice.ids).encode("utf-8"))
+
+        if rango is not None:
+            ruta_tmp = carpeta / f"{run_id}.rango.tmp.npy"
+            np.save(ruta_tmp, rango)
+            os.replace(ruta_tmp, carpeta / f"{run_id}.rango.npy")
+
+        ruta_tmp = carpeta / f"{run_id}.tmp.npy"
+        np.save(ruta_tmp, flujos)
+        os.replace(ruta_tmp, carpeta / f"{run_id}.npy")
+
+        _escribir_atomico(
+            carpeta / f"{run_id}.json",
+            json.dumps({"modelo_id": modelo_id, "indice": nombre_indice,
+                        "meta": meta, "creado": time.time()}).encode("utf-8")
+        )
+
+    def buscar(self, run_id: str):
+        """Devuelve (modelo_id, ids, flujos_mmap, meta, rango_mmap o None) o None."""
+        if not run_id or not PATRON_RUN_ID.match(run_id):
+            return None
+
+        for ruta_npy in self.directorio.glob(f"*/{run_id}.npy"):
+            carpeta = ruta_npy.parent
+            try:
+                with open(carpeta / f"{run_id}.json", "r", encoding="utf-8") as f:
+                    info = json.load(f)
+                with open(carpeta / info["indice"], "r", encoding="utf-8") as f:
+                    ids = json.load(f)
+                flujos = np.load(ruta_npy, mmap_mode="r")
+                ruta_rango = carpeta / f"{run_id}.rango.npy"
+                rango = np.load(ruta_rango, mmap_mode="r") if ruta_rango.exists() else None
+            except (OSError, ValueError, KeyError):
+                return None
+            return info["modelo_id"], ids, flujos, info.get("meta", {}), rango
+
+        return None
+
+    def limpiar(self) -> None:
+        """
+        Borra runs más viejos que el TTL de disco, los índices que ya no
+        usa ningún run y las carpetas de modelo que quedan vacías.
+        """
+        if self.ttl_segundos <= 0:
+            return
+        limite = time.time() - self.ttl_segundos
+        for ruta_npy in self.directorio.glob("*/*.npy"):
+            if ruta_npy.name.endswith(".rango.npy"):
+                continue
+            try:
+                if ruta_npy.stat().st_mtime < limite:
+                    ruta_npy.unlink(missing_ok=True)
+                    ruta_npy.with_suffix(".json").unlink(missing_ok=True)
+                    ruta_npy.with_suffix(".rango.npy").unlink(missing_ok=True)
+            except OSError:
+                pass
+
+        for carpeta in [c for c in self.directorio.iterdir() if c.is_dir()]:
+            self._limpiar_carpeta(carpeta, limite)
+
+    def _limpiar_carpeta(self, carpeta: Path, limite: float) -> None:
+        en_uso = set()
+        for ruta_json in carpeta.glob("*.json"):
+            if ruta_json.name.startswith("indice_"):
+                continue
+            try:
+                with open(ruta_json, "r", encoding="utf-8") as f:
+                    en_uso.add(json.load(f).get("indice"))
+            except (OSError, ValueError):
+                pass
+
+        # Solo índices viejos: uno recién escrito puede ser de un run
+        # cuyo .json aún no existe
+        for ruta_indice in carpeta.glob("indice_*.json"):
+            try:
+                if ruta_indice.name not in en_uso and ruta_indice.stat().st_mtime < limite:
+                    ruta_indice.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+        try:
+            carpeta.rmdir()          # falla si aún tiene runs
+        except OSError:
+            pass
+
+
+def _escribir_atomico(ruta: Path, contenido: bytes) -> None:
+    ruta_tmp = ruta.with_name(ruta.name + ".tmp")
+    with open(ruta_tmp, "wb") as f:
+        f.write(contenido)
+    os.replace(ruta_tmp, ruta)
+
+
+# ============================================================
+# 3. Almacén acotado de resultados FBA
+# ============================================================
+class AlmacenResultados:
+    """
+    Guarda cada run como UN array float64 (no un dict de floats).
+
+    Política de expulsión:
+    - TTL: un run más viejo que `ttl_segundos` se descarta al tocarlo
+      o en la siguiente limpieza.
+    - Tamaño: si se supera `max_entradas` o `max_bytes` se expulsan los
+      menos usados recientemente (LRU).
+
+    Con `directorio` (o FBA_RUNS_DIR) cada run se escribe además en
+    disco; un run expulsado de RAM, o creado por otro proceso o antes
+    de un reinicio, se vuelve a abrir bajo demanda con mmap.
+    """
+
+    def __init__(self, max_entradas: int = MAX_RUNS, max_bytes: int = MAX_RUNS_BYTES,
+                 ttl_segundos: float = TTL_RUNS, directorio: str = DIRECTORIO_RUNS):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ttl_segundos = ttl_segundos
+        self.disco = RunsEnDisco(directorio) if directorio else None
+
+        self._indices = {}           # modelo_id -> IndiceReacciones
+        self._runs = OrderedDict()   # run_id -> entrada
+        self._bytes = 0
+        self._evicciones = 0
+        self._expiradas = 0
+        self._lecturas_disco = 0
+        self._guardados = 0
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------------
+    # Índices por modelo
+    # --------------------------------------------------------
+    def indice(self, modelo_id: str, ids: list = None) -> IndiceReacciones:
+        """
+        Índice del modelo; con `ids`, uno nuevo si no coincide con el
+        guardado (otro orden o IDs). Los runs previos conservan el suyo.
+        """
+        indice = self._indices.get(modelo_id)
+        if ids is not None and indice is not None and not indice.coincide(ids):
+            indice = None
+        if indice is None:
+            if ids is None:
+                return None
+            indice = IndiceReacciones(ids)
+            self._indices[modelo_id] = indice
+        return indice
+
+    # --------------------------------------------------------
+    # Guardar / obtener
+    # --------------------------------------------------------
+    def guardar(self, modelo_id: str, ids: list, flujos, meta: dict = None,
+                rango=None) -> str:
+        """
+        Guarda un vector de flujos (en el orden de `ids`) y devuelve run_id.
+        `rango` (opcional): array (n, 2) con el mínimo y máximo de FVA de
+        cada reacción, en el mismo orden (NaN = no analizada).
+        """
+        arr = np.ascontiguousarray(flujos, dtype=np.float64)
+        if rango is not None:
+            rango = np.ascontiguousarray(rango, dtype=np.float64).reshape(len(arr), 2)
+        run_id = str(uuid.uuid4())
+
+        with self._lock:
+            indice = self.indice(modelo_id, ids)
+            self._runs[run_id] = {
+                "modelo_id": modelo_id,
+                "indice": indice,
+                "flujos": arr,
+                "rango": rango,
+                "meta": meta or {},
+                "creado": time.time(),
+                "en_disco": False
+            }
+            self._bytes += _bytes_en_ram(self._runs[run_id])
+            self._limpiar()
+            self._guardados += 1
+
+        if self.disco is not None:
+            self.disco.guardar(run_id, modelo_id, indice, arr, meta or {}, rango)
+            if self._guardados % 100 == 0:
+                self.disco.limpiar()
+
+        return run_id
+
+    def _cargar_de_disco(self, run_id: str):
+        encontrado = self.disco.buscar(run_id)
+        if encontrado is None:
+            return None
+
+        modelo_id, ids, flujos, meta, rango = encontrado
+        entrada = {
+            "modelo_id": modelo_id,
+            "indice": self.indice(modelo_id, ids),
+            "flujos": flujos,          # np.memmap → no ocupa RAM propia
+            "rango": rango,
+            "meta": meta,
+            "creado": time.time(),
+            "en_disco": True
+        }
+        self._runs[run_id] = entrada
+        self._lecturas_disco += 1
+        self._limpiar()
+        return entrada
+
+    def obtener(self, run_id: str):
+        """
+        Devuelve la entrada (dict) o None si no existe o expiró. Con
+        disco, un run expulsado de RAM (por TTL o LRU) se reabre desde
+        su .npy mientras siga en disco.
+        """
+        if not run_id:
+            return None
+
+        with self._lock:
+            entrada = self._runs.get(run_id)
+            if entrada is not None and self._expirada(entrada, time.time()):
+                self._quitar(run_id)
+                self._expiradas += 1
+                entrada = None
+            if entrada is None:
+                if self.disco is None:
+                    return None
+                return self._cargar_de_disco(run_id)
+            self._runs.move_to_end(run_id)
+            return entrada
+
+    def __contains__(self, run_id: str) -> bool:
+        return self.obtener(run_id) is not None
+
+    def flujos_dict(self, run_id: str):
+        """Compatibilidad: {reaction_id: flujo} de un run (o None)."""
+        entrada = self.obtener(run_id)
+        if entrada is None:
+            return None
+        return dict(zip(entrada["indice"].ids, entrada["flujos"].tolist()))
+
+    # --------------------------------------------------------
+    # Expulsión
+    # --------------------------------------------------------
+    def _expirada(self, entrada: dict, ahora: float) -> bool:
+        return self.ttl_segundos > 0 and ahora - entrada["creado"] > self.ttl_segundos
+
+    def _quitar(self, run_id: str) -> None:
+        entrada = self._runs.pop(run_id)
+        self._bytes -= _bytes_en_ram(entrada)
+
+    def _limpiar(self) -> None:
+        """
+        Solo suelta la copia en RAM: con disco, obtener() reabre después
+        los runs quitados aquí.
+        """
+        ahora = time.time()
+
+        # 1) TTL (los más viejos están al principio del OrderedDict
+        #    salvo los que se han leído; se revisan todos)
+        for run_id in [k for k, e in self._runs.items() if self._expirada(e, ahora)]:
+            self._quitar(run_id)
+            self._expiradas += 1
+
+        # 2) LRU por número de entradas y bytes
+        while self._runs and (len(self._runs) > self.max_entradas
+                              or self._bytes > self.max_bytes):
+            run_id = next(iter(self._runs))
+            self._quitar(run_id)
+            self._evicciones += 1
+
+        # 3) Índices de modelos sin ningún run
+        en_uso = {e["modelo_id"] for e in self._runs.values()}
+        for modelo_id in list(self._indices):
+            if modelo_id not in en_uso:
+                del self._indices[modelo_id]
+
+    # --------------------------------------------------------
+    # Estadísticas
+    # --------------------------------------------------------
+    def estadisticas(self) -> dict:
+        with self._lock:
+            bytes_indices = sum(
+                sum(len(rxn_id) for rxn_id in indice.ids) for indice in self._indices.values()
+            )
+            return {
+                "entradas": len(self._runs),
+                "bytes_flujos": self._bytes,
+                "bytes_indices_aprox": bytes_indices,
+                "modelos": len(self._indices),
+                "evicciones": self._evicciones,
+                "expiradas": self._expiradas,
+                "persistente": self.disco is not None,
+                "lecturas_disco": self._lecturas_disco,
+                "max_entradas": self.max_entradas,
+                "max_bytes": self.max_bytes,
+                "ttl_segundos": self.ttl_segundos
+            }
+
+
+def _bytes_en_ram(entrada: dict) -> int:
+    if entrada.get("en_disco"):
+        return 0
+    rango = entrada.get("rango")
+    return entrada["flujos"].nbytes + (rango.nbytes if rango is not None else 0)
@@ -0,0 +1,171 @@
+# utils/cache_modelos.py
+import hashlib
+import os
+import pickle
+import threading
+from pathlib import Path
+
+import cobra
+
+
+# ============================================================
+# Configuración del caché en disco
+# ============================================================
+DIRECTORIO_CACHE = Path("models/cache")
+LIMITE_CACHE_BYTES = int(os.environ.get("FBA_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+FORMATOS_SOPORTADOS = ("mat", "xml", "json")
+
+
+# ============================================================
+# 1. Hash del contenido del archivo subido
+# ============================================================
+def hash_contenido(datos: bytes) -> str:
+    """
+    Huella SHA-256 del archivo. Dos subidas con el mismo contenido
+    (aunque tengan distinto nombre) comparten la misma clave.
+    """
+    return hashlib.sha256(datos).hexdigest()
+
+
+# ============================================================
+# 2. Parseo con COBRApy según la extensión
+# ============================================================
+def leer_modelo(ruta: str, ext: str) -> cobra.Model:
+    if ext == "mat":
+        return cobra.io.load_matlab_model(ruta)
+    if ext == "xml":
+        return cobra.io.read_sbml_model(ruta)
+    if ext == "json":
+        return cobra.io.load_json_model(ruta)
+    raise ValueError("Formato no soportado. Use .mat, .xml o .json")
+
+
+# ============================================================
+# 3. Caché de modelos parseados (pickle binario + LRU por tamaño)
+# ============================================================
+class CacheModelos:
+    """
+    Guarda cada modelo ya parseado como pickle en `models/cache/<hash>.pkl`.
+
+    - La clave es el hash del contenido del archivo original.
+    - El orden LRU se lleva con la fecha de modificación del archivo
+      (se "toca" en cada lectura), así sobrevive a reinicios del servidor.
+    - Si el total en disco supera `limite_bytes` se borran los más viejos,
+      salvo los fijados con `fijar` (modelos registrados en RAM o cuyo
+      pickle leen los workers del pool al arrancar). El modelo reducido
+      `<hash>.reduccion.pkl` se fija junto con su modelo.
+    - Los demás archivos `<hash>.*` (p. ej. el XLSX del análisis ALT) se
+      borran al expulsar `<hash>.pkl`.
+    """
+
+    def __init__(self, directorio: Path = DIRECTORIO_CACHE,
+                 limite_bytes: int = LIMITE_CACHE_BYTES):
+        self.directorio = Path(directorio)
+        self.limite_bytes = limite_bytes
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._fijadas = {}      # clave -> nº de usuarios que la fijaron
+        self._lock = threading.Lock()
+
+    def ruta(self, clave: str) -> Path:
+        return self.directorio / f"{clave}.pkl"
+
+    def ruta_reduccion(self, clave: str) -> Path:
+        return self.directorio / f"{clave}.reduccion.pkl"
+
+    def fijar(self, clave: str) -> None:
+        with self._lock:
+            self._fijadas[clave] = self._fijadas.get(clave, 0) + 1
+
+    def soltar(self, clave: str) -> None:
+        with self._lock:
+            restantes = self._fijadas.get(clave, 0) - 1
+            if restantes > 0:
+                self._fijadas[clave] = restantes
+            else:
+                self._fijadas.pop(clave, None)
+
+    def contiene(self, clave: str) -> bool:
+        return self.ruta(clave).exists()
+
+    def obtener(self, clave: str):
+        return self._leer(self.ruta(clave))
+
+    def guardar(self, clave: str, modelo: cobra.Model) -> None:
+        self._escribir(self.ruta(clave), modelo)
+
+    def obtener_reduccion(self, clave: str):
+        """Modelo reducido (utils/reduccion.py) del modelo `clave`, o None."""
+        return self._leer(self.ruta_reduccion(clave))
+
+    def guardar_reduccion(self, clave: str, reducido) -> None:
+        self._escribir(self.ruta_reduccion(clave), reducido)
+
+    def reduccion_escrita(self, clave: str) -> None:
+        """Aplica el límite del caché tras escribir `ruta_reduccion(clave)` desde otro proceso."""
+        self._evictar(conservar=self.ruta_reduccion(clave))
+
+    def _leer(self, ruta: Path):
+        try:
+            with open(ruta, "rb") as f:
+                objeto = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Pickle corrupto o de otra versión de COBRApy → descartarlo
+            ruta.unlink(missing_ok=True)
+            return None
+
+        os.utime(ruta)  # marcar como usado recientemente
+        return objeto
+
+    def _escribir(self, ruta: Path, objeto) -> None:
+        ruta_tmp = ruta.with_suffix(".tmp")
+        with open(ruta_tmp, "wb") as f:
+            pickle.dump(objeto, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(ruta_tmp, ruta)  # escritura atómica
+        self._evictar(conservar=ruta)
+
+    def _evictar(self, conservar: Path = None) -> None:
+        archivos = sorted(
+            self.directorio.glob("*.pkl"),
+            key=lambda p: p.stat().st_mtime
+        )
+        total = sum(p.stat().st_size for p in archivos)
+        with self._lock:
+            fijadas = set(self._fijadas)
+
+        for ruta in archivos:
+            if total <= self.limite_bytes:
+                break
+            # <hash>.pkl y <hash>.reduccion.pkl comparten la clave
+            if ruta == conservar or ruta.name.split(".", 1)[0] in fijadas:
+                continue
+            total -= ruta.stat().st_size
+            ruta.unlink(missing_ok=True)
+            if ruta.name.count(".") == 1:    # <hash>.pkl, no el reducido
+                self._borrar_anexos(ruta.stem)
+
+    def _borrar_anexos(self, clave: str) -> None:
+        for anexo in self.directorio.glob(f"{clave}.*"):
+            if anexo.suffix not in (".pkl", ".tmp"):
+                anexo.unlink(missing_ok=True)
+
+    def cargar(self, datos: bytes, ext: str, ruta_destino: str) -> tuple:
+        """
+        Devuelve (modelo, clave, desde_cache).
+        Solo escribe el archivo original y lo parsea si el hash no
+        estaba en caché.
+        """
+        clave = hash_contenido(datos)
+
+        modelo = self.obtener(clave)
+        if modelo is not None:
+            return modelo, clave, True
+
+        with open(ruta_destino, "wb") as f:
+            f.write(datos)
+
+        modelo = leer_modelo(ruta_destino, ext)
+        self.guardar(clave, modelo)
+        return modelo, clave, False
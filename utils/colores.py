@@ -0,0 +1,67 @@
+# utils/colores.py
+import matplotlib.cm as cm
+import matplotlib.colors as mcolors
+import numpy as np
+
+
+# ============================================================
+# Tabla de colores (LUT) del heatmap
+# ============================================================
+class MapaColores:
+    """
+    Traduce arrays de valores a colores hex en un solo paso.
+
+    Matplotlib discretiza cualquier colormap en `N` (= 256) colores:
+    `cmap(x)` usa la entrada int(x * N) de su tabla. Aquí se construye
+    esa misma tabla en hex UNA vez y luego se indexa con NumPy, así el
+    resultado es idéntico a `mcolors.to_hex(cmap(norm(v)))` sin llamar a
+    matplotlib por cada nodo/enlace.
+    """
+
+    def __init__(self, cmap=cm.plasma):
+        self.N = cmap.N
+        self.lut = np.array(
+            [mcolors.to_hex(c) for c in cmap(np.arange(self.N))], dtype=object
+        )
+        self.color_nan = mcolors.to_hex(cmap(np.nan))
+
+    def indices(self, valores, vmax: float, vmin: float = 0.0) -> np.ndarray:
+        """Índice en `lut` para cada valor (-1 = NaN)."""
+        v = np.asarray(valores, dtype=np.float64)
+
+        if vmax == vmin:
+            x = np.zeros_like(v)  # mismo comportamiento que mcolors.Normalize
+        else:
+            x = (v - vmin) / (vmax - vmin)
+
+        x = x * self.N
+        nan = np.isnan(x)
+        idx = np.clip(np.nan_to_num(x, nan=0.0), -1, self.N).astype(np.int64)
+        idx = np.clip(idx, 0, self.N - 1)
+        idx[nan] = -1
+        return idx
+
+    def colores(self, valores, vmax: float, vmin: float = 0.0) -> list:
+        """Lista de colores hex para `valores` normalizados en [vmin, vmax]."""
+        idx = self.indices(valores, vmax, vmin)
+        resultado = self.lut[idx]
+        nan = idx < 0
+        if nan.any():
+            resultado[nan] = self.color_nan
+        return resultado.tolist()
+
+    def indices_flujo(self, flujos, max_flux: float) -> np.ndarray:
+        """Índices de `colores_flujo` (-2 = gris porque max_flux <= 0)."""
+        if max_flux <= 0:
+            return np.full(len(flujos), -2, dtype=np.int64)
+        return self.indices(np.abs(flujos), max_flux)
+
+    def colores_flujo(self, flujos, max_flux: float) -> list:
+        """Color por |flujo|; gris si no hay ningún flujo (max_flux <= 0)."""
+        if max_flux <= 0:
+            return ["#CCCCCC"] * len(flujos)
+        return self.colores(np.abs(flujos), max_flux)
+
+
+# Instancia compartida (plasma, el mismo gradiente que la leyenda del frontend)
+mapa_plasma = MapaColores()
@@ -0,0 +1,107 @@
+# utils/escenarios.py
+import math
+
+import cobra
+import pandas as pd
+
+from utils.restricciones import aplicar_restricciones
+
+
+# Reacciones usadas para los KPIs del dashboard
+RXN_BIOMASA = "BIOMASS_Ecoli_core_w_GAM"
+RXN_ATP = "ATPM"
+UMBRAL_ACTIVA = 1e-6
+
+
+# ============================================================
+# 1. KPIs a partir del vector de flujos
+# ============================================================
+def calcular_kpis(fluxes: pd.Series) -> dict:
+    flujos_abs = fluxes.abs()
+    activas = int((flujos_abs > UMBRAL_ACTIVA).sum())
+
+    return {
+        "kpi_biomasa": float(fluxes.get(RXN_BIOMASA, 0.0)),
+        "kpi_atp": abs(float(fluxes.get(RXN_ATP, 0.0))),
+        "kpi_flujo_total": float(flujos_abs.sum()),
+        "kpi_activas": {
+            "activas": activas,
+            "inactivas": len(flujos_abs) - activas
+        }
+    }
+
+
+# ============================================================
+# 2. Knockouts de reacciones como restricciones (lb = ub = 0)
+# ============================================================
+def restricciones_knockout(rxn_ids: list) -> list:
+    restricciones = []
+    for rxn_id in rxn_ids:
+        restricciones.append({"reaccion": rxn_id, "limite": "lower", "valor": 0.0})
+        restricciones.append({"reaccion": rxn_id, "limite": "upper", "valor": 0.0})
+    return restricciones
+
+
+def restricciones_de_escenario(escenario: dict) -> list:
+    """Restricciones del escenario más sus knockouts (si trae la clave)."""
+    return (escenario.get("restricciones") or []) + restricciones_knockout(
+        escenario.get("knockouts") or []
+    )
+
+
+# ============================================================
+# 3. Ejecutar UN escenario (objetivo + restricciones)
+# ============================================================
+def ejecutar_escenario(modelo: cobra.Model, sesion, funcion_objetivo: str,
+                       restricciones: list) -> dict:
+    """
+    Aplica objetivo y restricciones dentro de `with modelo:`, resuelve
+    con la sesión de solver (warm start) y revierte todo al salir.
+
+    Lanza ValueError si la función objetivo no existe en el modelo.
+    """
+    with modelo:
+        try:
+            modelo.objective = funcion_objetivo
+        except Exception:
+            raise ValueError(f"La reacción '{funcion_objetivo}' no existe.")
+
+        restricciones_aplicadas, warnings_list = aplicar_restricciones(
+            modelo, restricciones
+        )
+        solution, estadisticas_solver = sesion.optimizar()
+
+    return {
+        "solution": solution,
+        "restricciones": restricciones_aplicadas,
+        "warnings": warnings_list,
+        "solver": estadisticas_solver
+    }
+
+
+# ============================================================
+# 4. Resumen compacto (para lotes)
+# ============================================================
+def resumen_escenario(resultado: dict, incluir_flujos: bool = False) -> dict:
+    """
+    Versión ligera del resultado: objetivo, estado, KPIs y, si se pide,
+    el vector de flujos como lista (en el orden de `modelo.reactions`).
+    """
+    solution = resultado["solution"]
+
+    valor_objetivo = solution.objective_value
+    if valor_objetivo is None or math.isnan(valor_objetivo):
+        valor_objetivo = None  # NaN no es JSON válido
+
+    resumen = {
+        "objective_value": valor_objetivo,
+        "status": solution.status,
+        "warnings": resultado["warnings"],
+        "solver": resultado["solver"]
+    }
+    resumen.update(calcular_kpis(solution.fluxes))
+
+    if incluir_flujos:
+        resumen["flujos"] = solution.fluxes.values.tolist()
+
+    return resumen
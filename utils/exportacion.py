@@ -0,0 +1,265 @@
+# utils/exportacion.py
+import io
+import queue
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from utils.escenarios import UMBRAL_ACTIVA, calcular_kpis
+from utils.trabajos import sin_progreso
+
+
+FILAS_POR_BLOQUE = 5000
+TAM_TROZO = 64 * 1024          # bytes por trozo enviado al cliente
+TROZOS_EN_VUELO = 16           # trozos en cola antes de frenar al escritor
+
+FORMATOS_EXPORTACION = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+COLUMNAS_FLUJOS = ["Reacción", "Flujo", "Flujo absoluto", "Activa"]
+COLUMNAS_KNOCKOUTS = [
+    "Knockout", "Reacciones desactivadas", "Valor objetivo",
+    "Crecimiento relativo", "Impacto", "Letal", "Estado", "Podado"
+]
+
+
+# ============================================================
+# 1. Tubo: un archivo de solo escritura que se lee como generador
+# ============================================================
+class _Tubo(io.RawIOBase):
+    """
+    Las librerías que escriben a un archivo (openpyxl, pyarrow) escriben
+    aquí desde un hilo; `transmitir` va entregando los bytes a Flask a
+    medida que llegan. La cola acotada frena al escritor si el cliente
+    lee más lento; si el cliente se desconecta, lo que falte se descarta
+    (sin errores a medio escribir el ZIP) y el hilo termina solo.
+    """
+
+    def __init__(self):
+        self._cola = queue.Queue(maxsize=TROZOS_EN_VUELO)
+        self._buffer = bytearray()
+        self._posicion = 0
+        self.cancelado = threading.Event()
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._posicion
+
+    def write(self, datos) -> int:
+        self._buffer.extend(datos)
+        self._posicion += len(datos)
+        if len(self._buffer) >= TAM_TROZO:
+            self._enviar(bytes(self._buffer))
+            self._buffer.clear()
+        return len(datos)
+
+    def _enviar(self, trozo) -> None:
+        while not self.cancelado.is_set():
+            try:
+                self._cola.put(trozo, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def terminar(self, error: Exception = None) -> None:
+        """Envía lo pendiente y la marca de fin (None) o el error."""
+        if self._buffer and error is None:
+            self._enviar(bytes(self._buffer))
+            self._buffer.clear()
+        self._enviar(error)
+
+
+def transmitir(escribir):
+    """
+    Ejecuta `escribir(archivo)` en un hilo y devuelve un generador con
+    los bytes escritos, en trozos, desde el primer trozo disponible.
+    """
+    tubo = _Tubo()
+
+    def trabajo():
+        try:
+            escribir(tubo)
+        except Exception as e:
+            tubo.terminar(e)
+            return
+        tubo.terminar()
+
+    def generar():
+        hilo = threading.Thread(target=trabajo, daemon=True)
+        hilo.start()
+        try:
+            while True:
+                trozo = tubo._cola.get()
+                if trozo is None:
+                    return
+                if isinstance(trozo, Exception):
+                    raise trozo
+                yield trozo
+        finally:
+            tubo.cancelado.set()
+
+    return generar()
+
+
+# ============================================================
+# 2. Contenido de cada hoja / tabla
+# ============================================================
+def bloques_flujos(ids: list, flujos: np.ndarray, progreso=sin_progreso):
+    """
+    Filas (reacción, flujo, |flujo|, activa) en bloques de FILAS_POR_BLOQUE.
+    `progreso` se llama antes de cada bloque (fracción de filas escritas).
+    """
+    for inicio in range(0, len(ids), FILAS_POR_BLOQUE):
+        progreso(0.9 * inicio / len(ids), "escribiendo filas")
+        bloque = np.asarray(flujos[inicio:inicio + FILAS_POR_BLOQUE], dtype=np.float64)
+        flujo_abs = np.abs(bloque)
+        yield zip(
+            ids[inicio:inicio + FILAS_POR_BLOQUE],
+            bloque.tolist(),
+            flujo_abs.tolist(),
+            (flujo_abs > UMBRAL_ACTIVA).tolist()
+        )
+
+
+def filas_resumen(ids: list, flujos: np.ndarray, meta: dict) -> list:
+    kpis = calcular_kpis(pd.Series(np.asarray(flujos, dtype=np.float64), index=ids))
+    return [
+        ("Función objetivo", meta.get("funcion_objetivo") or "No especificado"),
+        ("Valor objetivo", meta.get("objective_value") or 0),
+        ("Biomasa", kpis["kpi_biomasa"]),
+        ("ATP mantenimiento", kpis["kpi_atp"]),
+        ("Actividad total", kpis["kpi_flujo_total"]),
+        ("Reacciones activas", kpis["kpi_activas"]["activas"]),
+        ("Reacciones inactivas", kpis["kpi_activas"]["inactivas"]),
+        ("Fecha", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    ]
+
+
+def tabla_restricciones(restricciones: list) -> tuple[list, list]:
+    """Columnas (unión de claves, en orden) y filas, como pd.DataFrame(lista)."""
+    columnas = []
+    for r in restricciones:
+        columnas.extend(k for k in r if k not in columnas)
+    return columnas, [[r.get(c) for c in columnas] for r in restricciones]
+
+
+def filas_knockouts(knockouts: list) -> list:
+    """Tabla del cribado de knockouts (meta["knockouts"], ya ordenada)."""
+    return [
+        [
+            k["knockout"], ", ".join(k["reacciones"]), k["objective_value"],
+            k["relativo"], k["impacto"], k["letal"], k["status"], k["podado"]
+        ]
+        for k in knockouts
+    ]
+
+
+# ============================================================
+# 3. Escritores por formato
+# ============================================================
+def escribir_xlsx(archivo, ids: list, flujos: np.ndarray, meta: dict,
+                  progreso=sin_progreso) -> None:
+    """
+    Libro en modo write-only de openpyxl: las filas van a archivos
+    temporales (memoria constante) y el ZIP se escribe directo al
+    archivo destino, sin armar el libro completo en RAM.
+    """
+    libro = Workbook(write_only=True)
+
+    hoja = libro.create_sheet("Flujos")
+    hoja.append(COLUMNAS_FLUJOS)
+    for bloque in bloques_flujos(ids, flujos, progreso):
+        for fila in bloque:
+            hoja.append(fila)
+
+    hoja = libro.create_sheet("Resumen")
+    hoja.append(["Descripción", "Valor"])
+    for fila in filas_resumen(ids, flujos, meta):
+        hoja.append(fila)
+
+    restricciones = meta.get("restricciones") or []
+    if restricciones:
+        columnas, filas = tabla_restricciones(restricciones)
+        hoja = libro.create_sheet("Restricciones")
+        hoja.append(columnas)
+        for fila in filas:
+            hoja.append(fila)
+
+    knockouts = meta.get("knockouts") or []
+    if knockouts:
+        hoja = libro.create_sheet("Knockouts")
+        hoja.append(COLUMNAS_KNOCKOUTS)
+        for fila in filas_knockouts(knockouts):
+            hoja.append(fila)
+
+    progreso(0.9, "comprimiendo xlsx")
+    libro.save(archivo)
+
+
+def generar_csv(ids: list, flujos: np.ndarray, progreso=sin_progreso):
+    """CSV de la hoja de flujos, bloque a bloque (sin hilo)."""
+    yield (",".join(COLUMNAS_FLUJOS) + "\n").encode("utf-8")
+    for bloque in bloques_flujos(ids, flujos, progreso):
+        texto = io.StringIO()
+        for rxn_id, flujo, flujo_abs, activa in bloque:
+            texto.write(f"{_campo_csv(rxn_id)},{flujo!r},{flujo_abs!r},{activa}\n")
+        yield texto.getvalue().encode("utf-8")
+
+
+def _campo_csv(valor: str) -> str:
+    if any(c in valor for c in ',"\n\r'):
+        return '"' + valor.replace('"', '""') + '"'
+    return valor
+
+
+def escribir_parquet(archivo, ids: list, flujos: np.ndarray, progreso=sin_progreso) -> None:
+    """Un row group por bloque de FILAS_POR_BLOQUE (requiere pyarrow)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.schema([
+        ("Reacción", pa.string()),
+        ("Flujo", pa.float64()),
+        ("Flujo absoluto", pa.float64()),
+        ("Activa", pa.bool_())
+    ])
+    with pq.ParquetWriter(pa.PythonFile(archivo, mode="w"), esquema) as escritor:
+        for bloque in bloques_flujos(ids, flujos, progreso):
+            columnas = list(zip(*bloque))
+            escritor.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=campo.type) for col, campo in zip(columnas, esquema)],
+                schema=esquema
+            ))
+
+
+def parquet_disponible() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# ============================================================
+# 4. Punto de entrada: bytes de la exportación de un run
+# ============================================================
+def exportar_run(ids: list, flujos: np.ndarray, meta: dict, formato: str,
+                 progreso=sin_progreso):
+    """
+    Generador de bytes del run en `formato` (xlsx, csv o parquet).
+    Si `progreso` lanza una excepción (trabajo cancelado), el generador
+    la relanza al consumidor y el escritor se detiene.
+    """
+    if formato == "csv":
+        return generar_csv(ids, flujos, progreso)
+    if formato == "parquet":
+        return transmitir(lambda archivo: escribir_parquet(archivo, ids, flujos, progreso))
+    return transmitir(lambda archivo: escribir_xlsx(archivo, ids, flujos, meta, progreso))
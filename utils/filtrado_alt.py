@@ -2,36 +2,53 @@
 import cobra
 import pandas as pd
 import numpy as np
-import re
+import hashlib
+import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
+from scipy import sparse
 
+from utils.cache_modelos import DIRECTORIO_CACHE
+from utils.metabolitos import limpiar_metabolito  # noqa: F401  (reexportado)
+from utils.topologia import IndiceTopologia, rangos_concatenados
 
-# ============================================================
-# 1. Limpiar sufijos de compartimento
-# ============================================================
-def limpiar_metabolito(metabolito_id: str) -> str:
-    """
-    Elimina sufijos de compartimento tipo _c, _e, _p, etc.
-    Ejemplo: 'glc__D_c' -> 'glc__D'
-    """
-    return re.sub(r"(_\w$)", "", metabolito_id)
+
+# Un XLSX por modelo: models/cache/<clave>.alt.xlsx (ver ruta_xlsx); el
+# caché de modelos lo borra al expulsar <clave>.pkl
+RUTA_XLSX = Path("matriz_correlacion_alt.xlsx")
+MAX_ANALISIS_EN_CACHE = 4
 
 
 # ============================================================
 # 2. Construir diccionario metabolito -> set(subsistemas)
 # ============================================================
-def construir_diccionario_metabolitos(modelo: cobra.Model) -> dict:
-    metabolitos_dict = {}
+def construir_diccionario_metabolitos(modelo: cobra.Model,
+                                      topo: IndiceTopologia = None) -> dict:
+    """
+    Recorre las aristas (reacción, metabolito) de las reacciones con
+    subsistema usando los códigos enteros de `topo` (sin regex). Las
+    claves quedan en orden de primera aparición, como al recorrer
+    modelo.reactions.
+    """
+    topo = topo or IndiceTopologia(modelo)
+    tabla = topo.metabolitos
+
+    aristas = topo.aristas_de(np.flatnonzero(topo.codigo_subsistema >= 0))
+    base = tabla.codigo_base[topo.arista_met[aristas]].astype(np.int64)
+    sub = topo.codigo_subsistema[topo.arista_rxn[aristas]].astype(np.int64)
 
-    for reaccion in modelo.reactions:
-        if not reaccion.subsystem:
-            continue
+    _, primera = np.unique(base, return_index=True)
+    metabolitos_dict = {tabla.base_ids[b]: set() for b in base[np.sort(primera)].tolist()}
 
-        for metabolito in reaccion.metabolites:
-            metab = limpiar_metabolito(metabolito.id)
-            if metab not in metabolitos_dict:
-                metabolitos_dict[metab] = set()
-            metabolitos_dict[metab].add(reaccion.subsystem)
+    # Pares (metabolito, subsistema) en orden de aparición: así cada set
+    # se llena en el mismo orden que con el recorrido por reacciones
+    n_subs = max(len(topo.lista_subsistemas), 1)
+    pares = base * n_subs + sub
+    _, primera_par = np.unique(pares, return_index=True)
+    pares = pares[np.sort(primera_par)]
+    for b, s in zip((pares // n_subs).tolist(), (pares % n_subs).tolist()):
+        metabolitos_dict[tabla.base_ids[b]].add(topo.lista_subsistemas[s])
 
     return metabolitos_dict
 
@@ -71,135 +88,372 @@ def filtrar_metabolitos(metabolitos_dict: dict) -> tuple[dict, list]:
 # 4. Matriz de intensidad (subsistema × metabolito)
 #    valor = nº de subsistemas en los que aparece ese metabolito
 # ============================================================
-def construir_matriz_intensity(metabolitos_filtrados: dict) -> pd.DataFrame:
+class MatrizIntensidad:
+    """
+    Matriz de intensidad en forma dispersa (solo celdas != 0):
+      - subsistemas: filas (ordenadas)
+      - metabolitos: columnas (ordenadas)
+      - filas, columnas, valores: int32, una entrada por par
+        (subsistema, metabolito), en orden fila a fila
+
+    Ocupa O(nnz) en vez de O(subsistemas × metabolitos).
+    `a_dataframe()` da la matriz densa si hace falta exportarla.
+    """
+
+    def __init__(self, subsistemas: list, metabolitos: list,
+                 filas: np.ndarray, columnas: np.ndarray, valores: np.ndarray):
+        orden = np.lexsort((columnas, filas))
+        self.subsistemas = list(subsistemas)
+        self.metabolitos = list(metabolitos)
+        self.filas = np.asarray(filas, dtype=np.int32)[orden]
+        self.columnas = np.asarray(columnas, dtype=np.int32)[orden]
+        self.valores = np.asarray(valores, dtype=np.int32)[orden]
+
+    @property
+    def shape(self) -> tuple:
+        return len(self.subsistemas), len(self.metabolitos)
+
+    @classmethod
+    def desde_dataframe(cls, df: pd.DataFrame) -> "MatrizIntensidad":
+        filas, columnas = np.nonzero(df.values)
+        return cls(df.index, df.columns, filas, columnas, df.values[filas, columnas])
+
+    def a_dataframe(self) -> pd.DataFrame:
+        denso = np.zeros(self.shape, dtype=np.int64)
+        denso[self.filas, self.columnas] = self.valores
+        return pd.DataFrame(denso, index=self.subsistemas, columns=self.metabolitos)
+
+
+def construir_matriz_intensity(metabolitos_filtrados: dict) -> MatrizIntensidad:
     metabolitos_lista = sorted(metabolitos_filtrados.keys())
     subs_fila = sorted({s for subs in metabolitos_filtrados.values() for s in subs})
+    codigo = {s: i for i, s in enumerate(subs_fila)}
 
-    matrix_intensity = []
-    for subsistema in subs_fila:
-        fila = []
-        for metab in metabolitos_lista:
-            if subsistema in metabolitos_filtrados[metab]:
-                fila.append(len(metabolitos_filtrados[metab]))
-            else:
-                fila.append(0)
-        matrix_intensity.append(fila)
+    # Una sola pasada por el mapa metabolito → subsistemas
+    filas, columnas, valores = [], [], []
+    for j, metab in enumerate(metabolitos_lista):
+        subs = metabolitos_filtrados[metab]
+        filas.extend(codigo[s] for s in subs)
+        columnas.extend([j] * len(subs))
+        valores.extend([len(subs)] * len(subs))
 
-    df_intensity = pd.DataFrame(matrix_intensity, index=subs_fila, columns=metabolitos_lista)
-    return df_intensity
+    return MatrizIntensidad(subs_fila, metabolitos_lista, filas, columnas, valores)
 
 
-# ============================================================
-# 5. Buscar valores en rango por columna
-#    (tal como en tu notebook: 2–10)
-# ============================================================
-def buscar_en_rango_por_columna(df: pd.DataFrame, min_val: int = 2) -> dict:
+def _como_matriz_intensidad(intensidad) -> MatrizIntensidad:
+    if isinstance(intensidad, pd.DataFrame):
+        return MatrizIntensidad.desde_dataframe(intensidad)
+    return intensidad
+
+
+def _rango_dinamico(intensidad: MatrizIntensidad, min_val: int) -> np.ndarray:
     """
-    Busca valores >= min_val y <= max_val, donde:
+    Máscara de las celdas con min_val <= valor <= max_val, donde:
     - max_val = valor máximo encontrado en la matriz
     - si el máximo es igual al total de subsistemas,
       entonces usamos (max_val - 1)
     """
-
-    # Número total de subsistemas
-    total_subsistemas = df.shape[0]
-
-    # Valor máximo REAL encontrado en la matriz intensity
-    max_val_bruto = int(df.values.max())
-
-    # ¿Algún metabolito aparece en TODOS los subsistemas?
+    total_subsistemas = len(intensidad.subsistemas)
+    max_val_bruto = int(intensidad.valores.max()) if len(intensidad.valores) else 0
     if max_val_bruto == total_subsistemas:
         max_val = max_val_bruto - 1
     else:
         max_val = max_val_bruto
+    return (intensidad.valores >= min_val) & (intensidad.valores <= max_val)
 
-    resultados = {}
-
-    for subs in df.index:
-        fila = df.loc[subs]
 
-        # Solo valores entre min_val y max_val dinámico
-        valores = fila[(fila >= min_val) & (fila <= max_val)]
+# ============================================================
+# 5. Buscar valores en rango por columna
+#    (tal como en tu notebook: 2–10)
+# ============================================================
+def buscar_en_rango_por_columna(intensidad, min_val: int = 2) -> dict:
+    """
+    Agrupa las celdas en rango (ver `_rango_dinamico`) como
+    {valor: {metabolito: [subsistemas]}}, recorriendo fila a fila.
+    Acepta una MatrizIntensidad o un DataFrame denso.
+    """
+    intensidad = _como_matriz_intensidad(intensidad)
+    en_rango = np.flatnonzero(_rango_dinamico(intensidad, min_val))
 
-        for col, val in valores.items():
-            if val not in resultados:
-                resultados[val] = {}
-            if col not in resultados[val]:
-                resultados[val][col] = []
-            resultados[val][col].append(subs)
+    resultados = {}
+    for fila, col, val in zip(intensidad.filas[en_rango].tolist(),
+                              intensidad.columnas[en_rango].tolist(),
+                              intensidad.valores[en_rango].tolist()):
+        resultados.setdefault(val, {}).setdefault(
+            intensidad.metabolitos[col], []
+        ).append(intensidad.subsistemas[fila])
 
     return resultados
 
 
 # ============================================================
 # 6. Construcción de matriz correlación S×S
-#    (algoritmo original con acumulación)
+#    (algoritmo original con acumulación, por niveles)
 # ============================================================
-def construir_matriz_correlacion(df_intensity: pd.DataFrame) -> pd.DataFrame:
-    resultados = buscar_en_rango_por_columna(df_intensity, min_val=2)
-
-    resultados_legibles = {
-        int(k): {col: sorted(v) for col, v in valores.items()}
-        for k, valores in sorted(resultados.items())
-    }
-
-    subsistemas = df_intensity.index
-    matriz = np.identity(len(subsistemas))
-    matriz_correlacion = pd.DataFrame(matriz, index=subsistemas, columns=subsistemas)
+def construir_matriz_correlacion(intensidad) -> pd.DataFrame:
+    """
+    Cada "nivel" k (valor de intensidad entre 2 y el máximo dinámico de
+    `_rango_dinamico`) suma +1 a M[A, B] por cada metabolito de nivel k
+    presente en los subsistemas A y B (A != B). Los niveles se acumulan
+    de menor a mayor hasta que ningún subsistema quede aislado (suma de
+    fila == 1, solo la diagonal).
+
+    Con la matriz de incidencia dispersa B_k (subsistema × metabolito,
+    1 si la celda vale k) el aporte de un nivel es B_k · B_kᵀ sin la
+    diagonal: un producto por nivel en vez de un bucle por par.
+    """
+    intensidad = _como_matriz_intensidad(intensidad)
+    subsistemas = pd.Index(intensidad.subsistemas)
+    n = len(subsistemas)
+
+    en_rango = _rango_dinamico(intensidad, 2)
+    filas = intensidad.filas[en_rango]
+    cols = intensidad.columnas[en_rango]
+    nivel = intensidad.valores[en_rango]
+
+    matriz = np.identity(n)
+    for k in np.unique(nivel):
+        if not (matriz.sum(axis=1) == 1.0).any():
+            break
 
-    numeros = list(resultados_legibles.keys())
-    indice = 0
+        en_nivel = nivel == k
+        incidencia = sparse.csr_matrix(
+            (np.ones(int(en_nivel.sum())), (filas[en_nivel], cols[en_nivel])),
+            shape=intensidad.shape
+        )
+        aporte = (incidencia @ incidencia.T).toarray()
+        np.fill_diagonal(aporte, 0.0)
+        matriz += aporte
 
-    while 1.0 in matriz_correlacion.sum(axis=1).values:
-        if indice >= len(numeros):
-            break
+    return pd.DataFrame(matriz, index=subsistemas, columns=subsistemas)
 
-        numero = numeros[indice]
 
-        for metabolito, filas in resultados_legibles[numero].items():
-            for i in range(len(filas)):
-                for j in range(i + 1, len(filas)):
-                    A = filas[i]
-                    B = filas[j]
-                    matriz_correlacion.loc[A, B] += 1
-                    matriz_correlacion.loc[B, A] += 1
+# ============================================================
+# 7. Exportar matriz_correlacion a XLSX fuera del request
+# ============================================================
+_lock_xlsx = threading.Lock()
 
-        if 1.0 not in matriz_correlacion.sum(axis=1).values:
-            break
 
-        indice += 1
+def exportar_xlsx_en_segundo_plano(matriz_correlacion: pd.DataFrame,
+                                   ruta: Path = RUTA_XLSX) -> threading.Thread:
+    """
+    Escribe el XLSX en un hilo aparte (escritura atómica: .tmp y
+    luego rename), así el request no espera a openpyxl.
+    """
+    def escribir():
+        with _lock_xlsx:
+            ruta_tmp = ruta.with_name(ruta.stem + ".tmp" + ruta.suffix)
+            try:
+                ruta.parent.mkdir(parents=True, exist_ok=True)
+                matriz_correlacion.to_excel(ruta_tmp)
+                os.replace(ruta_tmp, ruta)
+            except OSError:
+                pass
 
-    return matriz_correlacion
+    hilo = threading.Thread(target=escribir, daemon=True)
+    hilo.start()
+    return hilo
 
 
 # ============================================================
-# 7. Función principal: genera TODA la info de subsistemas
+# 8. Función principal: genera TODA la info de subsistemas
 #    y exporta matriz_correlacion a XLSX
 # ============================================================
-def generar_matriz_subsistemas(modelo: cobra.Model) -> dict:
+def ruta_xlsx(clave: str = None) -> Path:
+    """
+    XLSX del modelo `clave` junto a su pickle en el caché de modelos
+    (así se borra con él); sin clave, RUTA_XLSX.
+    """
+    if not clave:
+        return RUTA_XLSX
+    return DIRECTORIO_CACHE / f"{clave}.alt.xlsx"
+
+
+def generar_matriz_subsistemas(modelo: cobra.Model, topo: IndiceTopologia = None,
+                               ruta: Path = RUTA_XLSX) -> dict:
     """
     Devuelve:
       - metabolitos_filtrados: dict metabolito -> set(subsistemas)
       - todos_subsistemas: lista ordenada de subsistemas
-      - df_intensity: DataFrame subsistema×metabolito
+      - intensidad: MatrizIntensidad subsistema×metabolito (dispersa)
       - matriz_correlacion: DataFrame subsistema×subsistema
-    Además exporta matriz_correlacion a 'matriz_correlacion_alt.xlsx'
-    en la raíz del proyecto.
+    Además exporta matriz_correlacion a `ruta` (por defecto
+    'matriz_correlacion_alt.xlsx' en la raíz del proyecto) en segundo
+    plano.
     """
 
-    metabolitos_dict = construir_diccionario_metabolitos(modelo)
+    metabolitos_dict = construir_diccionario_metabolitos(modelo, topo)
     metabolitos_filtrados, todos_subsistemas = filtrar_metabolitos(metabolitos_dict)
-    df_intensity = construir_matriz_intensity(metabolitos_filtrados)
-    matriz_correlacion = construir_matriz_correlacion(df_intensity)
+    intensidad = construir_matriz_intensity(metabolitos_filtrados)
+    matriz_correlacion = construir_matriz_correlacion(intensidad)
 
     # Exportar a XLSX (ruta relativa al proyecto)
-    ruta_xlsx = Path("matriz_correlacion_alt.xlsx")
-    matriz_correlacion.to_excel(ruta_xlsx)
+    exportar_xlsx_en_segundo_plano(matriz_correlacion, ruta)
 
     return {
         "metabolitos_filtrados": metabolitos_filtrados,
         "todos_subsistemas": todos_subsistemas,
-        "df_intensity": df_intensity,
+        "intensidad": intensidad,
         "matriz_correlacion": matriz_correlacion,
-        "ruta_xlsx": str(ruta_xlsx)
+        "ruta_xlsx": str(ruta)
     }
+
+
+# ============================================================
+# 8b. Selección de metabolitos del grafo ALT y tabla de relaciones
+# ============================================================
+def seleccionar_metabolitos_alt(metabolitos_filtrados: dict, todos_subsistemas: list,
+                                actividad_max: dict, es_gigante: bool) -> tuple[dict, list]:
+    """
+    En modelos gigantes solo quedan los metabolitos con actividad_max > 0
+    y los subsistemas conectados a ellos; si no, todo el análisis.
+    Devuelve (metabolitos_filtrados_activos, subs_conectados).
+    """
+    if not es_gigante:
+        return metabolitos_filtrados, todos_subsistemas
+
+    activos = {
+        m: subs
+        for m, subs in metabolitos_filtrados.items()
+        if actividad_max.get(m, 0) > 0
+    }
+    subs_conectados = sorted({s for subs in activos.values() for s in subs})
+    return activos, subs_conectados
+
+
+def tabla_relaciones(metabolitos: dict, subsistemas: list) -> list:
+    """
+    Filas {"Subsistema A", "Subsistema B", "Metabolitos"} por cada par de
+    `subsistemas` (A antes que B) que comparte algún metabolito.
+
+    Índice invertido: cada metabolito aporta sus propios pares de
+    subsistemas, así solo se visitan los pares que sí comparten algo
+    (O(Σ k²) con k = subsistemas por metabolito). Los metabolitos de
+    cada par quedan en orden alfabético.
+    """
+    posicion = {s: i for i, s in enumerate(subsistemas)}
+    pares = {}
+    for metab, subs in sorted(metabolitos.items()):
+        indices = sorted({posicion[s] for s in subs if s in posicion})
+        for i, a in enumerate(indices):
+            for b in indices[i + 1:]:
+                pares.setdefault((a, b), []).append(metab)
+
+    return [
+        {
+            "Subsistema A": subsistemas[a],
+            "Subsistema B": subsistemas[b],
+            "Metabolitos": ", ".join(pares[(a, b)])
+        }
+        for a, b in sorted(pares)
+    ]
+
+
+# ============================================================
+# 9. Análisis memorizado por modelo
+# ============================================================
+def firma_subsistemas(modelo: cobra.Model) -> str:
+    """
+    Hash de todo lo que usa el análisis: IDs de reacción, subsistema
+    y metabolitos de cada reacción. Cambia solo si cambian reacciones
+    o subsistemas (no los bounds ni los flujos).
+    """
+    h = hashlib.sha256()
+    for rxn in modelo.reactions:
+        h.update(rxn.id.encode("utf-8"))
+        h.update(b"\0")
+        h.update((rxn.subsystem or "").encode("utf-8"))
+        h.update(b"\0")
+        h.update("\0".join(met.id for met in rxn.metabolites).encode("utf-8"))
+        h.update(b"\1")
+    return h.hexdigest()
+
+
+class IncidenciaMetabolitos:
+    """
+    Incidencia metabolito filtrado × reacción en CSR: las reacciones del
+    metabolito k están en rxn[indptr[k]:indptr[k+1]] (una entrada por
+    par reacción–metabolito, en orden del modelo; `grupo` = k de cada
+    entrada). No depende del run, se calcula una vez por modelo.
+    """
+
+    def __init__(self, topo: IndiceTopologia, metabolitos: dict):
+        tabla = topo.metabolitos
+        self.metabolitos = list(metabolitos)
+        self.posicion = {m: k for k, m in enumerate(self.metabolitos)}
+        codigos = np.array([tabla.posicion_base[m] for m in self.metabolitos], dtype=np.int64)
+
+        base_de_arista = tabla.codigo_base[topo.arista_met]
+        orden = np.argsort(base_de_arista, kind="stable")   # agrupa sin perder el orden
+        inicio = np.searchsorted(base_de_arista[orden], codigos, side="left")
+        fin = np.searchsorted(base_de_arista[orden], codigos, side="right")
+        cuenta = fin - inicio
+
+        self.indptr = np.concatenate([[0], np.cumsum(cuenta)]).astype(np.int64)
+        self.rxn = topo.arista_rxn[orden[rangos_concatenados(inicio, cuenta)]]
+        self.grupo = np.repeat(np.arange(len(self.metabolitos), dtype=np.int64), cuenta)
+
+    def actividad(self, flujos: np.ndarray) -> tuple:
+        """(máximo, suma, promedio) de |flujo| por metabolito (scatter-reduce)."""
+        n = len(self.metabolitos)
+        flujos_abs = np.abs(flujos[self.rxn])
+
+        maximo = np.zeros(n)
+        np.maximum.at(maximo, self.grupo, flujos_abs)
+        suma = np.bincount(self.grupo, weights=flujos_abs, minlength=n)
+        cuenta = np.diff(self.indptr)
+        promedio = np.divide(suma, cuenta, out=np.zeros(n), where=cuenta > 0)
+        return maximo, suma, promedio
+
+    def reacciones(self, metabolito: str, flujos: np.ndarray, rxn_ids: list) -> list:
+        """[{"id", "flux"}, ...] de un metabolito para el run dado."""
+        k = self.posicion[metabolito]
+        idx = self.rxn[self.indptr[k]:self.indptr[k + 1]]
+        return [{"id": rxn_ids[i], "flux": f} for i, f in zip(idx.tolist(), flujos[idx].tolist())]
+
+
+class CacheAnalisisSubsistemas:
+    """
+    Guarda el resultado de `generar_matriz_subsistemas` por modelo, más
+    lo que /grafo_datos_alt necesita y no depende del run:
+      - matriz_correlacion_dict: la matriz ya convertida a dict
+      - incidencia: IncidenciaMetabolitos (metabolito filtrado ×
+        reacción) para agregar la actividad de cada run
+
+    La clave es `clave` (el modelo_id: hash del archivo, fijo mientras
+    el modelo esté cargado), así una consulta repetida no recorre el
+    modelo; sin ella se calcula `firma_subsistemas`. El XLSX se escribe
+    una sola vez por análisis nuevo, en un archivo por clave. `topo`
+    debe corresponder a `modelo` (si no se pasa, se construye).
+    """
+
+    def __init__(self, max_entradas: int = MAX_ANALISIS_EN_CACHE):
+        self.max_entradas = max_entradas
+        self._analisis = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, modelo: cobra.Model, topo: IndiceTopologia = None,
+                clave: str = None) -> dict:
+        firma = clave or firma_subsistemas(modelo)
+
+        with self._lock:
+            if firma in self._analisis:
+                self._analisis.move_to_end(firma)
+                return self._analisis[firma]
+
+        topo = topo or IndiceTopologia(modelo)
+        datos = generar_matriz_subsistemas(modelo, topo, ruta_xlsx(firma))
+        datos["firma"] = firma
+        datos["matriz_correlacion_dict"] = datos["matriz_correlacion"].to_dict()
+        datos["incidencia"] = IncidenciaMetabolitos(topo, datos["metabolitos_filtrados"])
+
+        with self._lock:
+            self._analisis[firma] = datos
+            while len(self._analisis) > self.max_entradas:
+                self._analisis.popitem(last=False)
+
+        return datos
+
+
+# Instancia compartida por la app
+cache_analisis = CacheAnalisisSubsistemas()
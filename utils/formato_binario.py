@@ -0,0 +1,143 @@
+# utils/formato_binario.py
+import json
+import struct
+
+import numpy as np
+
+from utils.colores import MapaColores
+from utils.topologia import IndiceTopologia, ids_nodos
+
+
+# ============================================================
+# Formato binario columnar del grafo 3D  ("FBG1")
+# ============================================================
+#
+#   bytes 0-3   b"FBG1"
+#   bytes 4-7   uint32 LE: longitud N de la cabecera JSON
+#   bytes 8-    cabecera JSON (utf-8), relleno con espacios hasta
+#               múltiplo de 8
+#   resto       columnas, cada una alineada a 8 bytes; la cabecera
+#               indica nombre, tipo, offset (desde el inicio) y longitud
+#
+# Cabecera:
+#   max_flux, subsistemas, modelo_gigante    (igual que en el JSON)
+#   max_color           valor que corresponde al extremo de la paleta
+#   n_nodos, n_enlaces
+#   paleta              colores usados, referenciados por *_color
+#   columnas            [{nombre, tipo, offset, longitud}]
+#
+# nodo_subsistema indexa `subsistemas`; el valor len(subsistemas)
+# significa "NA" (reacción sin subsistema).
+#
+# Los IDs de nodo van en la columna "ids" (utf-8 separados por "\0").
+# Los enlaces referencian nodos por posición (uint32), no por ID.
+# Todo es little-endian.
+
+MAGIA = b"FBG1"
+
+GRUPO_REACCION = 0
+GRUPO_METABOLITO = 1
+
+COLOR_METABOLITO = "#1f77b4"
+COLOR_SIN_FLUJO = "#CCCCCC"
+
+
+def _alinear(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def empaquetar_grafo(topo: IndiceTopologia, cols: dict, mapa: MapaColores,
+                     max_flux: float, modelo_gigante: bool,
+                     valores_color: np.ndarray = None, max_color: float = None) -> bytes:
+    """
+    Serializa el resultado de `columnas_grafo` al formato FBG1.
+    Por defecto el color es |flujo| / max_flux; con `valores_color` (uno
+    por reacción seleccionada) y `max_color` se colorea por esos valores
+    (p. ej. la variabilidad de FVA).
+    """
+    n_lut = len(mapa.lut)
+    paleta_completa = mapa.lut.tolist() + [mapa.color_nan, COLOR_SIN_FLUJO, COLOR_METABOLITO]
+    idx_nan, idx_sin_flujo, idx_metab = n_lut, n_lut + 1, n_lut + 2
+
+    # Color por reacción seleccionada (índice en la paleta)
+    flujo_sel = cols["flujo_sel"]
+    if valores_color is None:
+        valores_color, max_color = np.abs(flujo_sel), max_flux
+    if max_color <= 0:
+        color_sel = np.full(len(flujo_sel), idx_sin_flujo, dtype=np.uint16)
+    else:
+        idx = mapa.indices(valores_color, max_color)
+        color_sel = np.where(idx < 0, idx_nan, idx).astype(np.uint16)
+
+    # Subsistema por nodo (índice en lista_subsistemas; "NA" = al final)
+    codigo = topo.codigo_subsistema[cols["rxn_sel"][cols["nodo_sel"]]]
+    nodo_subsistema = np.where(codigo < 0, len(topo.lista_subsistemas), codigo)
+
+    es_rxn = cols["nodo_es_rxn"]
+    ids = "\0".join(ids_nodos(topo, cols)).encode("utf-8")
+
+    # Paleta reducida a los colores realmente usados
+    nodo_color = np.where(es_rxn, color_sel[cols["nodo_sel"]], idx_metab)
+    enlace_color = color_sel[cols["enlace_sel"]]
+    usados, inverso = np.unique(
+        np.concatenate([nodo_color, enlace_color]).astype(np.int64), return_inverse=True
+    )
+    paleta = [paleta_completa[i] for i in usados.tolist()]
+    nodo_color = inverso[:len(nodo_color)]
+    enlace_color = inverso[len(nodo_color):]
+
+    columnas = [
+        ("ids", "utf8", np.frombuffer(ids, dtype=np.uint8)),
+        ("nodo_grupo", "uint8",
+         np.where(es_rxn, GRUPO_REACCION, GRUPO_METABOLITO).astype(np.uint8)),
+        ("nodo_subsistema", "uint16", nodo_subsistema.astype("<u2")),
+        ("nodo_flux", "float64",
+         np.where(es_rxn, np.abs(flujo_sel[cols["nodo_sel"]]), 0.0).astype("<f8")),
+        ("nodo_color", "uint16", nodo_color.astype("<u2")),
+        ("enlace_origen", "uint32", cols["enlace_origen"].astype("<u4")),
+        ("enlace_destino", "uint32", cols["enlace_destino"].astype("<u4")),
+        ("enlace_flux_signed", "float64", flujo_sel[cols["enlace_sel"]].astype("<f8")),
+        ("enlace_coeff", "float64", cols["enlace_coef"].astype("<f8")),
+        ("enlace_color", "uint16", enlace_color.astype("<u2")),
+    ]
+
+    cabecera = {
+        "version": 1,
+        "max_flux": max_flux,
+        "max_color": max_color,
+        "subsistemas": topo.lista_subsistemas,
+        "modelo_gigante": modelo_gigante,
+        "n_nodos": int(len(es_rxn)),
+        "n_enlaces": int(len(cols["enlace_origen"])),
+        "paleta": paleta,
+        "columnas": []
+    }
+
+    # Los offsets dependen de la longitud de la cabecera, que a su vez
+    # contiene los offsets: se repite hasta que la longitud no cambie
+    cabecera_bytes = b""
+    while True:
+        offset = 8 + len(cabecera_bytes)
+        cabecera["columnas"] = []
+        for nombre, tipo, arr in columnas:
+            cabecera["columnas"].append({
+                "nombre": nombre, "tipo": tipo, "offset": offset, "longitud": int(arr.size)
+            })
+            offset = _alinear(offset + arr.nbytes)
+
+        texto = json.dumps(cabecera, separators=(",", ":")).encode("utf-8")
+        nueva = texto + b" " * (_alinear(8 + len(texto)) - 8 - len(texto))
+        estable = len(nueva) == len(cabecera_bytes)
+        cabecera_bytes = nueva
+        if estable:
+            break
+
+    partes = [MAGIA, struct.pack("<I", len(cabecera_bytes)), cabecera_bytes]
+    posicion = 8 + len(cabecera_bytes)
+    for (nombre, tipo, arr), info in zip(columnas, cabecera["columnas"]):
+        partes.append(b"\0" * (info["offset"] - posicion))
+        datos = arr.tobytes()
+        partes.append(datos)
+        posicion = info["offset"] + len(datos)
+
+    return b"".join(partes)
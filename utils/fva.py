@@ -0,0 +1,64 @@
+# utils/fva.py
+import cobra
+import numpy as np
+from cobra.flux_analysis import flux_variability_analysis
+
+from utils.restricciones import aplicar_restricciones
+
+
+# Reacciones por tarea: bloques chicos para ir entregando resultados
+# pronto y repartir bien la carga; grandes para que el LP inicial de
+# cada bloque (el óptimo) pese poco frente a los 2 LPs por reacción
+TAM_BLOQUE_FVA = 250
+
+
+# ============================================================
+# 1. Partir la lista de reacciones en bloques
+# ============================================================
+def bloques_reacciones(rxn_ids: list, tam_bloque: int = TAM_BLOQUE_FVA) -> list:
+    return [rxn_ids[i:i + tam_bloque] for i in range(0, len(rxn_ids), tam_bloque)]
+
+
+# ============================================================
+# 2. FVA de UN bloque (en el proceso actual o en un worker)
+# ============================================================
+def fva_bloque(modelo: cobra.Model, funcion_objetivo: str, restricciones: list,
+               rxn_ids: list, fraccion_optimo: float = 1.0) -> dict:
+    """
+    Mínimo y máximo de cada reacción de `rxn_ids` manteniendo el
+    objetivo en al menos `fraccion_optimo` de su óptimo, con las mismas
+    restricciones que el FBA. Todo se revierte al salir de `with modelo:`.
+
+    Lanza ValueError si la función objetivo no existe; si el problema
+    es infactible, la excepción de COBRApy sube tal cual.
+    """
+    with modelo:
+        try:
+            modelo.objective = funcion_objetivo
+        except Exception:
+            raise ValueError(f"La reacción '{funcion_objetivo}' no existe.")
+
+        aplicar_restricciones(modelo, restricciones)
+        tabla = flux_variability_analysis(
+            modelo, reaction_list=rxn_ids,
+            fraction_of_optimum=fraccion_optimo, processes=1
+        )
+
+    tabla = tabla.reindex(rxn_ids)
+    return {
+        "minimo": tabla["minimum"].to_numpy(dtype=np.float64).tolist(),
+        "maximo": tabla["maximum"].to_numpy(dtype=np.float64).tolist()
+    }
+
+
+# ============================================================
+# 3. Rango (min, max) del run en el orden de reacciones del modelo
+# ============================================================
+def rango_vacio(n_reacciones: int) -> np.ndarray:
+    """Array (n, 2) float64 con NaN: reacción aún no analizada."""
+    return np.full((n_reacciones, 2), np.nan, dtype=np.float64)
+
+
+def llenar_rango(rango: np.ndarray, posiciones: list, resultado: dict) -> None:
+    rango[posiciones, 0] = resultado["minimo"]
+    rango[posiciones, 1] = resultado["maximo"]
@@ -0,0 +1,182 @@
+# utils/knockouts.py
+import os
+
+import cobra
+import numpy as np
+
+from utils.escenarios import UMBRAL_ACTIVA
+
+
+# Crecimiento relativo (objetivo KO / objetivo WT) bajo el cual un
+# knockout se considera letal
+UMBRAL_LETAL = 0.01
+
+# Límites del cribado doble: candidatos (matriz n×n de actividad) y
+# pares que quedan después de la poda
+MAX_CANDIDATOS_DOBLE = int(os.environ.get("FBA_KO_MAX_CANDIDATOS_DOBLE", "2000"))
+MAX_PARES = int(os.environ.get("FBA_KO_MAX_PARES", "50000"))
+
+TIPOS_KNOCKOUT = ("reacciones", "genes")
+
+
+# ============================================================
+# 1. Candidatos: qué reacciones desactiva cada eliminación
+# ============================================================
+class CandidatosKnockout:
+    """
+    Elementos a eliminar (IDs de reacción o de gen) y, para cada uno,
+    las posiciones (en `modelo.reactions`) de las reacciones que quedan
+    desactivadas. Para genes se evalúa la GPR de cada reacción del gen,
+    así un gen con isoenzima no desactiva nada por sí solo.
+
+    Debe construirse con el modelo sin modificar (lock de lectura).
+    """
+
+    def __init__(self, modelo: cobra.Model, tipo: str, ids: list = None):
+        if tipo not in TIPOS_KNOCKOUT:
+            raise ValueError("Tipo de knockout no soportado. Use reacciones o genes")
+
+        self.tipo = tipo
+        self.rxn_ids = [rxn.id for rxn in modelo.reactions]
+        posicion = {rxn_id: i for i, rxn_id in enumerate(self.rxn_ids)}
+        coleccion = modelo.reactions if tipo == "reacciones" else modelo.genes
+
+        if ids is None:
+            ids = [elem.id for elem in coleccion]
+        faltan = [i for i in ids if i not in coleccion]
+        if faltan:
+            raise ValueError(f"No existen en el modelo: {', '.join(faltan[:10])}")
+        self.ids = list(dict.fromkeys(ids))
+
+        if tipo == "reacciones":
+            self.desactiva = [np.array([posicion[i]], dtype=np.int64) for i in self.ids]
+            self._gpr = None
+        else:
+            # Reacciones de cada gen con su GPR (para evaluar pares)
+            self._gpr = [
+                [(posicion[rxn.id], rxn.gpr) for rxn in coleccion.get_by_id(g).reactions]
+                for g in self.ids
+            ]
+            self.desactiva = [
+                self._evaluar(gprs, {g}) for g, gprs in zip(self.ids, self._gpr)
+            ]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _evaluar(gprs: list, eliminados: set) -> np.ndarray:
+        return np.array(
+            sorted({pos for pos, gpr in gprs if not gpr.eval(knockouts=eliminados)}),
+            dtype=np.int64
+        )
+
+    def desactiva_par(self, i: int, j: int) -> np.ndarray:
+        if self._gpr is None:
+            return np.union1d(self.desactiva[i], self.desactiva[j])
+        return self._evaluar(self._gpr[i] + self._gpr[j], {self.ids[i], self.ids[j]})
+
+    def reacciones_de(self, posiciones: np.ndarray) -> list:
+        return [self.rxn_ids[p] for p in posiciones.tolist()]
+
+    def columnas(self) -> list:
+        """
+        Reacciones que puede tocar cada candidato (las que desactiva o,
+        para genes, todas las de su GPR): sirven para la poda de pares.
+        """
+        if self._gpr is None:
+            return self.desactiva
+        return [np.array(sorted({pos for pos, _ in gprs}), dtype=np.int64) for gprs in self._gpr]
+
+
+# ============================================================
+# 2. Poda con la solución silvestre (WT) y las soluciones simples
+# ============================================================
+def podar_simples(candidatos: CandidatosKnockout, flujos_wt: np.ndarray) -> np.ndarray:
+    """
+    True para los candidatos que hay que resolver: los que desactivan al
+    menos una reacción con flujo en el WT. Si ninguna lleva flujo, la
+    solución WT sigue siendo factible y el objetivo no cambia.
+    """
+    activas = np.abs(flujos_wt) > UMBRAL_ACTIVA
+    return np.array([bool(activas[d].any()) for d in candidatos.desactiva], dtype=bool)
+
+
+def toca_activas(candidatos: CandidatosKnockout, activas: list) -> np.ndarray:
+    """
+    Matriz n×n: [i, j] = el candidato j toca alguna reacción con flujo
+    en la solución del knockout simple i (`activas[i]`, máscara bool).
+    """
+    columnas = candidatos.columnas()
+    n = len(candidatos)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(c) for c in columnas])
+    todas = np.concatenate(columnas) if n else np.empty(0, dtype=np.int64)
+
+    matriz = np.zeros((n, n), dtype=bool)
+    for i, mascara in enumerate(activas):
+        por_columna = mascara[todas]
+        matriz[i] = np.logical_or.reduceat(por_columna, indptr[:-1]) if len(todas) else False
+        matriz[i, indptr[:-1] == indptr[1:]] = False  # candidatos sin reacciones
+    return matriz
+
+
+def pares_a_evaluar(candidatos: CandidatosKnockout, activas: list,
+                    no_letales: np.ndarray) -> tuple[list, int]:
+    """
+    Pares (i, j), i < j, cuyo doble knockout puede dar un objetivo
+    distinto al de los simples. Se descarta el par si lo que desactiva
+    j (además de i) no lleva flujo en la solución de i, o viceversa:
+    entonces esa solución simple sigue siendo óptima para el par.
+    Los pares con algún knockout simple letal tampoco se evalúan.
+
+    Devuelve (pares, podados).
+    """
+    n = len(candidatos)
+    toca = toca_activas(candidatos, activas)
+    posibles = np.triu(toca & toca.T, k=1)
+    posibles &= no_letales[:, None] & no_letales[None, :]
+    total = n * (n - 1) // 2
+
+    pares = []
+    for i, j in zip(*np.nonzero(posibles)):
+        i, j = int(i), int(j)
+        if candidatos.tipo == "genes":
+            # Filtro exacto: solo cuenta lo que el par desactiva de nuevo
+            par = candidatos.desactiva_par(i, j)
+            nuevas_j = np.setdiff1d(par, candidatos.desactiva[i], assume_unique=True)
+            nuevas_i = np.setdiff1d(par, candidatos.desactiva[j], assume_unique=True)
+            if not (activas[i][nuevas_j].any() and activas[j][nuevas_i].any()):
+                continue
+        pares.append((i, j))
+
+    return pares, total - len(pares)
+
+
+# ============================================================
+# 3. Fila de la tabla de resultados
+# ============================================================
+def fila_knockout(ids: list, reacciones: list, resumen: dict, objetivo_wt: float,
+                  podado: bool = False) -> dict:
+    valor = resumen.get("objective_value")
+    if resumen.get("status") != "optimal" or valor is None:
+        valor = 0.0
+    relativo = valor / objetivo_wt if objetivo_wt else 0.0
+
+    return {
+        "knockout": " + ".join(ids),
+        "ids": ids,
+        "reacciones": reacciones,
+        "objective_value": valor,
+        "relativo": relativo,
+        "impacto": 1.0 - relativo,
+        "letal": relativo < UMBRAL_LETAL,
+        "status": resumen.get("status") or ("error" if "error" in resumen else None),
+        "podado": podado,
+        **({"error": resumen["error"]} if "error" in resumen else {})
+    }
+
+
+def ordenar_tabla(filas: list) -> list:
+    """Mayor impacto primero; a igual impacto, dobles después de simples."""
+    return sorted(filas, key=lambda f: (-f["impacto"], len(f["ids"]), f["knockout"]))
@@ -0,0 +1,57 @@
+# utils/metabolitos.py
+import re
+
+import numpy as np
+
+
+# Sufijo de compartimento tipo _c, _e, _p, etc.
+PATRON_COMPARTIMENTO = re.compile(r"(_\w$)")
+
+
+# ============================================================
+# 1. Limpiar sufijos de compartimento (un ID suelto)
+# ============================================================
+def limpiar_metabolito(metabolito_id: str) -> str:
+    """
+    Elimina sufijos de compartimento tipo _c, _e, _p, etc.
+    Ejemplo: 'glc__D_c' -> 'glc__D'
+    """
+    return PATRON_COMPARTIMENTO.sub("", metabolito_id)
+
+
+def compartimento_metabolito(metabolito_id: str) -> str:
+    """'glc__D_c' -> 'c' ('' si el ID no tiene sufijo)."""
+    encontrado = PATRON_COMPARTIMENTO.search(metabolito_id)
+    return encontrado.group(1)[1:] if encontrado else ""
+
+
+# ============================================================
+# 2. Tabla ID de metabolito → ID base, por modelo
+# ============================================================
+class TablaMetabolitos:
+    """
+    Se construye una vez por modelo (la regex corre una sola vez por
+    metabolito). Después todo son búsquedas por entero:
+
+      - ids:          IDs de metabolito, en el orden del modelo
+      - codigo_base:  int32 por metabolito, índice en `base_ids`
+      - base_ids:     IDs sin compartimento, en orden de primera aparición
+      - compartimento: sufijo de cada metabolito ('' si no tiene)
+    """
+
+    def __init__(self, met_ids: list):
+        self.ids = list(met_ids)
+        self.compartimento = [compartimento_metabolito(m) for m in self.ids]
+
+        codigo = {}
+        codigo_base = np.empty(len(self.ids), dtype=np.int32)
+        for i, met_id in enumerate(self.ids):
+            base = limpiar_metabolito(met_id)
+            codigo_base[i] = codigo.setdefault(base, len(codigo))
+
+        self.base_ids = list(codigo)
+        self.codigo_base = codigo_base
+        self.posicion_base = codigo
+
+    def __len__(self):
+        return len(self.ids)
@@ -0,0 +1,199 @@
+# utils/pool_fba.py
+import atexit
+import multiprocessing
+import os
+import pickle
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ProcessPoolExecutor, as_completed
+
+from utils.escenarios import ejecutar_escenario, resumen_escenario, restricciones_de_escenario
+from utils.fva import fva_bloque
+from utils.sesion_solver import SesionSolver
+
+
+N_PROCESOS = int(os.environ.get("FBA_WORKERS", "0")) or os.cpu_count() or 1
+
+# Modelos con workers vivos a la vez (cada uno con N_PROCESOS procesos)
+MAX_POOLS = max(1, int(os.environ.get("FBA_POOLS_MAX", "2")))
+
+# Puntos máximos de un barrido (/barrido): se valida antes de armar escenarios
+MAX_PUNTOS_BARRIDO = int(os.environ.get("FBA_BARRIDO_MAX_PUNTOS", "10000"))
+
+# Fallos del pool que el llamador puede recuperar resolviendo en su hilo:
+# pool del modelo retirado del LRU o cerrado (RuntimeError), worker caído
+# (BrokenProcessPool, subclase de RuntimeError) o tarea cancelada
+ERRORES_POOL = (RuntimeError, CancelledError)
+
+
+# ============================================================
+# Estado de cada proceso worker (un modelo + su sesión de solver)
+# ============================================================
+_MODELO = None
+_SESION = None
+
+
+def _inicializar_worker(ruta_pickle: str) -> None:
+    """Se ejecuta UNA vez por proceso: carga el modelo desde el caché."""
+    global _MODELO, _SESION
+    warnings.filterwarnings("ignore", category=UserWarning)
+    with open(ruta_pickle, "rb") as f:
+        _MODELO = pickle.load(f)
+    _SESION = SesionSolver(_MODELO)
+
+
+def _tarea_escenario(args: tuple) -> dict:
+    escenario, incluir_flujos = args
+    try:
+        resultado = ejecutar_escenario(
+            _MODELO,
+            _SESION,
+            escenario.get("funcion_objetivo"),
+            restricciones_de_escenario(escenario)
+        )
+        return resumen_escenario(resultado, incluir_flujos)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _tarea_fva(args: tuple) -> tuple:
+    indice, funcion_objetivo, restricciones, rxn_ids, fraccion_optimo = args
+    try:
+        return indice, fva_bloque(_MODELO, funcion_objetivo, restricciones,
+                                  rxn_ids, fraccion_optimo)
+    except Exception as e:
+        return indice, {"error": str(e)}
+
+
+# ============================================================
+# Pool de procesos compartido por la app
+# ============================================================
+class PoolFBA:
+    """
+    Reparte escenarios independientes entre N procesos.
+
+    El modelo se envía a los workers una sola vez (cada proceso lo lee
+    del pickle del caché de modelos al arrancar), no en cada tarea.
+    Hay un executor por modelo, hasta `max_pools` (LRU): subir otro
+    modelo no tira los workers ya calientes de los demás. Un executor
+    expulsado se retira sin cancelar lo que ya tenía encolado, así los
+    lotes y FVA en curso de otros clientes terminan en sus workers. Los
+    resultados se devuelven en el mismo orden que los escenarios.
+    """
+
+    def __init__(self, n_procesos: int = N_PROCESOS, max_pools: int = MAX_POOLS):
+        self.n_procesos = n_procesos
+        self.max_pools = max_pools
+        self._executors = OrderedDict()   # modelo_id -> ProcessPoolExecutor
+        self._lock = threading.Lock()
+        atexit.register(self.cerrar)
+
+    def preparar(self, modelo_id: str, ruta_pickle: str) -> list:
+        """
+        Deja listo el executor de `modelo_id` (creándolo si hace falta).
+        Devuelve los modelo_id cuyo pickle el pool ya no necesita: los
+        expulsados del LRU y `modelo_id` si ya estaba listo (el llamador
+        fija el pickle antes de preparar y suelta cada id devuelto).
+        """
+        with self._lock:
+            if modelo_id in self._executors:
+                self._executors.move_to_end(modelo_id)
+                return [modelo_id]
+
+            self._executors[modelo_id] = ProcessPoolExecutor(
+                max_workers=self.n_procesos,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_inicializar_worker,
+                initargs=(str(ruta_pickle),)
+            )
+            liberados = []
+            while len(self._executors) > self.max_pools:
+                anterior, executor = self._executors.popitem(last=False)
+                # Sus workers salen cuando terminan las tareas ya enviadas
+                executor.shutdown(wait=False)
+                liberados.append(anterior)
+            return liberados
+
+    def disponible(self, modelo_id: str) -> bool:
+        with self._lock:
+            return modelo_id in self._executors
+
+    def cerrar(self) -> None:
+        with self._lock:
+            for executor in self._executors.values():
+                executor.shutdown(wait=False, cancel_futures=True)
+            self._executors.clear()
+
+    def _executor_de(self, modelo_id: str) -> ProcessPoolExecutor:
+        with self._lock:
+            executor = self._executors.get(modelo_id)
+            if executor is None:
+                raise RuntimeError("El pool ya no tiene cargado este modelo.")
+            self._executors.move_to_end(modelo_id)
+            return executor
+
+    # --------------------------------------------------------
+    # Ejecución
+    # --------------------------------------------------------
+    def escenarios(self, modelo_id: str, escenarios: list, incluir_flujos: bool = False):
+        """
+        Iterador de resúmenes, en orden, a medida que terminan. Lanza
+        uno de ERRORES_POOL si el pool ya no es de `modelo_id` o falla.
+        """
+        executor = self._executor_de(modelo_id)
+        tareas = [(esc, incluir_flujos) for esc in escenarios]
+        chunksize = max(1, len(tareas) // (self.n_procesos * 4))
+        return executor.map(_tarea_escenario, tareas, chunksize=chunksize)
+
+    def fva(self, modelo_id: str, bloques: list, funcion_objetivo: str,
+            restricciones: list, fraccion_optimo: float = 1.0):
+        """
+        Iterador de (indice_bloque, {"minimo", "maximo"} o {"error"}) en
+        el orden en que TERMINAN los bloques, no en el de `bloques`.
+        Lanza uno de ERRORES_POOL igual que `escenarios`.
+        """
+        executor = self._executor_de(modelo_id)
+        futuros = [
+            executor.submit(
+                _tarea_fva, (i, funcion_objetivo, restricciones, rxn_ids, fraccion_optimo)
+            )
+            for i, rxn_ids in enumerate(bloques)
+        ]
+        try:
+            for futuro in as_completed(futuros):
+                yield futuro.result()
+        finally:
+            # Cliente desconectado → no seguir resolviendo bloques
+            for futuro in futuros:
+                futuro.cancel()
+
+
+# ============================================================
+# Generadores de escenarios para barridos y knockouts
+# ============================================================
+def escenarios_barrido(funcion_objetivo: str, restricciones: list, reaccion: str,
+                       limite: str, valores: list) -> list:
+    """Un escenario por valor del bound de `reaccion` (p. ej. glucosa)."""
+    return [
+        {
+            "funcion_objetivo": funcion_objetivo,
+            "restricciones": restricciones + [
+                {"reaccion": reaccion, "limite": limite, "valor": float(v)}
+            ]
+        }
+        for v in valores
+    ]
+
+
+def escenarios_knockout(funcion_objetivo: str, restricciones: list,
+                        knockouts: list) -> list:
+    """Un escenario por elemento de `knockouts` (ID o lista de IDs)."""
+    return [
+        {
+            "funcion_objetivo": funcion_objetivo,
+            "restricciones": restricciones,
+            "knockouts": [ko] if isinstance(ko, str) else list(ko)
+        }
+        for ko in knockouts
+    ]
@@ -0,0 +1,518 @@
+# utils/reduccion.py
+import multiprocessing
+import os
+import pickle
+import queue
+import time
+import warnings
+from pathlib import Path
+
+import cobra
+import numpy as np
+import pandas as pd
+from optlang.symbolics import Zero
+from scipy import sparse
+
+from utils.restricciones import aplicar_restricciones
+from utils.trabajos import sin_progreso
+
+
+# Preprocesado de cada modelo subido ("0" = desactivado: siempre se
+# resuelve el modelo completo)
+REDUCCION_ACTIVA = os.environ.get("FBA_REDUCCION", "1") != "0"
+
+# |flujo| mínimo para que una solución cuente como testigo de que una
+# reacción NO está bloqueada. Con bounds de ±BOUND_CONO las reacciones
+# vivas llegan a flujos muy por encima; quedarse corto solo deja alguna
+# reacción bloqueada en el modelo reducido (seguro), no al revés
+UMBRAL_BLOQUEADA = 1e-9
+BOUND_CONO = 1000.0
+
+# Coeficiente que se considera cancelado al agrupar cadenas, y holgura
+# al intersectar bounds de reacciones agrupadas
+TOL_COEF = 1e-12
+TOL_BOUNDS = 1e-9
+
+
+# ============================================================
+# 1. Matriz estequiométrica y metabolitos sin salida
+# ============================================================
+def matriz_estequiometrica(modelo: cobra.Model) -> sparse.csc_matrix:
+    """S (metabolitos × reacciones) en el orden del modelo."""
+    indice_met = {met.id: i for i, met in enumerate(modelo.metabolites)}
+    filas, columnas, valores = [], [], []
+    for j, rxn in enumerate(modelo.reactions):
+        for met, coef in rxn.metabolites.items():
+            filas.append(indice_met[met.id])
+            columnas.append(j)
+            valores.append(coef)
+    return sparse.csc_matrix(
+        (valores, (filas, columnas)),
+        shape=(len(modelo.metabolites), len(modelo.reactions)), dtype=np.float64
+    )
+
+
+def detectar_sin_salida(S: sparse.csc_matrix, neg: np.ndarray, pos: np.ndarray) -> np.ndarray:
+    """
+    Poda estructural (sin LPs): un metabolito que ninguna reacción viva
+    puede producir, o ninguna puede consumir (según el sentido que
+    permiten sus bounds), obliga a flujo 0 en todas sus reacciones; se
+    repite hasta que no cae ninguna más. Devuelve la máscara de vivas.
+    """
+    S_pos = (S > 0).astype(np.float64)
+    S_neg = (S < 0).astype(np.float64)
+    incidencia = (S != 0).astype(np.float64)
+    vivas = np.ones(S.shape[1], dtype=bool)
+
+    while True:
+        adelante = (vivas & pos).astype(np.float64)
+        atras = (vivas & neg).astype(np.float64)
+        produce = (S_pos @ adelante + S_neg @ atras) > 0
+        consume = (S_neg @ adelante + S_pos @ atras) > 0
+        sin_salida = ~(produce & consume)
+
+        caen = vivas & ((incidencia.T @ sin_salida.astype(np.float64)) > 0)
+        if not caen.any():
+            return vivas
+        vivas &= ~caen
+
+
+# ============================================================
+# 2. Reacciones bloqueadas (LPs sobre el cono de signos)
+# ============================================================
+def detectar_bloqueadas(modelo: cobra.Model, vivas: np.ndarray, neg: np.ndarray,
+                        pos: np.ndarray, progreso=sin_progreso) -> tuple[np.ndarray, int]:
+    """
+    Reacciones que no pueden llevar flujo en estado estacionario con
+    ningún valor de bounds del mismo signo que `neg` / `pos`: cada
+    reacción se abre a ±BOUND_CONO en los sentidos que permite. Así la
+    reducción sigue valiendo para cualquier restricción que no abra un
+    sentido nuevo.
+
+    1. LPs de "actividad": maximizar la suma de flujos de las reacciones
+       aún sin testigo, hacia adelante y hacia atrás, hasta que no
+       aparecen testigos nuevos.
+    2. Para las que quedan, máximo (y mínimo) de su flujo; cada solución
+       con flujo sirve de testigo para todas las reacciones que lo llevan.
+
+    `modelo` debe ser una copia privada: sus bounds y objetivo quedan
+    modificados. Devuelve (máscara de vivas, número de LPs).
+    """
+    for rxn, n, p, viva in zip(modelo.reactions, neg, pos, vivas):
+        if viva:
+            rxn.bounds = (-BOUND_CONO if n else 0.0, BOUND_CONO if p else 0.0)
+        else:
+            rxn.bounds = (0.0, 0.0)
+
+    try:
+        modelo.solver.configuration.presolve = False
+    except Exception:
+        pass
+    modelo.objective = modelo.problem.Objective(Zero, direction="max", sloppy=True)
+    objetivo = modelo.solver.objective
+    adelante = [rxn.forward_variable for rxn in modelo.reactions]
+    atras = [rxn.reverse_variable for rxn in modelo.reactions]
+    nombres = [(f.name, r.name) for f, r in zip(adelante, atras)]
+
+    pendientes = vivas.copy()
+    n_lps = 0
+
+    def resolver(indices, signo) -> float:
+        nonlocal n_lps
+        coeficientes = {}
+        for i in indices:
+            coeficientes[adelante[i]] = signo
+            coeficientes[atras[i]] = -signo
+        objetivo.set_linear_coefficients(coeficientes)
+        modelo.solver.optimize()
+        n_lps += 1
+        objetivo.set_linear_coefficients(dict.fromkeys(coeficientes, 0))
+
+        if modelo.solver.status != "optimal":
+            return 0.0
+        valores = modelo.solver.primal_values
+        flujos = np.array([valores[f] - valores[r] for f, r in nombres])
+        pendientes[np.abs(flujos) > UMBRAL_BLOQUEADA] = False
+        return signo * float(flujos[indices[0]]) if len(indices) == 1 else 0.0
+
+    # ------------------ 1. LPs de actividad ----------------
+    while True:
+        antes = int(pendientes.sum())
+        for signo, puede in ((1.0, pos), (-1.0, neg)):
+            indices = np.flatnonzero(pendientes & puede).tolist()
+            if indices:
+                resolver(indices, signo)
+        progreso(0.1, f"LPs de actividad ({int(pendientes.sum())} sin testigo)")
+        if int(pendientes.sum()) == antes:
+            break
+
+    # ------------------ 2. Una reacción a la vez -----------
+    candidatas = np.flatnonzero(pendientes).tolist()
+    bloqueadas = np.zeros(len(vivas), dtype=bool)
+    for k, i in enumerate(candidatas):
+        if not pendientes[i]:
+            continue  # otra solución ya la vio con flujo
+        for signo, puede in ((1.0, pos), (-1.0, neg)):
+            if puede[i] and resolver([i], signo) > UMBRAL_BLOQUEADA:
+                break
+        if pendientes[i]:
+            pendientes[i] = False
+            bloqueadas[i] = True
+        if k % 50 == 0:
+            progreso(0.1 + 0.7 * k / len(candidatas), "buscando reacciones bloqueadas")
+
+    return vivas & ~bloqueadas, n_lps
+
+
+# ============================================================
+# 3. Cadenas lineales (agrupar reacciones acopladas)
+# ============================================================
+def agrupar_cadenas(S: sparse.csc_matrix, vivas: np.ndarray) -> tuple:
+    """
+    Un metabolito con exactamente dos reacciones vivas a y b fija
+    v_b = k·v_a (k = -S[m,a] / S[m,b]): b se absorbe en a y el
+    metabolito desaparece. Se repite hasta que no queda ninguno, así
+    una cadena entera termina en una sola reacción.
+
+    Devuelve (representante, factor, columnas): para cada reacción del
+    modelo, la reacción que la representa (-1 si está bloqueada) y el
+    factor tal que v = factor · v_representante; y la columna
+    estequiométrica {metabolito: coef} de cada representante.
+    """
+    columnas = {}
+    por_metabolito = {}
+    for j in np.flatnonzero(vivas).tolist():
+        inicio, fin = S.indptr[j], S.indptr[j + 1]
+        columnas[j] = dict(zip(S.indices[inicio:fin].tolist(), S.data[inicio:fin].tolist()))
+        for m in columnas[j]:
+            por_metabolito.setdefault(m, set()).add(j)
+
+    representante = np.where(vivas, np.arange(len(vivas)), -1)
+    factor = vivas.astype(np.float64)
+    miembros = {j: [j] for j in columnas}
+
+    cola = [m for m, reacciones in por_metabolito.items() if len(reacciones) == 2]
+    while cola:
+        m = cola.pop()
+        if len(por_metabolito[m]) != 2:
+            continue
+        a, b = sorted(por_metabolito[m])
+        k = -columnas[a][m] / columnas[b][m]
+
+        for met, coef in columnas.pop(b).items():
+            por_metabolito[met].discard(b)
+            nuevo = columnas[a].get(met, 0.0) + k * coef
+            if abs(nuevo) <= TOL_COEF:
+                columnas[a].pop(met, None)
+                por_metabolito[met].discard(a)
+            else:
+                columnas[a][met] = nuevo
+                por_metabolito[met].add(a)
+            if len(por_metabolito[met]) == 2:
+                cola.append(met)
+
+        for j in miembros.pop(b):
+            factor[j] *= k
+            representante[j] = a
+            miembros[a].append(j)
+
+    return representante, factor, columnas
+
+
+def intervalo_en_representante(lb: float, ub: float, factor: float) -> tuple:
+    """Bounds de v_rep que impone lb <= factor · v_rep <= ub."""
+    if factor > 0:
+        return lb / factor, ub / factor
+    return ub / factor, lb / factor
+
+
+# ============================================================
+# 4. Modelo reducido + mapeo para expandir flujos
+# ============================================================
+class ModeloReducido:
+    """
+    Modelo sin reacciones bloqueadas y con cadenas lineales agrupadas,
+    con lo necesario para volver al tamaño completo:
+    v_completo[i] = factor[i] · v_reducido[representante[i]]
+    (representante = -1 → reacción bloqueada, flujo 0).
+
+    `puede_neg` / `puede_pos` son los sentidos con los que se buscaron
+    las bloqueadas (los de los bounds originales, y ambos en las
+    reacciones de borde): una restricción que abra otro invalida la
+    reducción.
+
+    Se guarda en el caché junto al pickle del modelo.
+    """
+
+    def __init__(self, modelo: cobra.Model, rxn_ids: list, representante: np.ndarray,
+                 factor: np.ndarray, lb: np.ndarray, ub: np.ndarray, puede_neg: np.ndarray,
+                 puede_pos: np.ndarray, resumen: dict, metabolitos_sin_salida: list):
+        self.modelo = modelo
+        self.rxn_ids = rxn_ids
+        self.posicion = {rxn_id: i for i, rxn_id in enumerate(rxn_ids)}
+        self.representante = representante
+        self.factor = factor
+        self.lb = lb
+        self.ub = ub
+        self.puede_neg = puede_neg
+        self.puede_pos = puede_pos
+        self.resumen = resumen
+        self.metabolitos_sin_salida = metabolitos_sin_salida
+
+        self.miembros = [[] for _ in range(len(modelo.reactions))]
+        for i, r in enumerate(representante.tolist()):
+            if r >= 0:
+                self.miembros[r].append(i)
+
+        # Bloqueadas con bounds que excluyen el 0: el modelo completo es
+        # infactible salvo que una restricción las relaje
+        self.forzadas = np.flatnonzero((representante < 0) & ((lb > 0) | (ub < 0))).tolist()
+
+    @property
+    def bloqueadas(self) -> list:
+        return [self.rxn_ids[i] for i in np.flatnonzero(self.representante < 0).tolist()]
+
+    def expandir(self, flujos_reducidos: np.ndarray) -> np.ndarray:
+        vivas = self.representante >= 0
+        flujos = np.zeros(len(self.rxn_ids), dtype=np.float64)
+        flujos[vivas] = self.factor[vivas] * np.asarray(flujos_reducidos)[self.representante[vivas]]
+        return flujos
+
+    def bounds_con_restricciones(self, nuevos: dict):
+        """
+        `nuevos`: {posición en el modelo completo: (lb, ub)} de las
+        reacciones restringidas. Devuelve {posición en el reducido:
+        (lb, ub)} o None si la reducción no vale para estas restricciones
+        (abren un sentido que no tenían, fuerzan flujo en una reacción
+        bloqueada o dejan un grupo sin intervalo factible): entonces hay
+        que resolver el modelo completo.
+        """
+        por_representante = {}
+        for i, (lo, hi) in nuevos.items():
+            if (lo < 0 and not self.puede_neg[i]) or (hi > 0 and not self.puede_pos[i]):
+                return None
+            r = int(self.representante[i])
+            if r < 0:
+                if lo > 0 or hi < 0:
+                    return None
+                continue
+            por_representante.setdefault(r, {})[i] = (lo, hi)
+
+        for i in self.forzadas:
+            lo, hi = nuevos.get(i, (self.lb[i], self.ub[i]))
+            if lo > 0 or hi < 0:
+                return None
+
+        resultado = {}
+        for r, cambios in por_representante.items():
+            lo, hi = -np.inf, np.inf
+            for j in self.miembros[r]:
+                a, b = intervalo_en_representante(
+                    *cambios.get(j, (self.lb[j], self.ub[j])), self.factor[j]
+                )
+                lo, hi = max(lo, a), min(hi, b)
+            if lo > hi + TOL_BOUNDS:
+                return None
+            resultado[r] = (lo, max(lo, hi))
+        return resultado
+
+
+def reducir_modelo(modelo: cobra.Model, progreso=sin_progreso) -> ModeloReducido:
+    """
+    Preprocesado completo. `modelo` debe ser una copia privada (p. ej.
+    recién leída del caché): queda modificado.
+    """
+    t0 = time.perf_counter()
+    rxn_ids = [rxn.id for rxn in modelo.reactions]
+    lb = np.array([rxn.lower_bound for rxn in modelo.reactions], dtype=np.float64)
+    ub = np.array([rxn.upper_bound for rxn in modelo.reactions], dtype=np.float64)
+    # Las reacciones de borde (intercambio, demanda, sink) se abren en
+    # ambos sentidos: abrir o cerrar captaciones es la restricción más
+    # común y no debe obligar a resolver el modelo completo
+    borde = np.array([rxn.boundary for rxn in modelo.reactions], dtype=bool)
+    neg, pos = (lb < 0) | borde, (ub > 0) | borde
+
+    progreso(0.02, "buscando metabolitos sin salida")
+    S = matriz_estequiometrica(modelo)
+    vivas_estructura = detectar_sin_salida(S, neg, pos)
+
+    progreso(0.05, "buscando reacciones bloqueadas")
+    vivas, n_lps = detectar_bloqueadas(modelo, vivas_estructura, neg, pos, progreso)
+
+    # Metabolitos que solo aparecen en reacciones bloqueadas
+    incidencia = (S != 0).astype(np.float64)
+    en_vivas = (incidencia @ vivas.astype(np.float64)) > 0
+    metabolitos_sin_salida = [
+        modelo.metabolites[m].id for m in np.flatnonzero(~en_vivas & (incidencia.getnnz(axis=1) > 0)).tolist()
+    ]
+
+    progreso(0.85, "agrupando cadenas lineales")
+    representante, factor, columnas = agrupar_cadenas(S, vivas)
+
+    # ------------------ Modelo reducido --------------------
+    progreso(0.9, "construyendo modelo reducido")
+    grupos = sorted(columnas)
+    posicion_grupo = {j: k for k, j in enumerate(grupos)}
+    representante = np.array(
+        [posicion_grupo[r] if r >= 0 else -1 for r in representante.tolist()], dtype=np.int64
+    )
+
+    lo = np.full(len(grupos), -np.inf)
+    hi = np.full(len(grupos), np.inf)
+    for i in np.flatnonzero(representante >= 0).tolist():
+        a, b = intervalo_en_representante(lb[i], ub[i], factor[i])
+        r = representante[i]
+        lo[r], hi[r] = max(lo[r], a), min(hi[r], b)
+    if np.any(lo > hi + TOL_BOUNDS):
+        raise ValueError("Los bounds del modelo son infactibles en una cadena lineal.")
+    hi = np.maximum(lo, hi)
+
+    reducido = cobra.Model(f"{modelo.id}_reducido")
+    metabolitos = {}
+    reacciones = []
+    for k, j in enumerate(grupos):
+        rxn = cobra.Reaction(rxn_ids[j], lower_bound=lo[k], upper_bound=hi[k])
+        coeficientes = {}
+        for m, coef in columnas[j].items():
+            if m not in metabolitos:
+                original = modelo.metabolites[m]
+                metabolitos[m] = cobra.Metabolite(original.id, compartment=original.compartment)
+            coeficientes[metabolitos[m]] = coef
+        rxn.add_metabolites(coeficientes)
+        reacciones.append(rxn)
+    reducido.add_reactions(reacciones)
+
+    resumen = {
+        "reacciones": len(rxn_ids),
+        "metabolitos": len(modelo.metabolites),
+        "bloqueadas": int((~vivas).sum()),
+        "bloqueadas_estructurales": int((~vivas_estructura).sum()),
+        "metabolitos_sin_salida": len(metabolitos_sin_salida),
+        "reacciones_agrupadas": int(vivas.sum()) - len(grupos),
+        "cadenas": sum(1 for r in np.bincount(representante[representante >= 0]) if r > 1),
+        "reacciones_reducido": len(reducido.reactions),
+        "metabolitos_reducido": len(reducido.metabolites),
+        "lps": n_lps,
+        "segundos": round(time.perf_counter() - t0, 3)
+    }
+    return ModeloReducido(reducido, rxn_ids, representante, factor, lb, ub, neg, pos,
+                          resumen, metabolitos_sin_salida)
+
+
+# ============================================================
+# 4b. Preprocesado en un proceso aparte
+# ============================================================
+def _reducir_en_hijo(ruta_pickle: str, ruta_salida: str, cola) -> None:
+    """Proceso hijo: lee su copia del modelo, la reduce y escribe el pickle."""
+    warnings.filterwarnings("ignore", category=UserWarning)
+    try:
+        with open(ruta_pickle, "rb") as f:
+            modelo = pickle.load(f)
+        reducido = reducir_modelo(
+            modelo, lambda fraccion, etapa: cola.put(("progreso", fraccion, etapa))
+        )
+        ruta_tmp = Path(ruta_salida).with_suffix(".tmp")
+        with open(ruta_tmp, "wb") as f:
+            pickle.dump(reducido, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(ruta_tmp, ruta_salida)  # escritura atómica
+        cola.put(("fin",))
+    except Exception as e:
+        cola.put(("error", str(e)))
+
+
+def reducir_en_proceso(ruta_pickle: str, ruta_salida: str, progreso=sin_progreso) -> None:
+    """
+    `reducir_modelo` sobre el pickle `ruta_pickle` en un proceso spawn,
+    que deja el resultado en `ruta_salida`. swiglpk no suelta el GIL
+    mientras resuelve, así que en un hilo del servidor los miles de LPs
+    de un modelo grande congelaban todos los requests.
+
+    El progreso del hijo llega por una cola y se pasa a `progreso`
+    (también cada medio segundo sin novedades); si este lanza (trabajo
+    cancelado) se termina el proceso.
+    """
+    contexto = multiprocessing.get_context("spawn")
+    cola = contexto.Queue()
+    proceso = contexto.Process(
+        target=_reducir_en_hijo, args=(str(ruta_pickle), str(ruta_salida), cola), daemon=True
+    )
+    proceso.start()
+    ultimo = (0.0, "iniciando proceso de preprocesado")
+    try:
+        while True:
+            try:
+                mensaje = cola.get(timeout=0.5)
+            except queue.Empty:
+                if not proceso.is_alive():
+                    raise RuntimeError(
+                        f"El proceso de preprocesado terminó sin resultado (código {proceso.exitcode})."
+                    )
+                progreso(*ultimo)
+                continue
+            if mensaje[0] == "progreso":
+                ultimo = mensaje[1:]
+                progreso(*ultimo)
+            elif mensaje[0] == "error":
+                raise ValueError(mensaje[1])
+            else:
+                return
+    finally:
+        if proceso.is_alive():
+            proceso.terminate()
+        proceso.join()
+
+
+# ============================================================
+# 5. Ejecutar UN escenario sobre el modelo reducido
+# ============================================================
+def ejecutar_escenario_reducido(modelo: cobra.Model, reducido: ModeloReducido, sesion,
+                                funcion_objetivo: str, restricciones: list):
+    """
+    Mismo resultado que `ejecutar_escenario`, resolviendo el LP reducido
+    y expandiendo los flujos al tamaño completo. Las restricciones se
+    aplican primero al modelo completo dentro de `with modelo:` (mismos
+    avisos y ajustes) solo para leer los bounds resultantes.
+
+    Devuelve None si el objetivo o las restricciones no se pueden
+    expresar en el modelo reducido (hay que usar el completo).
+    Lanza ValueError si la función objetivo no existe en el modelo.
+    """
+    if funcion_objetivo not in reducido.posicion:
+        raise ValueError(f"La reacción '{funcion_objetivo}' no existe.")
+
+    with modelo:
+        restricciones_aplicadas, warnings_list = aplicar_restricciones(modelo, restricciones)
+        nuevos = {
+            reducido.posicion[r["reaccion"]]: modelo.reactions.get_by_id(r["reaccion"]).bounds
+            for r in restricciones_aplicadas
+        }
+    direccion = modelo.objective_direction
+
+    i = reducido.posicion[funcion_objetivo]
+    r = int(reducido.representante[i])
+    bounds = reducido.bounds_con_restricciones(nuevos)
+    if r < 0 or bounds is None:
+        return None
+
+    red = reducido.modelo
+    with red:
+        red.objective = {red.reactions[r]: float(reducido.factor[i])}
+        red.objective_direction = direccion
+        for k, limites in bounds.items():
+            red.reactions[k].bounds = limites
+        solution_reducida, estadisticas_solver = sesion.optimizar()
+
+    solution = cobra.Solution(
+        solution_reducida.objective_value,
+        solution_reducida.status,
+        fluxes=pd.Series(reducido.expandir(solution_reducida.fluxes.values),
+                         index=reducido.rxn_ids, name="fluxes")
+    )
+    estadisticas_solver["reducido"] = True
+
+    return {
+        "solution": solution,
+        "restricciones": restricciones_aplicadas,
+        "warnings": warnings_list,
+        "solver": estadisticas_solver
+    }
@@ -0,0 +1,289 @@
+# utils/registro_modelos.py
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from utils.cache_modelos import CacheModelos, hash_contenido
+from utils.escenarios import ejecutar_escenario
+from utils.reduccion import ejecutar_escenario_reducido
+from utils.sesion_solver import SesionSolver
+from utils.topologia import IndiceTopologia
+
+
+MAX_MODELOS = int(os.environ.get("FBA_MODELS_MAX", "8"))
+MAX_MODELOS_BYTES = int(os.environ.get("FBA_MODELS_MAX_MB", "2048")) * 1024 * 1024
+
+# Un modelo COBRA en RAM ocupa ~7-11x su pickle (medido con e_coli_core
+# y Recon3D); sirve para estimar la memoria sin recorrer el objeto
+FACTOR_MEMORIA = 8
+
+
+# ============================================================
+# 1. Lock lectores/escritor
+# ============================================================
+class LockLectorEscritor:
+    """
+    Varios lectores a la vez o un solo escritor. Un escritor en espera
+    bloquea a los lectores nuevos para no quedarse esperando siempre.
+
+    En un modelo COBRA, "escribir" es todo lo que lo modifica aunque sea
+    temporalmente (un FBA dentro de `with modelo:` cambia objetivo y
+    bounds); "leer" es recorrer reacciones, metabolitos o subsistemas.
+    """
+
+    def __init__(self):
+        self._condicion = threading.Condition()
+        self._lectores = 0
+        self._escribiendo = False
+        self._escritores_en_espera = 0
+
+    @contextmanager
+    def lectura(self):
+        with self._condicion:
+            while self._escribiendo or self._escritores_en_espera:
+                self._condicion.wait()
+            self._lectores += 1
+        try:
+            yield
+        finally:
+            with self._condicion:
+                self._lectores -= 1
+                if self._lectores == 0:
+                    self._condicion.notify_all()
+
+    @contextmanager
+    def escritura(self):
+        with self._condicion:
+            self._escritores_en_espera += 1
+            while self._escribiendo or self._lectores:
+                self._condicion.wait()
+            self._escritores_en_espera -= 1
+            self._escribiendo = True
+        try:
+            yield
+        finally:
+            with self._condicion:
+                self._escribiendo = False
+                self._condicion.notify_all()
+
+
+# ============================================================
+# 2. Un modelo registrado y lo que cuelga de él
+# ============================================================
+class ModeloRegistrado:
+    """
+    Modelo en RAM con su lock, su sesión de solver y su índice de
+    topología (estos dos se crean la primera vez que se piden).
+    `_lock_perezoso` nunca se mantiene mientras se espera `lock`.
+
+    `reducido` (utils/reduccion.py) queda en None hasta que termina el
+    preprocesado; mientras tanto se resuelve el modelo completo.
+    """
+
+    def __init__(self, modelo_id: str, modelo, tamano_bytes: int):
+        self.modelo_id = modelo_id
+        self.modelo = modelo
+        self.tamano_bytes = tamano_bytes
+        self.lock = LockLectorEscritor()
+        self.reducido = None
+        self.trabajo_reduccion = None
+        self._sesion = None
+        self._sesion_reducida = None
+        self._topologia = None
+        self._lock_perezoso = threading.Lock()
+
+    def sesion(self) -> SesionSolver:
+        with self._lock_perezoso:
+            if self._sesion is None:
+                self._sesion = SesionSolver(self.modelo)
+            return self._sesion
+
+    def sesion_reducida(self) -> SesionSolver:
+        with self._lock_perezoso:
+            if self._sesion_reducida is None:
+                self._sesion_reducida = SesionSolver(self.reducido.modelo)
+            return self._sesion_reducida
+
+    def preparar_reduccion(self, enviar) -> None:
+        """
+        Lanza el preprocesado una sola vez por modelo en RAM: `enviar()`
+        encola el trabajo que lo ejecuta y lo devuelve.
+        """
+        with self._lock_perezoso:
+            if self.reducido is None and self.trabajo_reduccion is None:
+                self.trabajo_reduccion = enviar()
+
+    def resolver(self, funcion_objetivo: str, restricciones: list) -> dict:
+        """
+        `ejecutar_escenario` sobre el modelo reducido si ya está listo y
+        admite el objetivo y las restricciones; si no, sobre el completo.
+        Llamar con el lock de escritura tomado.
+        """
+        if self.reducido is not None:
+            resultado = ejecutar_escenario_reducido(
+                self.modelo, self.reducido, self.sesion_reducida(),
+                funcion_objetivo, restricciones
+            )
+            if resultado is not None:
+                return resultado
+        return ejecutar_escenario(self.modelo, self.sesion(), funcion_objetivo, restricciones)
+
+    def topologia(self) -> IndiceTopologia:
+        with self._lock_perezoso:
+            if self._topologia is not None:
+                return self._topologia
+
+        # Se construye sin `_lock_perezoso`: `resolver()` lo toma (vía
+        # sesion()) con el lock de escritura ya tomado, y esperar aquí el
+        # de lectura con él tomado sería el orden inverso (deadlock).
+        # Dos hilos pueden construirlo a la vez; se publica el primero
+        with self.lock.lectura():
+            topologia = IndiceTopologia(self.modelo)
+        with self._lock_perezoso:
+            if self._topologia is None:
+                self._topologia = topologia
+            return self._topologia
+
+
+# ============================================================
+# 3. Registro de modelos (LRU por cantidad y memoria estimada)
+# ============================================================
+class RegistroModelos:
+    """
+    Varios modelos cargados a la vez, cada uno bajo su modelo_id (el
+    hash del archivo). Un modelo expulsado de RAM se vuelve a leer del
+    caché de pickles la próxima vez que se pida (no se re-parsea).
+
+    `modelo_por_defecto` es el último subido: lo usan las peticiones
+    que no indican modelo_id.
+    """
+
+    def __init__(self, cache: CacheModelos, max_modelos: int = MAX_MODELOS,
+                 max_bytes: int = MAX_MODELOS_BYTES):
+        self.cache = cache
+        self.max_modelos = max_modelos
+        self.max_bytes = max_bytes
+        self.modelo_por_defecto = None
+
+        self._modelos = OrderedDict()   # modelo_id -> ModeloRegistrado
+        self._bytes = 0
+        self._evicciones = 0
+        self._recargas = 0
+        self._lock = threading.Lock()
+        self._cargando = {}             # modelo_id -> [Lock, usuarios] (una carga a la vez)
+
+    # --------------------------------------------------------
+    # Subir / obtener
+    # --------------------------------------------------------
+    def registrar(self, datos: bytes, ext: str) -> tuple:
+        """
+        Devuelve (ModeloRegistrado, desde_cache). El archivo original va
+        a un temporal propio de esta subida, así dos subidas simultáneas
+        no se pisan.
+        """
+        clave = hash_contenido(datos)
+        registrado = self.obtener(clave)
+        if registrado is not None:
+            self.modelo_por_defecto = clave
+            return registrado, True
+
+        with self._lock_carga(clave):
+            registrado = self._en_memoria(clave)
+            desde_cache = registrado is not None
+            if registrado is None:
+                fd, ruta = tempfile.mkstemp(suffix=f".{ext}")
+                os.close(fd)
+                try:
+                    modelo, clave, desde_cache = self.cache.cargar(datos, ext, ruta)
+                finally:
+                    os.remove(ruta)
+                registrado = self._agregar(clave, modelo)
+
+        self.modelo_por_defecto = clave
+        return registrado, desde_cache
+
+    def obtener(self, modelo_id: str):
+        """ModeloRegistrado o None si no está en RAM ni en el caché."""
+        registrado = self._en_memoria(modelo_id)
+        if registrado is not None or not modelo_id:
+            return registrado
+
+        with self._lock_carga(modelo_id):
+            registrado = self._en_memoria(modelo_id)
+            if registrado is None:
+                modelo = self.cache.obtener(modelo_id)
+                if modelo is None:
+                    return None
+                registrado = self._agregar(modelo_id, modelo)
+                with self._lock:
+                    self._recargas += 1
+            return registrado
+
+    def __contains__(self, modelo_id: str) -> bool:
+        with self._lock:
+            return modelo_id in self._modelos
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "modelos": list(self._modelos),
+                "modelo_por_defecto": self.modelo_por_defecto,
+                "mb_estimados": round(self._bytes / (1024 * 1024), 2),
+                "max_modelos": self.max_modelos,
+                "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+                "evicciones": self._evicciones,
+                "recargas_desde_cache": self._recargas
+            }
+
+    # --------------------------------------------------------
+    # Internos
+    # --------------------------------------------------------
+    def _en_memoria(self, modelo_id: str):
+        with self._lock:
+            registrado = self._modelos.get(modelo_id)
+            if registrado is not None:
+                self._modelos.move_to_end(modelo_id)
+            return registrado
+
+    @contextmanager
+    def _lock_carga(self, modelo_id: str):
+        """
+        Una carga a la vez por modelo_id. La entrada de `_cargando` se
+        borra cuando no queda nadie usándola, así no crece con cada
+        modelo que pasó por el registro.
+        """
+        with self._lock:
+            entrada = self._cargando.setdefault(modelo_id, [threading.Lock(), 0])
+            entrada[1] += 1
+        try:
+            with entrada[0]:
+                yield
+        finally:
+            with self._lock:
+                entrada[1] -= 1
+                if entrada[1] == 0:
+                    del self._cargando[modelo_id]
+
+    def _agregar(self, modelo_id: str, modelo) -> ModeloRegistrado:
+        try:
+            tamano = self.cache.ruta(modelo_id).stat().st_size * FACTOR_MEMORIA
+        except OSError:
+            tamano = 0
+        registrado = ModeloRegistrado(modelo_id, modelo, tamano)
+        self.cache.fijar(modelo_id)
+
+        with self._lock:
+            self._modelos[modelo_id] = registrado
+            self._bytes += tamano
+            # Siempre queda al menos el recién agregado; los que sigan en
+            # uso por otra petición viven hasta que esta suelte la referencia
+            while len(self._modelos) > 1 and (
+                len(self._modelos) > self.max_modelos or self._bytes > self.max_bytes
+            ):
+                _, viejo = self._modelos.popitem(last=False)
+                self._bytes -= viejo.tamano_bytes
+                self.cache.soltar(viejo.modelo_id)
+                self._evicciones += 1
+        return registrado
@@ -0,0 +1,77 @@
+# utils/restricciones.py
+import cobra
+
+
+# ============================================================
+# Aplicar restricciones (lower / upper) sobre el modelo
+# ============================================================
+def aplicar_restricciones(modelo: cobra.Model, restricciones: list) -> tuple[list, list]:
+    """
+    Aplica las restricciones recibidas del frontend y devuelve
+    (restricciones_aplicadas, warnings).
+
+    Debe llamarse DENTRO de un bloque `with modelo:`. COBRApy anota en
+    su historial cada bound modificado y al salir del bloque revierte
+    solo esos cambios, así el modelo compartido queda intacto para la
+    siguiente petición sin copiarlo (coste O(reacciones modificadas)).
+
+    Primero se aplican todos los lower y después los upper, para que
+    el ajuste automático de upper vea el lower ya definitivo.
+    """
+    restricciones_aplicadas = []
+    warnings_list = []
+
+    # ------------------ LOWER BOUNDS -----------------------
+    for r in restricciones:
+        if r["limite"] != "lower":
+            continue
+
+        rxn_id = r["reaccion"]
+        valor = float(r["valor"])
+
+        if rxn_id not in modelo.reactions:
+            warnings_list.append(f"⚠ La reacción {rxn_id} no existe.")
+            continue
+
+        rxn = modelo.reactions.get_by_id(rxn_id)
+        rxn.lower_bound = valor
+
+        restricciones_aplicadas.append({
+            "reaccion": rxn_id,
+            "limite": "lower",
+            "valor": valor,
+            "nuevo_lower": rxn.lower_bound,
+            "nuevo_upper": rxn.upper_bound
+        })
+
+    # ------------------ UPPER BOUNDS -----------------------
+    for r in restricciones:
+        if r["limite"] != "upper":
+            continue
+
+        rxn_id = r["reaccion"]
+        valor = float(r["valor"])
+
+        if rxn_id not in modelo.reactions:
+            warnings_list.append(f"⚠ La reacción {rxn_id} no existe.")
+            continue
+
+        rxn = modelo.reactions.get_by_id(rxn_id)
+
+        if valor < rxn.lower_bound:
+            warnings_list.append(
+                f"⚠ Ajuste automático: upper {valor} → {rxn.lower_bound} porque lower es mayor."
+            )
+            valor = rxn.lower_bound
+
+        rxn.upper_bound = valor
+
+        restricciones_aplicadas.append({
+            "reaccion": rxn_id,
+            "limite": "upper",
+            "valor": valor,
+            "nuevo_lower": rxn.lower_bound,
+            "nuevo_upper": rxn.upper_bound
+        })
+
+    return restricciones_aplicadas, warnings_list
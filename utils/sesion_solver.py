@@ -0,0 +1,107 @@
+# utils/sesion_solver.py
+import time
+
+import cobra
+from cobra.core.solution import get_solution
+
+try:
+    import swiglpk
+except ImportError:  # otro solver (cplex, gurobi...) sin GLPK instalado
+    swiglpk = None
+
+
+# ============================================================
+# Sesión de solver por modelo cargado
+# ============================================================
+class SesionSolver:
+    """
+    Reutiliza el mismo LP de optlang entre simulaciones consecutivas.
+
+    - El presolve se desactiva: con presolve el solver descarta la base
+      y empieza de cero en cada llamada.
+    - Con GLPK se guarda la última base óptima (estado de filas y
+      columnas). Si una simulación termina infactible la base queda
+      inservible, así que antes de la siguiente se restaura la guardada.
+    - Cada resolución devuelve iteraciones de simplex y tiempo de solver.
+    """
+
+    def __init__(self, modelo: cobra.Model):
+        self.modelo = modelo
+        self.resoluciones = 0
+        self._ultimo_estado = None
+        self._base_optima = None
+
+        try:
+            modelo.solver.configuration.presolve = False
+        except Exception:
+            pass
+
+    # --------------------------------------------------------
+    # Utilidades GLPK
+    # --------------------------------------------------------
+    def _problema_glpk(self):
+        if swiglpk is None:
+            return None
+        if "glpk" not in type(self.modelo.solver).__module__:
+            return None
+        return self.modelo.solver.problem
+
+    def _guardar_base(self, problema) -> None:
+        filas = swiglpk.glp_get_num_rows(problema)
+        columnas = swiglpk.glp_get_num_cols(problema)
+        self._base_optima = (
+            [swiglpk.glp_get_row_stat(problema, i) for i in range(1, filas + 1)],
+            [swiglpk.glp_get_col_stat(problema, j) for j in range(1, columnas + 1)],
+        )
+
+    def _restaurar_base(self, problema) -> bool:
+        if self._base_optima is None:
+            return False
+        estados_filas, estados_columnas = self._base_optima
+        if (len(estados_filas) != swiglpk.glp_get_num_rows(problema)
+                or len(estados_columnas) != swiglpk.glp_get_num_cols(problema)):
+            return False  # el LP cambió de forma → la base ya no aplica
+
+        for i, estado in enumerate(estados_filas, start=1):
+            swiglpk.glp_set_row_stat(problema, i, estado)
+        for j, estado in enumerate(estados_columnas, start=1):
+            swiglpk.glp_set_col_stat(problema, j, estado)
+        return True
+
+    # --------------------------------------------------------
+    # Resolver
+    # --------------------------------------------------------
+    def optimizar(self) -> tuple:
+        """
+        Equivalente a `modelo.optimize()`, pero devuelve también
+        (solution, estadisticas) con iteraciones y tiempo de solver.
+        """
+        problema = self._problema_glpk()
+        warm_start = self.resoluciones > 0
+
+        if problema is not None and self._ultimo_estado not in (None, "optimal"):
+            warm_start = self._restaurar_base(problema)
+
+        iter_antes = swiglpk.glp_get_it_cnt(problema) if problema is not None else None
+
+        t0 = time.perf_counter()
+        self.modelo.solver.optimize()
+        tiempo_solver = time.perf_counter() - t0
+
+        solution = get_solution(self.modelo, raise_error=False)
+        self.resoluciones += 1
+        self._ultimo_estado = solution.status
+
+        iteraciones = None
+        if problema is not None:
+            iteraciones = swiglpk.glp_get_it_cnt(problema) - iter_antes
+            if solution.status == "optimal":
+                self._guardar_base(problema)
+
+        estadisticas = {
+            "iteraciones": iteraciones,
+            "tiempo_solver_ms": round(tiempo_solver * 1e3, 3),
+            "warm_start": warm_start,
+            "resoluciones": self.resoluciones
+        }
+        return solution, estadisticas
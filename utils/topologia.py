@@ -0,0 +1,385 @@
+# utils/topologia.py
+import cobra
+import numpy as np
+
+from utils.metabolitos import TablaMetabolitos
+
+
+UMBRAL_GIGANTE = 3000       # nº de reacciones a partir del cual se simplifica
+UMBRAL_FLUJO_ACTIVO = 1e-9
+
+
+# ============================================================
+# Índice de topología por modelo (reacción → metabolitos en CSR)
+# ============================================================
+class IndiceTopologia:
+    """
+    Todo lo que el grafo 3D necesita del modelo y que NO depende del
+    run: se construye una vez por modelo cargado.
+
+    - rxn_ids / rxn_nombres / rxn_subsistema: por reacción, en el orden
+      del modelo
+    - codigo_subsistema: índice en `lista_subsistemas` (-1 = sin subsistema)
+    - CSR reacción → metabolitos: las aristas de la reacción i están en
+      [indptr[i], indptr[i+1]) de `arista_met` (índice de metabolito) y
+      `arista_coef` (coeficiente estequiométrico); y su traspuesto
+      metabolito → aristas (`met_indptr`, `met_arista`)
+    - metabolitos: TablaMetabolitos (ID → ID base sin compartimento),
+      compartida con el grafo ALT y la matriz de subsistemas
+    """
+
+    def __init__(self, modelo: cobra.Model):
+        reacciones = modelo.reactions
+        self.n_reacciones = len(reacciones)
+        self.rxn_ids = [rxn.id for rxn in reacciones]
+        self.rxn_nombres = [rxn.name or rxn.id for rxn in reacciones]
+        self.rxn_subsistema = [rxn.subsystem or "NA" for rxn in reacciones]
+        self.es_gigante = self.n_reacciones > UMBRAL_GIGANTE
+
+        self.lista_subsistemas = sorted({rxn.subsystem for rxn in reacciones if rxn.subsystem})
+        codigo = {s: i for i, s in enumerate(self.lista_subsistemas)}
+        self.codigo_subsistema = np.array(
+            [codigo.get(rxn.subsystem, -1) for rxn in reacciones], dtype=np.int32
+        )
+
+        self.met_ids = [met.id for met in modelo.metabolites]
+        self.metabolitos = TablaMetabolitos(self.met_ids)
+        posicion_met = {met_id: i for i, met_id in enumerate(self.met_ids)}
+
+        indptr = [0]
+        arista_met = []
+        arista_coef = []
+        for rxn in reacciones:
+            for met, coeff in rxn.metabolites.items():
+                arista_met.append(posicion_met[met.id])
+                arista_coef.append(coeff)
+            indptr.append(len(arista_met))
+
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.arista_met = np.array(arista_met, dtype=np.int64)
+        self.arista_coef = np.array(arista_coef, dtype=np.float64)
+        self.arista_rxn = np.repeat(
+            np.arange(self.n_reacciones, dtype=np.int64), np.diff(self.indptr)
+        )
+
+        # CSR traspuesto metabolito → aristas: las del metabolito m están
+        # en [met_indptr[m], met_indptr[m+1]) de `met_arista`
+        self.met_arista = np.argsort(self.arista_met, kind="stable")
+        self.met_indptr = np.zeros(len(self.met_ids) + 1, dtype=np.int64)
+        self.met_indptr[1:] = np.cumsum(np.bincount(self.arista_met, minlength=len(self.met_ids)))
+
+        self._alineaciones = {}
+
+    # --------------------------------------------------------
+    # Alinear el vector de flujos de un run al orden del modelo
+    # --------------------------------------------------------
+    def alinear_flujos(self, indice_run) -> np.ndarray:
+        """
+        Devuelve `posiciones` tal que flujos_run[posiciones] está en el
+        orden de `rxn_ids` (o None si ya coinciden). Se memoriza por índice.
+        """
+        clave = id(indice_run)
+        if clave not in self._alineaciones:
+            if indice_run.ids == self.rxn_ids:
+                posiciones = None
+            else:
+                posiciones = np.array(
+                    [indice_run.posicion.get(r, -1) for r in self.rxn_ids], dtype=np.int64
+                )
+            self._alineaciones[clave] = (indice_run, posiciones)
+        return self._alineaciones[clave][1]
+
+    def flujos_de_run(self, entrada: dict) -> np.ndarray:
+        flujos = np.asarray(entrada["flujos"], dtype=np.float64)
+        posiciones = self.alinear_flujos(entrada["indice"])
+        if posiciones is None:
+            return flujos
+        alineados = np.where(posiciones >= 0, flujos[np.maximum(posiciones, 0)], 0.0)
+        return alineados
+
+    def rango_de_run(self, entrada: dict):
+        """
+        (mínimo, máximo) de FVA del run en el orden de `rxn_ids`, o None
+        si el run no trae rango. NaN = reacción no analizada.
+        """
+        rango = entrada.get("rango")
+        if rango is None:
+            return None
+        rango = np.asarray(rango, dtype=np.float64)
+        posiciones = self.alinear_flujos(entrada["indice"])
+        if posiciones is not None:
+            rango = np.where(
+                (posiciones >= 0)[:, None], rango[np.maximum(posiciones, 0)], np.nan
+            )
+        return rango[:, 0], rango[:, 1]
+
+    # --------------------------------------------------------
+    # Selección de reacciones y aristas para un request
+    # --------------------------------------------------------
+    def seleccionar(self, flujos: np.ndarray, filtro_sub: str = None) -> np.ndarray:
+        """Índices (ordenados) de las reacciones que entran al grafo."""
+        if filtro_sub:
+            try:
+                k = self.lista_subsistemas.index(filtro_sub)
+            except ValueError:
+                return np.empty(0, dtype=np.int64)
+            mascara = self.codigo_subsistema == k
+        elif self.es_gigante:
+            # Modelo gigante sin filtro → solo reacciones activas
+            mascara = np.abs(flujos) >= UMBRAL_FLUJO_ACTIVO
+        else:
+            return np.arange(self.n_reacciones, dtype=np.int64)
+        return np.flatnonzero(mascara)
+
+    def aristas_de(self, rxn_sel: np.ndarray) -> np.ndarray:
+        """Índices de aristas (concatenados, en orden) de las reacciones dadas."""
+        inicio = self.indptr[rxn_sel]
+        return rangos_concatenados(inicio, self.indptr[rxn_sel + 1] - inicio)
+
+    def metabolitos_sin_otra(self, rxn: np.ndarray, mascara_sel: np.ndarray) -> np.ndarray:
+        """
+        Metabolitos (índices, ordenados) de las reacciones `rxn` que no
+        tocan ninguna reacción marcada en `mascara_sel` (bool por reacción).
+        Solo recorre las aristas de esos metabolitos.
+        """
+        mets = np.unique(self.arista_met[self.aristas_de(rxn)])
+        inicio = self.met_indptr[mets]
+        cuenta = self.met_indptr[mets + 1] - inicio
+        if len(mets) == 0:
+            return mets
+        tocan = mascara_sel[self.arista_rxn[self.met_arista[rangos_concatenados(inicio, cuenta)]]]
+        alguna = np.logical_or.reduceat(tocan, np.cumsum(cuenta) - cuenta)
+        return mets[~alguna]
+
+
+def rangos_concatenados(inicio: np.ndarray, cuenta: np.ndarray) -> np.ndarray:
+    """inicio_0, inicio_0+1, ..., inicio_1, inicio_1+1, ... (cuenta_i de cada uno)."""
+    inicio = np.asarray(inicio, dtype=np.int64)
+    cuenta = np.asarray(cuenta, dtype=np.int64)
+    total = int(cuenta.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    desplaz = np.repeat(inicio - np.cumsum(cuenta) + cuenta, cuenta)
+    return desplaz + np.arange(total, dtype=np.int64)
+
+
+# ============================================================
+# Grafo 3D de un run en forma columnar (arrays paralelos)
+# ============================================================
+def columnas_grafo(topo: IndiceTopologia, flujos: np.ndarray, filtro_sub: str,
+                   rxn_sel: np.ndarray = None) -> dict:
+    """
+    Une la topología precalculada con los flujos de un run.
+    Solo se recorren las reacciones seleccionadas y sus aristas
+    (O(aristas activas)), no el modelo completo. `rxn_sel` (índices
+    ordenados) reemplaza a la selección por subsistema/actividad.
+
+    El orden de nodos es el del recorrido reacción a reacción: nodo
+    reacción y después sus metabolitos que aún no habían aparecido.
+    Cada metabolito toma el subsistema de la reacción donde aparece
+    por primera vez. Las aristas con coeficiente 0 no generan enlace.
+
+    Devuelve arrays (posiciones "sel" = índice en `rxn_sel`):
+      rxn_sel, flujo_sel
+      nodo_es_rxn, nodo_ref (índice de reacción o de metabolito),
+      nodo_sel (reacción seleccionada que aporta subsistema/color)
+      enlace_origen, enlace_destino (posiciones de nodo),
+      enlace_sel, enlace_coef
+    """
+    if rxn_sel is None:
+        rxn_sel = topo.seleccionar(flujos, filtro_sub)
+    flujo_sel = flujos[rxn_sel]
+    n_rxn = len(rxn_sel)
+
+    aristas = topo.aristas_de(rxn_sel)
+    cuenta = topo.indptr[rxn_sel + 1] - topo.indptr[rxn_sel]
+    sel_de_arista = np.repeat(np.arange(n_rxn, dtype=np.int64), cuenta)
+    inicio_en_aristas = np.cumsum(cuenta) - cuenta
+
+    # Primera aparición de cada metabolito
+    met_de_arista = topo.arista_met[aristas]
+    _, primera = np.unique(met_de_arista, return_index=True)
+    primera.sort()
+
+    # Orden de inserción: reacción i antes que los metabolitos que
+    # aparecen por primera vez en sus aristas
+    claves = np.concatenate([2 * inicio_en_aristas, 2 * primera + 1])
+    orden = np.argsort(claves, kind="stable")
+
+    nodo_es_rxn = orden < n_rxn
+    es_met = ~nodo_es_rxn
+    arista_de_met = primera[orden[es_met] - n_rxn]
+
+    nodo_sel = np.empty(len(orden), dtype=np.int64)
+    nodo_ref = np.empty(len(orden), dtype=np.int64)
+    nodo_sel[nodo_es_rxn] = orden[nodo_es_rxn]
+    nodo_ref[nodo_es_rxn] = rxn_sel[orden[nodo_es_rxn]]
+    nodo_sel[es_met] = sel_de_arista[arista_de_met]
+    nodo_ref[es_met] = met_de_arista[arista_de_met]
+
+    # Posición de nodo de cada reacción seleccionada y de cada metabolito
+    posiciones = np.arange(len(orden), dtype=np.int64)
+    nodo_de_sel = np.empty(n_rxn, dtype=np.int64)
+    nodo_de_sel[orden[nodo_es_rxn]] = posiciones[nodo_es_rxn]
+    nodo_de_met = np.full(len(topo.met_ids), -1, dtype=np.int64)
+    nodo_de_met[nodo_ref[es_met]] = posiciones[es_met]
+
+    # Enlaces (dirección según el signo del coeficiente)
+    coefs = topo.arista_coef[aristas]
+    validas = np.flatnonzero(coefs != 0)
+    enlace_sel = sel_de_arista[validas]
+    enlace_coef = coefs[validas]
+    nodo_rxn = nodo_de_sel[enlace_sel]
+    nodo_met = nodo_de_met[met_de_arista[validas]]
+    entrada = enlace_coef < 0
+
+    return {
+        "rxn_sel": rxn_sel,
+        "flujo_sel": flujo_sel,
+        "nodo_es_rxn": nodo_es_rxn,
+        "nodo_ref": nodo_ref,
+        "nodo_sel": nodo_sel,
+        "enlace_origen": np.where(entrada, nodo_met, nodo_rxn),
+        "enlace_destino": np.where(entrada, nodo_rxn, nodo_met),
+        "enlace_sel": enlace_sel,
+        "enlace_coef": enlace_coef
+    }
+
+
+def ids_nodos(topo: IndiceTopologia, cols: dict) -> list:
+    return [
+        topo.rxn_ids[ref] if es_rxn else topo.met_ids[ref]
+        for es_rxn, ref in zip(cols["nodo_es_rxn"].tolist(), cols["nodo_ref"].tolist())
+    ]
+
+
+# ============================================================
+# Nodos y enlaces del grafo 3D como dicts (respuesta JSON)
+# ============================================================
+def construir_grafo(topo: IndiceTopologia, flujos: np.ndarray, filtro_sub: str,
+                    colores_rxn) -> tuple[list, list]:
+    """
+    `colores_rxn(flujos_sel, rxn_sel)` devuelve un color por reacción
+    seleccionada (rxn_sel: sus índices en el modelo); cada enlace usa el
+    color de su reacción.
+    """
+    cols = columnas_grafo(topo, flujos, filtro_sub)
+    return dicts_grafo(topo, cols, colores_rxn)
+
+
+def dicts_grafo(topo: IndiceTopologia, cols: dict, colores_rxn) -> tuple[list, list]:
+    flujo_sel = cols["flujo_sel"].tolist()
+    color_sel = colores_rxn(cols["flujo_sel"], cols["rxn_sel"])
+    ids = ids_nodos(topo, cols)
+
+    nodes = []
+    for pos, (es_rxn, sel) in enumerate(zip(cols["nodo_es_rxn"].tolist(),
+                                            cols["nodo_sel"].tolist())):
+        subsistema = topo.rxn_subsistema[int(cols["rxn_sel"][sel])]
+        if es_rxn:
+            nodes.append({
+                "id": ids[pos],
+                "name": ids[pos],
+                "group": "reaction",
+                "subsystem": subsistema,
+                "val": 6,
+                "flux": abs(flujo_sel[sel]),
+                "color": color_sel[sel]
+            })
+        else:
+            nodes.append({
+                "id": ids[pos],
+                "name": ids[pos],
+                "group": "metabolite",
+                "subsystem": subsistema,
+                "val": 2,
+                "flux": 0.0,
+                "color": "#1f77b4"
+            })
+
+    links = []
+    for origen, destino, sel, coeff in zip(cols["enlace_origen"].tolist(),
+                                           cols["enlace_destino"].tolist(),
+                                           cols["enlace_sel"].tolist(),
+                                           cols["enlace_coef"].tolist()):
+        links.append({
+            "source": ids[origen],
+            "target": ids[destino],
+            "flux": abs(flujo_sel[sel]),
+            "flux_signed": flujo_sel[sel],
+            "coeff": coeff,
+            "color": color_sel[sel]
+        })
+
+    return nodes, links
+
+
+# ============================================================
+# Diferencia entre los grafos de dos runs (parche para el frontend)
+# ============================================================
+def diff_grafo(topo: IndiceTopologia, flujos_base: np.ndarray, flujos_otro: np.ndarray,
+               filtro_sub: str, cambia: np.ndarray, colores_rxn) -> dict:
+    """
+    Lo que hay que cambiar en el grafo ya dibujado del run base para
+    que muestre el run `otro`:
+
+    - actualizar: reacciones presentes en ambos grafos marcadas en
+      `cambia` (bool por reacción: flujo o color distinto); sus enlaces
+      toman el flujo y el color de la reacción
+    - agregar: reacciones que solo entran al grafo de `otro` (modelo
+      gigante: las que se activan), con sus enlaces y los metabolitos
+      que aún no estaban
+    - eliminar: reacciones que salen y metabolitos que se quedan sin
+      reacción; sus enlaces se quitan con ellos
+
+    Sobre todo el modelo solo hay operaciones vectorizadas (máscaras);
+    los dicts se arman únicamente para las reacciones que cambian y sus
+    aristas. Un metabolito que sigue en el grafo conserva el
+    subsistema con el que apareció. `colores_rxn` es el de
+    `construir_grafo` para `flujos_otro`.
+    """
+    en_base = np.zeros(topo.n_reacciones, dtype=bool)
+    en_base[topo.seleccionar(flujos_base, filtro_sub)] = True
+    en_otro = np.zeros(topo.n_reacciones, dtype=bool)
+    en_otro[topo.seleccionar(flujos_otro, filtro_sub)] = True
+
+    actualizar = np.flatnonzero(en_base & en_otro & cambia)
+    entran = np.flatnonzero(en_otro & ~en_base)
+    salen = np.flatnonzero(en_base & ~en_otro)
+
+    # Reacciones que se actualizan: solo flujo y color
+    flujo_act = flujos_otro[actualizar]
+    color_act = colores_rxn(flujo_act, actualizar)
+    nodos_act = [
+        {"id": topo.rxn_ids[i], "flux": abs(f), "flux_signed": f, "color": c}
+        for i, f, c in zip(actualizar.tolist(), flujo_act.tolist(), color_act)
+    ]
+
+    # Reacciones que entran: nodos y enlaces completos, sin repetir
+    # los metabolitos que ya estaban en el grafo base
+    cols = columnas_grafo(topo, flujos_otro, filtro_sub, rxn_sel=entran)
+    nodes, links = dicts_grafo(topo, cols, colores_rxn)
+    nuevos = np.zeros(len(topo.met_ids), dtype=bool)
+    nuevos[topo.metabolitos_sin_otra(entran, en_base)] = True
+    mantener = cols["nodo_es_rxn"].copy()
+    es_met = ~mantener
+    mantener[es_met] = nuevos[cols["nodo_ref"][es_met]]
+    nodes = [n for n, m in zip(nodes, mantener.tolist()) if m]
+
+    mets_fuera = topo.metabolitos_sin_otra(salen, en_otro)
+
+    return {
+        "actualizar": {"nodes": nodos_act},
+        "agregar": {"nodes": nodes, "links": links},
+        "eliminar": {
+            "nodes": [topo.rxn_ids[i] for i in salen.tolist()]
+                     + [topo.met_ids[m] for m in mets_fuera.tolist()]
+        },
+        "cambios": {
+            "actualizadas": int(len(actualizar)),
+            "agregadas": int(len(entran)),
+            "eliminadas": int(len(salen)),
+            "metabolitos_agregados": int(nuevos.sum()),
+            "metabolitos_eliminados": int(len(mets_fuera))
+        }
+    }
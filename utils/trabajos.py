@@ -0,0 +1,195 @@
+# utils/trabajos.py
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+N_HILOS_TRABAJOS = int(os.environ.get("FBA_JOBS_WORKERS", "2"))
+MAX_TRABAJOS = int(os.environ.get("FBA_JOBS_MAX", "200"))
+TTL_TRABAJOS = float(os.environ.get("FBA_JOBS_TTL", "3600"))
+
+PENDIENTE = "pendiente"
+EJECUTANDO = "ejecutando"
+TERMINADO = "terminado"
+ERROR = "error"
+CANCELADO = "cancelado"
+ESTADOS_FINALES = (TERMINADO, ERROR, CANCELADO)
+
+
+class TrabajoCancelado(Exception):
+    """Se lanza en el siguiente punto de control de un trabajo cancelado."""
+
+
+class ColaLlena(Exception):
+    """`max_trabajos` en cola o ejecutándose: no se aceptan más por ahora."""
+
+
+def sin_progreso(fraccion: float, etapa: str) -> None:
+    """Callback de progreso para cuando el código corre dentro del request."""
+
+
+# ============================================================
+# 1. Un trabajo: estado, progreso y cancelación
+# ============================================================
+class Trabajo:
+    def __init__(self, tipo: str):
+        self.id = str(uuid.uuid4())
+        self.tipo = tipo
+        self.estado = PENDIENTE
+        self.progreso = 0.0
+        self.etapa = "en cola"
+        self.resultado = None
+        self.error = None
+        self.creado = time.time()
+        self.actualizado = self.creado
+        self._cancelar = threading.Event()
+        self.future = None
+
+    def avanzar(self, fraccion: float, etapa: str) -> None:
+        """
+        Punto de control: actualiza el progreso (0–1) y la etapa, y corta
+        el trabajo si se pidió cancelarlo. Las etapas pesadas lo llaman
+        entre pasos.
+        """
+        if self._cancelar.is_set():
+            raise TrabajoCancelado()
+        self.progreso = max(self.progreso, min(float(fraccion), 1.0))
+        self.etapa = etapa
+        self.actualizado = time.time()
+
+    def cancelar(self) -> bool:
+        if self.estado in ESTADOS_FINALES:
+            return False
+        self._cancelar.set()
+        self.actualizado = time.time()
+        # Si aún no empezó, no llega a ejecutarse
+        if self.future is not None and self.future.cancel():
+            self._terminar(CANCELADO)
+        return True
+
+    def _terminar(self, estado: str, resultado=None, error: str = None) -> None:
+        self.estado = estado
+        self.resultado = resultado
+        self.error = error
+        if estado == TERMINADO:
+            self.progreso = 1.0
+        self.etapa = estado
+        self.actualizado = time.time()
+
+    def a_dict(self) -> dict:
+        return {
+            "trabajo_id": self.id,
+            "tipo": self.tipo,
+            "estado": self.estado,
+            "progreso": round(self.progreso, 4),
+            "etapa": self.etapa,
+            "error": self.error,
+            "creado": self.creado,
+            "actualizado": self.actualizado,
+            "cancelacion_pedida": self._cancelar.is_set()
+        }
+
+
+# ============================================================
+# 2. Cola de trabajos en segundo plano (hilos del proceso)
+# ============================================================
+class ColaTrabajos:
+    """
+    Ejecuta funciones largas fuera del request. `enviar` devuelve el
+    Trabajo al instante; la función recibe `trabajo.avanzar` como
+    callback de progreso (primer argumento).
+
+    Los trabajos terminados se guardan hasta `ttl_segundos` o hasta que
+    haya más de `max_trabajos` (se descartan primero los más viejos).
+    Los que llevan `ttl_segundos` en cola sin empezar se cancelan, y los
+    cancelados que siguen ejecutándose `ttl_segundos` después de pedirlo
+    dejan de listarse. Con `max_trabajos` sin terminar, `enviar` lanza
+    ColaLlena.
+    """
+
+    def __init__(self, n_hilos: int = N_HILOS_TRABAJOS, max_trabajos: int = MAX_TRABAJOS,
+                 ttl_segundos: float = TTL_TRABAJOS):
+        self.max_trabajos = max_trabajos
+        self.ttl_segundos = ttl_segundos
+        self._executor = ThreadPoolExecutor(max_workers=n_hilos,
+                                            thread_name_prefix="trabajo_fba")
+        self._trabajos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def enviar(self, tipo: str, funcion, *args, **kwargs) -> Trabajo:
+        trabajo = Trabajo(tipo)
+
+        def ejecutar():
+            if trabajo._cancelar.is_set():
+                trabajo._terminar(CANCELADO)
+                return
+            trabajo.estado = EJECUTANDO
+            trabajo.etapa = "iniciando"
+            try:
+                resultado = funcion(trabajo.avanzar, *args, **kwargs)
+            except TrabajoCancelado:
+                trabajo._terminar(CANCELADO)
+            except Exception as e:
+                trabajo._terminar(ERROR, error=str(e))
+            else:
+                trabajo._terminar(TERMINADO, resultado=resultado)
+
+        with self._lock:
+            self._limpiar()
+            if len(self._trabajos) >= self.max_trabajos:
+                raise ColaLlena(
+                    f"Hay {len(self._trabajos)} trabajos sin terminar; intenta más tarde."
+                )
+            self._trabajos[trabajo.id] = trabajo
+        trabajo.future = self._executor.submit(ejecutar)
+        return trabajo
+
+    def obtener(self, trabajo_id: str):
+        with self._lock:
+            return self._trabajos.get(trabajo_id)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            por_estado = {}
+            for t in self._trabajos.values():
+                por_estado[t.estado] = por_estado.get(t.estado, 0) + 1
+            return {"trabajos": len(self._trabajos), "por_estado": por_estado}
+
+    def _limpiar(self) -> None:
+        ahora = time.time()
+
+        # En cola demasiado tiempo → cancelar (el future aún no empezó)
+        for t in list(self._trabajos.values()):
+            if t.estado == PENDIENTE and ahora - t.creado > self.ttl_segundos:
+                t.cancelar()
+
+        # Cancelación pedida y el trabajo no llega a un punto de control:
+        # el hilo termina por su cuenta, pero deja de ocupar la cola
+        for trabajo_id in [
+            k for k, t in self._trabajos.items()
+            if t.estado not in ESTADOS_FINALES and t._cancelar.is_set()
+            and ahora - t.actualizado > self.ttl_segundos
+        ]:
+            self._trabajos.pop(trabajo_id)
+
+        for trabajo_id in [
+            k for k, t in self._trabajos.items()
+            if t.estado in ESTADOS_FINALES and ahora - t.actualizado > self.ttl_segundos
+        ]:
+            _descartar(self._trabajos.pop(trabajo_id))
+
+        terminados = [k for k, t in self._trabajos.items() if t.estado in ESTADOS_FINALES]
+        while len(self._trabajos) >= self.max_trabajos and terminados:
+            _descartar(self._trabajos.pop(terminados.pop(0)))
+
+
+def _descartar(trabajo: Trabajo) -> None:
+    """Borra el archivo temporal de un resultado ({"archivo": ruta, ...})."""
+    if isinstance(trabajo.resultado, dict) and trabajo.resultado.get("archivo"):
+        try:
+            os.remove(trabajo.resultado["archivo"])
+        except OSError:
+            pass